@@ -0,0 +1,149 @@
+"""
+SQLSecurityChecker 微基准
+
+在一批随机生成的查询(单表过滤、多表 JOIN、聚合、CTE、子查询)上比较:
+  legacy       旧流程: parse 计数 + parse_one 再解析 + 递归检查 + 优化
+  single-parse 单次解析 + 迭代检查 + 优化(关闭结果缓存)
+  cached       开启结果缓存, 语料按 --repeat 重复出现(模拟语义缓存/Agent 循环中的重复 SQL)
+
+用法(在 iptl-text-to-server 目录下):
+    python benchmarks/bench_sql_validator.py --queries 500 --repeat 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlglot import exp, parse, parse_one  # noqa: E402
+
+from resources.text2sql.sql_validator import SQLSecurityChecker  # noqa: E402
+
+TABLES = {
+    "users": ["id", "name", "city", "created_at", "status"],
+    "orders": ["id", "user_id", "amount", "created_at", "status"],
+    "items": ["id", "order_id", "sku", "price", "quantity"],
+    "products": ["sku", "title", "category", "price"],
+}
+JOINS = [
+    ("users", "orders", "users.id = orders.user_id"),
+    ("orders", "items", "orders.id = items.order_id"),
+    ("items", "products", "items.sku = products.sku"),
+]
+
+
+def _predicate(rng: random.Random, table: str) -> str:
+    column = rng.choice(TABLES[table])
+    op = rng.choice(["=", ">", "<", ">=", "<>"])
+    value = rng.choice([str(rng.randint(0, 1000)), f"'{rng.choice(['bj', 'sh', 'paid', 'new'])}'"])
+    return f"{table}.{column} {op} {value}"
+
+
+def generate_corpus(n: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        kind = rng.choice(["filter", "join", "aggregate", "cte", "subquery"])
+        if kind == "filter":
+            table = rng.choice(list(TABLES))
+            conditions = " AND ".join(_predicate(rng, table) for _ in range(rng.randint(1, 4)))
+            sql = f"SELECT * FROM {table} WHERE {conditions} LIMIT {rng.randint(1, 500)}"
+        elif kind == "join":
+            left, right, on = rng.choice(JOINS)
+            sql = (
+                f"SELECT {left}.{TABLES[left][1]}, {right}.{TABLES[right][2]} FROM {left} "
+                f"JOIN {right} ON {on} WHERE {_predicate(rng, left)} AND 1 = 1"
+            )
+        elif kind == "aggregate":
+            left, right, on = rng.choice(JOINS)
+            group_col = rng.choice(TABLES[left])
+            sql = (
+                f"SELECT {left}.{group_col}, COUNT(*) AS cnt, SUM({right}.id) AS total FROM {left} "
+                f"LEFT JOIN {right} ON {on} GROUP BY {left}.{group_col} HAVING COUNT(*) > {rng.randint(1, 10)} "
+                f"ORDER BY cnt DESC"
+            )
+        elif kind == "cte":
+            table = rng.choice(list(TABLES))
+            sql = (
+                f"WITH recent AS (SELECT * FROM {table} WHERE {_predicate(rng, table)}) "
+                f"SELECT COUNT(*) FROM recent"
+            )
+        else:
+            sql = (
+                f"SELECT name FROM users WHERE id IN (SELECT user_id FROM orders WHERE amount > {rng.randint(1, 900)}) "
+                f"AND NOT (status = 'x' OR FALSE)"
+            )
+        corpus.append(sql)
+    return corpus
+
+
+def legacy_validate(checker: SQLSecurityChecker, sql: str, dialect: str) -> str:
+    """重现重构前的校验流程, 作为对照"""
+    if len([e for e in parse(sql, read=dialect)]) > 1:
+        raise ValueError("multiple statements")
+    expression = parse_one(sql, dialect=dialect)
+
+    def check(node):
+        checker._check_node(node)
+        for child in node.iter_expressions():
+            check(child)
+
+    check(expression)
+    expression = checker._optimize_query(expression)
+    return expression.sql(dialect=dialect)
+
+
+def run(name: str, fn, workload: list) -> dict:
+    timings = []
+    start = time.perf_counter()
+    for sql in workload:
+        t0 = time.perf_counter()
+        fn(sql)
+        timings.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    return {
+        "name": name,
+        "queries": len(workload),
+        "total_s": elapsed,
+        "qps": len(workload) / elapsed if elapsed else float("inf"),
+        "p50_us": statistics.median(timings) * 1e6,
+        "p99_us": timings[int(len(timings) * 0.99) - 1] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500, help="不同查询的数量")
+    parser.add_argument("--repeat", type=int, default=5, help="cached 模式下每条查询重复出现的次数")
+    parser.add_argument("--dialect", default="postgres")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.queries, args.seed)
+    repeated = corpus * args.repeat
+    random.Random(args.seed).shuffle(repeated)
+
+    legacy_checker = SQLSecurityChecker(cache_size=0)
+    uncached = SQLSecurityChecker(cache_size=0)
+    cached = SQLSecurityChecker(cache_size=max(1024, args.queries))
+
+    results = [
+        run("legacy", lambda sql: legacy_validate(legacy_checker, sql, args.dialect), corpus),
+        run("single-parse", lambda sql: uncached.validata(sql, dialect=args.dialect), corpus),
+        run(f"cached (x{args.repeat})", lambda sql: cached.validata(sql, dialect=args.dialect), repeated),
+    ]
+
+    print(f"{'mode':<16}{'queries':>9}{'total(s)':>11}{'qps':>11}{'p50(us)':>11}{'p99(us)':>11}")
+    for r in results:
+        print(
+            f"{r['name']:<16}{r['queries']:>9}{r['total_s']:>11.3f}{r['qps']:>11.0f}"
+            f"{r['p50_us']:>11.1f}{r['p99_us']:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
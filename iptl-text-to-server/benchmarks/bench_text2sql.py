@@ -0,0 +1,270 @@
+"""
+索引构建与查询基准
+
+对每个规模(表数量)生成合成 SQLite 库, 使用确定性的本地 LLM / 嵌入替身, 依次测量:
+  index_build  首次构建: SchemaManager 生成表描述 + 向量索引构建(Text2SQLEngine 初始化)
+  index_load   向量库已存在时的初始化
+  query        Text2SQLEngine.query 查询负载(含语义缓存命中)
+每个阶段报告耗时、数据库往返次数、LLM 调用次数、嵌入请求数/文本数; 每个规模在独立子进程中运行以单独统计峰值 RSS
+
+用法(在 iptl-text-to-server 目录下):
+    python benchmarks/bench_text2sql.py --scales 10,100,1000 --output benchmarks/results/baseline.json
+    python benchmarks/bench_text2sql.py --scales 10,100,1000 --compare benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from stubs import DeterministicEmbedding, DeterministicLLM  # noqa: E402
+from synthetic_schema import generate_database, generate_questions  # noqa: E402
+
+RESULT_MARKER = "BENCH_RESULT "
+# 与基线对比的阶段指标
+COMPARE_METRICS = ("wall_s", "db_round_trips", "llm_calls", "embedding_requests")
+
+
+class Counters:
+    def __init__(self, llm: DeterministicLLM, embed_model: DeterministicEmbedding):
+        self.llm = llm
+        self.embed_model = embed_model
+        self.db_round_trips = 0
+        self.schema_s = 0.0
+        event.listen(Engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.db_round_trips += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "db_round_trips": self.db_round_trips,
+            "llm_calls": self.llm.calls,
+            "embedding_requests": self.embed_model.requests,
+            "embedding_texts": self.embed_model.texts,
+            "schema_s": self.schema_s,
+        }
+
+    @contextmanager
+    def phase(self, results: Dict[str, Dict[str, float]], name: str):
+        before = self.snapshot()
+        start = time.perf_counter()
+        yield
+        wall = time.perf_counter() - start
+        after = self.snapshot()
+        stats = {"wall_s": round(wall, 4)}
+        for key in before:
+            delta = after[key] - before[key]
+            stats[key] = round(delta, 4) if isinstance(delta, float) else delta
+        if not stats["schema_s"]:
+            del stats["schema_s"]
+        results[name] = stats
+
+
+def _instrument_schema_manager(counters: Counters):
+    """记录 SchemaManager.get_table_schema 的耗时, 从 index_build 中拆出描述生成阶段"""
+    from resources.text2sql.schema_manager import SchemaManager
+
+    original = SchemaManager.get_table_schema
+
+    def timed(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            counters.schema_s += time.perf_counter() - start
+
+    SchemaManager.get_table_schema = timed
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB, macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_scale(tables: int, args) -> Dict:
+    from resources.text2sql.config import Text2SQLConfig
+    from resources.text2sql.db_pool import dispose_engine
+    from resources.text2sql.engine import Text2SQLEngine
+
+    workdir = os.path.join(args.workdir, f"tables_{tables}")
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+    db_path = os.path.join(workdir, "bench.db")
+
+    start = time.perf_counter()
+    names = generate_database(db_path, tables, args.seed, max_columns=args.max_columns, max_rows=args.max_rows)
+    generate_s = time.perf_counter() - start
+    questions = generate_questions(names, args.queries, args.seed)
+
+    llm = DeterministicLLM(latency=args.llm_latency)
+    embed_model = DeterministicEmbedding(latency=args.embedding_latency)
+    counters = Counters(llm, embed_model)
+    _instrument_schema_manager(counters)
+
+    config = Text2SQLConfig(
+        db_uri=f"sqlite:///{db_path}",
+        base_chroma_path=os.path.join(workdir, "chroma"),
+        table_info_for_llm=args.llm_descriptions,
+        enable_column_sampling=not args.no_sampling,
+        enable_description_cache=False,
+    )
+
+    phases: Dict[str, Dict[str, float]] = {}
+    with counters.phase(phases, "index_build"):
+        engine = Text2SQLEngine(config, llm=llm, embed_model=embed_model)
+    engine.close()
+    dispose_engine(engine.db_manager.engine)
+
+    with counters.phase(phases, "index_load"):
+        engine = Text2SQLEngine(config, llm=llm, embed_model=embed_model)
+
+    latencies = []
+    with counters.phase(phases, "query"):
+        for question in questions:
+            t0 = time.perf_counter()
+            engine.query(question)
+            latencies.append(time.perf_counter() - t0)
+    engine.close()
+
+    latencies.sort()
+    phases["query"].update({
+        "queries": len(latencies),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 3),
+        "qps": round(len(latencies) / phases["query"]["wall_s"], 2) if phases["query"]["wall_s"] else None,
+    })
+
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "tables": tables,
+        "generate_s": round(generate_s, 3),
+        "phases": phases,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _run_in_subprocess(tables: int, argv: List[str]) -> Dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--single", str(tables)] + argv
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    sys.stderr.write(proc.stdout[-4000:] + proc.stderr[-4000:])
+    raise RuntimeError(f"benchmark for {tables} tables failed (exit code {proc.returncode})")
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(results: List[Dict]):
+    print(f"{'tables':>7} {'phase':<12}{'wall(s)':>10}{'db trips':>10}{'llm':>7}{'emb req':>9}{'emb txt':>9}{'rss(MB)':>9}")
+    for r in results:
+        for name, p in r["phases"].items():
+            print(
+                f"{r['tables']:>7} {name:<12}{p['wall_s']:>10.3f}{p['db_round_trips']:>10}{p['llm_calls']:>7}"
+                f"{p['embedding_requests']:>9}{p['embedding_texts']:>9}{r['peak_rss_mb']:>9.1f}"
+            )
+        query = r["phases"]["query"]
+        print(f"{'':>7} {'':<12}query p50 {query['p50_ms']}ms p95 {query['p95_ms']}ms, "
+              f"schema {r['phases']['index_build'].get('schema_s', 0):.3f}s of index_build")
+
+
+def compare(results: List[Dict], baseline_path: str, threshold: float) -> bool:
+    """与基线结果逐项对比, 返回是否存在超过阈值的回归"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["tables"]: r for r in json.load(f)["results"]}
+
+    regressed = False
+    print(f"\nCompared with {baseline_path} (threshold {threshold:.0%}):")
+    for r in results:
+        base = baseline.get(r["tables"])
+        if base is None:
+            print(f"{r['tables']:>7} no baseline")
+            continue
+        rows = [(f"{name}.{m}", base["phases"].get(name, {}).get(m), p.get(m))
+                for name, p in r["phases"].items() for m in COMPARE_METRICS]
+        rows.append(("peak_rss_mb", base.get("peak_rss_mb"), r["peak_rss_mb"]))
+        for metric, old, new in rows:
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else float("inf"))
+            flag = ""
+            if change > threshold:
+                flag, regressed = "  REGRESSION", True
+            print(f"{r['tables']:>7} {metric:<32}{old:>12}{new:>12}{change:>+9.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10,100,1000", help="逗号分隔的表数量, 例如 10,100,1000,10000")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--max-columns", type=int, default=40)
+    parser.add_argument("--max-rows", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="LLM 替身每次调用的模拟耗时(秒)")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="嵌入替身每次请求的模拟耗时(秒)")
+    parser.add_argument("--llm-descriptions", action="store_true", help="构建索引时调用 LLM 生成表描述")
+    parser.add_argument("--no-sampling", action="store_true", help="关闭列取样")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "text2sql_bench"))
+    parser.add_argument("--keep", action="store_true", help="保留生成的库与向量索引")
+    parser.add_argument("--output", help="结果 JSON 保存路径")
+    parser.add_argument("--compare", help="与之对比的基线结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="对比时判定回归的相对变化阈值")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args, _ = parser.parse_known_args()
+
+    if args.single is not None:
+        print(RESULT_MARKER + json.dumps(run_scale(args.single, args)))
+        return
+
+    results = []
+    for tables in [int(s) for s in args.scales.split(",") if s.strip()]:
+        print(f"Running benchmark with {tables} tables...", flush=True)
+        results.append(_run_in_subprocess(tables, sys.argv[1:]))
+
+    print_report(results)
+
+    payload = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("single", "output", "compare")},
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
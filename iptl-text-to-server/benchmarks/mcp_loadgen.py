@@ -0,0 +1,178 @@
+"""
+MCP SSE 负载生成器
+
+建立多个并发 SSE 会话连接 /agentx/text2/text2sql/mcp/sse, 每个会话循环调用 text2sql 工具,
+报告吞吐量与 p50/p95/p99 延迟; 工具返回 {"error": ...} 或调用异常均计为失败
+
+用法(先启动 openai_stub.py 与 server.py, 并将模型配置指向替身服务):
+    python benchmarks/mcp_loadgen.py --sessions 32 --duration 60
+    python benchmarks/mcp_loadgen.py --sessions 8 --requests 50 --questions questions.txt --output result.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+DEFAULT_QUESTIONS = [
+    "查询所有用户",
+    "统计每个城市的订单数量",
+    "最近 10 笔订单的金额",
+    "金额最高的 5 个客户",
+]
+
+
+class LoadStats:
+    def __init__(self, sessions: int):
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.session_failures = 0
+        # 所有会话完成握手(或失败)后同时开始发送请求, 避免把建连耗时计入吞吐
+        self.pending_sessions = sessions
+        self.all_ready = asyncio.Event()
+        self.deadline: Optional[float] = None
+
+    def session_settled(self, failed: bool = False):
+        if failed:
+            self.session_failures += 1
+        self.pending_sessions -= 1
+        if self.pending_sessions <= 0:
+            self.all_ready.set()
+
+    def record(self, latency: float, error: Optional[str] = None):
+        if error is None:
+            self.latencies.append(latency)
+        else:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    @property
+    def error_count(self) -> int:
+        return sum(self.errors.values())
+
+
+def _percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _result_error(result) -> Optional[str]:
+    if getattr(result, "isError", False):
+        return "tool_error"
+    for content in result.content:
+        text = getattr(content, "text", None)
+        if not text:
+            continue
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(payload, dict) and "error" in payload:
+            return "query_error"
+    return None
+
+
+async def run_session(session_id: int, args, questions: List[str], stats: LoadStats, start: asyncio.Event):
+    rng = random.Random(args.seed + session_id)
+    settled = False
+    try:
+        async with sse_client(args.url, timeout=args.connect_timeout, sse_read_timeout=args.call_timeout) as streams:
+            async with ClientSession(*streams) as session:
+                await session.initialize()
+                stats.session_settled()
+                settled = True
+                await start.wait()
+                sent = 0
+                while args.requests is None or sent < args.requests:
+                    if stats.deadline is not None and time.monotonic() >= stats.deadline:
+                        break
+                    question = rng.choice(questions)
+                    sent += 1
+                    t0 = time.perf_counter()
+                    try:
+                        result = await asyncio.wait_for(
+                            session.call_tool(args.tool, {"query": question}),
+                            timeout=args.call_timeout,
+                        )
+                        stats.record(time.perf_counter() - t0, _result_error(result))
+                    except asyncio.TimeoutError:
+                        stats.record(time.perf_counter() - t0, "timeout")
+                    except Exception as e:
+                        stats.record(time.perf_counter() - t0, type(e).__name__)
+    except Exception as e:
+        print(f"[session {session_id}] failed: {e!r}")
+        if not settled:
+            stats.session_settled(failed=True)
+
+
+async def run(args) -> Dict:
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    stats = LoadStats(args.sessions)
+    start = asyncio.Event()
+    tasks = [asyncio.create_task(run_session(i, args, questions, stats, start)) for i in range(args.sessions)]
+
+    try:
+        await asyncio.wait_for(stats.all_ready.wait(), timeout=args.connect_timeout + args.sessions * 0.1)
+    except asyncio.TimeoutError:
+        print(f"{stats.pending_sessions} sessions still connecting, starting anyway")
+    if args.duration:
+        stats.deadline = time.monotonic() + args.duration
+    started = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(stats.latencies)
+    summary = {
+        "url": args.url,
+        "tool": args.tool,
+        "sessions": args.sessions,
+        "session_failures": stats.session_failures,
+        "calls": len(latencies) + stats.error_count,
+        "ok": len(latencies),
+        "errors": stats.errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+    }
+    for p in (50, 95, 99):
+        value = _percentile(latencies, p)
+        summary[f"p{p}_ms"] = round(value * 1000, 2) if value is not None else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/agentx/text2/text2sql/mcp/sse")
+    parser.add_argument("--tool", default="text2sql")
+    parser.add_argument("--sessions", type=int, default=16, help="并发 SSE 会话数")
+    parser.add_argument("--requests", type=int, help="每个会话的调用次数")
+    parser.add_argument("--duration", type=float, help="压测持续时间(秒), 与 --requests 同时给出时先到者为准")
+    parser.add_argument("--questions", help="问题文件, 每行一条")
+    parser.add_argument("--connect-timeout", type=float, default=10.0)
+    parser.add_argument("--call-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果 JSON 保存路径")
+    args = parser.parse_args()
+    if args.requests is None and args.duration is None:
+        args.requests = 20
+
+    summary = asyncio.run(run(args))
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
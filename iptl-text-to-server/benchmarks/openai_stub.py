@@ -0,0 +1,280 @@
+"""
+本地 OpenAI 兼容替身服务, 用于离线压测
+
+实现 OpenAILike / OpenAILikeEmbedding 使用的接口:
+  POST /v1/chat/completions   支持 stream
+  POST /v1/completions
+  POST /v1/embeddings         支持 encoding_format=float/base64
+  GET  /v1/models
+  GET  /stats                 各接口请求数、注入的错误数
+回答默认由 deterministic_reply 生成(查询上下文中的第一张表), 也可通过 --responses 指定固定回答轮流返回
+
+延迟分布写法(毫秒): fixed:300 / uniform:100:500 / normal:400:100 / lognormal:400:0.5(中位数:sigma) / exp:400
+
+用法(在 iptl-text-to-server 目录下):
+    python benchmarks/openai_stub.py --port 9000 --chat-latency lognormal:800:0.4 --error-rate 0.01
+然后将模型配置中的 llm_api_base / embedding_api_base 设为 http://127.0.0.1:9000/v1
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+from stubs import deterministic_reply, hashed_embedding  # noqa: E402
+
+
+class LatencyDistribution:
+    """按描述串采样延迟(秒)"""
+
+    def __init__(self, spec: str, rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, *params = spec.split(":")
+        self.kind = kind
+        try:
+            self.params = [float(p) for p in params]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            ms = p[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            ms = self.rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            ms = p[0] * self.rng.lognormvariate(0.0, p[1])
+        else:
+            ms = self.rng.expovariate(1.0 / p[0]) if p[0] > 0 else 0.0
+        return max(0.0, ms) / 1000
+
+
+@dataclass
+class StubSettings:
+    chat_latency: str = "fixed:0"
+    embedding_latency: str = "fixed:0"
+    error_rate: float = 0.0  # 返回 500 的概率
+    rate_limit_rate: float = 0.0  # 返回 429 的概率
+    embedding_dim: int = 1024
+    stream_chunk_chars: int = 8
+    stream_chunk_delay: float = 0.0  # 流式输出相邻分片间隔(秒)
+    responses: List[str] = field(default_factory=list)
+    seed: Optional[int] = None
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _prompt_from_messages(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = "".join(c.get("text", "") for c in content if isinstance(c, dict))
+        parts.append(content or "")
+    return "\n".join(parts)
+
+
+def create_app(settings: StubSettings) -> FastAPI:
+    app = FastAPI(title="OpenAI-compatible stub")
+    rng = random.Random(settings.seed)
+    chat_latency = LatencyDistribution(settings.chat_latency, rng)
+    embedding_latency = LatencyDistribution(settings.embedding_latency, rng)
+    canned = itertools.cycle(settings.responses) if settings.responses else None
+    stats: Dict[str, int] = {}
+    stats_lock = threading.Lock()
+
+    def count(key: str, amount: int = 1):
+        with stats_lock:
+            stats[key] = stats.get(key, 0) + amount
+
+    def injected_error(endpoint: str) -> Optional[JSONResponse]:
+        roll = rng.random()
+        if roll < settings.rate_limit_rate:
+            count(f"{endpoint}.429")
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded (stub)", "type": "rate_limit_error", "code": "rate_limit"}},
+                status_code=429,
+                headers={"retry-after": "1"},
+            )
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            count(f"{endpoint}.500")
+            return JSONResponse(
+                {"error": {"message": "Internal error (stub)", "type": "server_error", "code": None}},
+                status_code=500,
+            )
+        return None
+
+    def reply_for(prompt: str) -> str:
+        return next(canned) if canned is not None else deterministic_reply(prompt)
+
+    async def stream_chunks(model: str, text: str, chat: bool):
+        created = int(time.time())
+        completion_id = f"{'chatcmpl' if chat else 'cmpl'}-{uuid.uuid4().hex[:24]}"
+        obj = "chat.completion.chunk" if chat else "text_completion"
+        size = max(1, settings.stream_chunk_chars)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for index, piece in enumerate(pieces):
+            if chat:
+                delta = {"content": piece}
+                if index == 0:
+                    delta["role"] = "assistant"
+                choice = {"index": 0, "delta": delta, "finish_reason": None}
+            else:
+                choice = {"index": 0, "text": piece, "finish_reason": None, "logprobs": None}
+            chunk = {"id": completion_id, "object": obj, "created": created, "model": model, "choices": [choice]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            if settings.stream_chunk_delay:
+                await asyncio.sleep(settings.stream_chunk_delay)
+        final_choice = {"index": 0, "delta": {}, "finish_reason": "stop"} if chat else \
+            {"index": 0, "text": "", "finish_reason": "stop", "logprobs": None}
+        final = {"id": completion_id, "object": obj, "created": created, "model": model, "choices": [final_choice]}
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def complete(request: Request, chat: bool):
+        endpoint = "chat.completions" if chat else "completions"
+        body = await request.json()
+        count(endpoint)
+        await asyncio.sleep(chat_latency.sample())
+        error = injected_error(endpoint)
+        if error is not None:
+            return error
+
+        model = body.get("model", "stub")
+        prompt = _prompt_from_messages(body.get("messages", [])) if chat else str(body.get("prompt", ""))
+        text = reply_for(prompt)
+        if body.get("stream"):
+            return StreamingResponse(stream_chunks(model, text, chat), media_type="text/event-stream")
+
+        usage = {
+            "prompt_tokens": _approx_tokens(prompt),
+            "completion_tokens": _approx_tokens(text),
+            "total_tokens": _approx_tokens(prompt) + _approx_tokens(text),
+        }
+        if chat:
+            choice = {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+        else:
+            choice = {"index": 0, "text": text, "finish_reason": "stop", "logprobs": None}
+        return {
+            "id": f"{'chatcmpl' if chat else 'cmpl'}-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion" if chat else "text_completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [choice],
+            "usage": usage,
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await complete(request, chat=True)
+
+    @app.post("/v1/completions")
+    async def completions(request: Request):
+        return await complete(request, chat=False)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        count("embeddings")
+        count("embeddings.inputs", len(inputs))
+        await asyncio.sleep(embedding_latency.sample())
+        error = injected_error("embeddings")
+        if error is not None:
+            return error
+
+        dim = int(body.get("dimensions") or settings.embedding_dim)
+        use_base64 = body.get("encoding_format") == "base64"
+        data = []
+        for index, text in enumerate(inputs):
+            vector = hashed_embedding(str(text), dim)
+            if use_base64:
+                embedding: Any = base64.b64encode(struct.pack(f"<{dim}f", *vector)).decode("ascii")
+            else:
+                embedding = vector
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(_approx_tokens(str(t)) for t in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "created": 0, "owned_by": "stub"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        with stats_lock:
+            return dict(stats)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--chat-latency", default="fixed:0", help="LLM 接口延迟分布(毫秒)")
+    parser.add_argument("--embedding-latency", default="fixed:0", help="嵌入接口延迟分布(毫秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--stream-chunk-chars", type=int, default=8)
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.0, help="流式分片间隔(秒)")
+    parser.add_argument("--responses", help="固定回答文件, JSON 字符串数组或每行一条, 轮流返回")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    responses: List[str] = []
+    if args.responses:
+        with open(args.responses, "r", encoding="utf-8") as f:
+            content = f.read()
+        try:
+            responses = [str(r) for r in json.loads(content)]
+        except json.JSONDecodeError:
+            responses = [line for line in content.splitlines() if line.strip()]
+
+    settings = StubSettings(
+        chat_latency=args.chat_latency,
+        embedding_latency=args.embedding_latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        embedding_dim=args.embedding_dim,
+        stream_chunk_chars=args.stream_chunk_chars,
+        stream_chunk_delay=args.stream_chunk_delay,
+        responses=responses,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
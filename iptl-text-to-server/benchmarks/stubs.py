@@ -0,0 +1,149 @@
+"""
+基准测试使用的确定性 LLM / 嵌入模型替身
+
+不访问网络, 相同输入总是得到相同输出, 并统计调用次数; 可通过 latency 参数模拟远端耗时
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.llms import CompletionResponse, CompletionResponseGen, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+from pydantic import PrivateAttr
+
+_TABLE_PATTERN = re.compile(r"Table '([^']+)' has columns")
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+")
+
+
+def deterministic_reply(prompt: str) -> str:
+    """
+    表描述提示词: 返回原始描述的前几行
+    文本转 SQL 提示词: 查询上下文中的第一张表
+    """
+    if "原始表信息" in prompt:
+        raw = prompt.split("原始表信息", 1)[1].strip("：: \n")
+        return "\n".join(raw.splitlines()[:4]) + "\n合成基准表。"
+    match = _TABLE_PATTERN.search(prompt)
+    table = match.group(1) if match else "sqlite_master"
+    return f'SQLQuery: SELECT * FROM "{table}" LIMIT 10;'
+
+
+def hashed_embedding(text: str, dim: int) -> List[float]:
+    """
+    特征哈希词袋向量: 按标识符切词后哈希到固定维度并归一化,
+    使包含相同表名/列名的文本彼此相近, 检索结果有意义且可复现
+    """
+    vec = [0.0] * dim
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class DeterministicLLM(CustomLLM):
+    """ 以 deterministic_reply 作答的本地 LLM """
+    latency: float = 0.0
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: int = PrivateAttr(default=0)
+    _prompt_chars: int = PrivateAttr(default=0)
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=32768, num_output=512, is_chat_model=False, model_name="deterministic-llm")
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    @property
+    def prompt_chars(self) -> int:
+        return self._prompt_chars
+
+    def reset(self):
+        with self._lock:
+            self._calls = 0
+            self._prompt_chars = 0
+
+    def _reply(self, prompt: str) -> str:
+        with self._lock:
+            self._calls += 1
+            self._prompt_chars += len(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        return deterministic_reply(prompt)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return CompletionResponse(text=self._reply(prompt))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        text = self._reply(prompt)
+
+        def gen() -> CompletionResponseGen:
+            acc = ""
+            for i in range(0, len(text), 16):
+                delta = text[i:i + 16]
+                acc += delta
+                yield CompletionResponse(text=acc, delta=delta)
+
+        return gen()
+
+
+class DeterministicEmbedding(BaseEmbedding):
+    """ 以 hashed_embedding 生成向量的本地嵌入模型 """
+    dim: int = 64
+    latency: float = 0.0
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _requests: int = PrivateAttr(default=0)
+    _texts: int = PrivateAttr(default=0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "DeterministicEmbedding"
+
+    @property
+    def requests(self) -> int:
+        return self._requests
+
+    @property
+    def texts(self) -> int:
+        return self._texts
+
+    def reset(self):
+        with self._lock:
+            self._requests = 0
+            self._texts = 0
+
+    def _record(self, count: int):
+        with self._lock:
+            self._requests += 1
+            self._texts += count
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _vector(self, text: str) -> List[float]:
+        return hashed_embedding(text, self.dim)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self._record(1)
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        self._record(1)
+        return self._vector(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._record(len(texts))
+        return [self._vector(t) for t in texts]
@@ -0,0 +1,134 @@
+"""
+合成 SQLite 数据库生成器
+
+按给定表数量生成宽度(列数)与行数各不相同的表, 部分表带外键指向先前生成的表;
+相同参数与种子总是生成相同的库, 便于基准结果对比
+
+用法(在 iptl-text-to-server 目录下):
+    python benchmarks/synthetic_schema.py --tables 1000 --output /tmp/bench_1000.db
+"""
+import argparse
+import os
+import random
+import sqlite3
+import string
+from typing import List, Tuple
+
+DOMAINS = ["sales", "finance", "hr", "crm", "inventory", "logistics", "marketing", "support", "billing", "audit"]
+ENTITIES = [
+    "order", "customer", "invoice", "payment", "employee", "department", "product", "warehouse",
+    "shipment", "campaign", "ticket", "account", "contract", "supplier", "region", "event",
+]
+ATTRIBUTES = [
+    ("name", "TEXT"), ("code", "TEXT"), ("status", "TEXT"), ("city", "TEXT"), ("category", "TEXT"),
+    ("amount", "REAL"), ("price", "REAL"), ("quantity", "INTEGER"), ("score", "REAL"), ("level", "INTEGER"),
+    ("created_at", "TEXT"), ("updated_at", "TEXT"), ("remark", "TEXT"), ("email", "TEXT"), ("phone", "TEXT"),
+    ("currency", "TEXT"), ("channel", "TEXT"), ("priority", "INTEGER"), ("owner", "TEXT"), ("source", "TEXT"),
+]
+STATUS_VALUES = ["new", "active", "paid", "closed", "pending", "cancelled"]
+CITY_VALUES = ["beijing", "shanghai", "guangzhou", "shenzhen", "hangzhou", "chengdu"]
+
+
+def table_name(index: int) -> str:
+    return f"{DOMAINS[index % len(DOMAINS)]}_{ENTITIES[(index // len(DOMAINS)) % len(ENTITIES)]}_{index}"
+
+
+def _columns(rng: random.Random, min_columns: int, max_columns: int) -> List[Tuple[str, str]]:
+    width = rng.randint(min_columns, max_columns)
+    columns = []
+    for i in range(width):
+        name, col_type = ATTRIBUTES[i % len(ATTRIBUTES)]
+        if i >= len(ATTRIBUTES):
+            name = f"{name}_{i // len(ATTRIBUTES)}"
+        columns.append((name, col_type))
+    rng.shuffle(columns)
+    return columns
+
+
+def _value(rng: random.Random, name: str, col_type: str):
+    if col_type == "INTEGER":
+        return rng.randint(0, 100)
+    if col_type == "REAL":
+        return round(rng.uniform(0, 10000), 2)
+    if name.startswith("status"):
+        return rng.choice(STATUS_VALUES)
+    if name.startswith("city"):
+        return rng.choice(CITY_VALUES)
+    if name.endswith("_at"):
+        return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12)))
+
+
+def generate_database(
+    path: str,
+    tables: int,
+    seed: int = 42,
+    min_columns: int = 3,
+    max_columns: int = 40,
+    max_rows: int = 200,
+    fk_ratio: float = 0.3,
+) -> List[str]:
+    """
+    生成合成库并返回表名列表; 已存在的文件会被覆盖
+    行数在 [0, max_rows] 内按对数均匀分布, 使大部分表较小、少数表较大
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    names = []
+    conn = sqlite3.connect(path)
+    try:
+        for index in range(tables):
+            name = table_name(index)
+            columns = _columns(rng, min_columns, max_columns)
+            ddl = ["id INTEGER PRIMARY KEY"] + [f'"{c}" {t}' for c, t in columns]
+            parent = None
+            if names and rng.random() < fk_ratio:
+                parent = rng.choice(names)
+                ddl.append(f'"{parent}_id" INTEGER REFERENCES "{parent}"(id)')
+            conn.execute(f'CREATE TABLE "{name}" ({", ".join(ddl)})')
+
+            rows = int(round(max_rows ** rng.random())) - 1 if max_rows > 0 else 0
+            if rows > 0:
+                placeholders = ", ".join(["?"] * (len(ddl)))
+                data = []
+                for row_id in range(1, rows + 1):
+                    row = [row_id] + [_value(rng, c, t) for c, t in columns]
+                    if parent is not None:
+                        row.append(rng.randint(1, 50))
+                    data.append(row)
+                conn.executemany(f'INSERT INTO "{name}" VALUES ({placeholders})', data)
+            names.append(name)
+        conn.commit()
+    finally:
+        conn.close()
+    return names
+
+
+def generate_questions(names: List[str], count: int, seed: int = 42) -> List[str]:
+    """针对库中的表生成自然语言问题, 部分问题重复出现以覆盖语义缓存命中路径"""
+    rng = random.Random(seed)
+    templates = [
+        "查询 {table} 中状态为 paid 的记录",
+        "统计 {table} 每个 city 的数量",
+        "列出 {table} 最近创建的 10 条数据",
+        "{table} 的 amount 总和是多少",
+    ]
+    distinct = [rng.choice(templates).format(table=rng.choice(names)) for _ in range(max(1, count * 3 // 4))]
+    return [rng.choice(distinct) if i >= len(distinct) else distinct[i] for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=100)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-columns", type=int, default=40)
+    parser.add_argument("--max-rows", type=int, default=200)
+    args = parser.parse_args()
+    names = generate_database(args.output, args.tables, args.seed, max_columns=args.max_columns, max_rows=args.max_rows)
+    print(f"Generated {len(names)} tables at {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ from starlette.responses import Response
 from starlette.routing import Route, Mount
 
 from mcp_tools.tools_type import ToolsType
+from resources.text2sql.tracing import start_trace
 from tool import current_locals
 
 TOOLS_TYPES =  ["TEXT2SQL"]
@@ -34,20 +35,22 @@ class MCPServer:
             if "token" in arguments:
                 del arguments["token"]
 
-            # 检查函数名称是否在当前命名空间中，并且确实是一个可调用的函数
-            try:
-                if name in current_locals:
-                    candidate = current_locals[name]
-
-                    # 处理参数
-                    arguments = await MCPServer.process_arguments(candidate, arguments)
-
-                    # 调用工具
-                    text = await MCPServer.process_candidate(candidate, arguments)
-                else:
-                    text = f"tool '{name}' is not found."
-            except HTTPException as e:
-                raise ValueError(e.detail)
+            # 每次工具调用开启一条 trace, 检索、LLM、校验、执行等阶段作为其子 span
+            with start_trace("mcp.call_tool", tool=name, tools_type=tools_type):
+                # 检查函数名称是否在当前命名空间中，并且确实是一个可调用的函数
+                try:
+                    if name in current_locals:
+                        candidate = current_locals[name]
+
+                        # 处理参数
+                        arguments = await MCPServer.process_arguments(candidate, arguments)
+
+                        # 调用工具
+                        text = await MCPServer.process_candidate(candidate, arguments)
+                    else:
+                        text = f"tool '{name}' is not found."
+                except HTTPException as e:
+                    raise ValueError(e.detail)
             return [types.TextContent(type="text", text=text)]
 
         # Define MCP connection handler
@@ -1,5 +1,6 @@
 import os
 from enum import Enum
+from typing import List, Optional
 from pydantic import Field
 
 from pydantic import BaseModel
@@ -55,6 +56,12 @@ class DatabaseConfig(BaseModel):
     password: str
     database_name: str
     database_type: DatabaseType
+    query_timeout: Optional[float] = Field(default=None, description="生成 SQL 的执行超时(秒), 不填使用默认值 30, 0 表示不限制")
+    pool_size: Optional[int] = Field(default=None, description="连接池常驻连接数, 不填使用默认值 5")
+    max_overflow: Optional[int] = Field(default=None, description="连接池允许超出常驻连接数的额外连接数, 不填使用默认值 10")
+    pool_recycle: Optional[int] = Field(default=None, description="连接最大存活时间(秒), 不填使用默认值 1800")
+    pool_pre_ping: Optional[bool] = Field(default=None, description="取出连接前是否检测连接有效性, 不填使用默认值 true")
+    pool_timeout: Optional[float] = Field(default=None, description="从连接池获取连接的最长等待时间(秒), 不填使用默认值 30")
 
 class Model(BaseModel):
     model: str
@@ -66,4 +73,7 @@ class ModelConfig(BaseModel):
     embedding_model: Model
 
 class PromptsConfig(BaseModel):
-    text_to_sql_prompt: str = Field(..., json_schema_extra={"example": _DEFAULT_PROMPT}, description="Text-to-SQL Prompt Template")
\ No newline at end of file
+    text_to_sql_prompt: str = Field(..., json_schema_extra={"example": _DEFAULT_PROMPT}, description="Text-to-SQL Prompt Template")
+
+class CacheInvalidation(BaseModel):
+    tables: List[str] = Field(default_factory=list, description="需要失效的表名，为空时清空全部缓存")
\ No newline at end of file
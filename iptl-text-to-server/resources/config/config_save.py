@@ -2,9 +2,10 @@ from typing import Dict, Any, Tuple
 import threading
 from fastapi import HTTPException
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from resources.config.config import DatabaseType, DatabaseConfig, ModelConfig, PromptsConfig
+from resources.text2sql.db_pool import PoolSettings, get_engine, dispose_engine
 
 # 线程锁：保证配置更新的原子性
 _config_lock = threading.Lock()
@@ -67,22 +68,30 @@ def validate_db_connection(db_config: Dict[str, Any]) -> Tuple[bool, str]:
         else:
             return False, f"不支持的数据库类型：{database_type.value}（仅支持mysql/postgresql/oracle/SQL server）"
 
-        # 3. 创建引擎并测试连接（设置短超时，避免长时间阻塞）
-        engine = create_engine(
+        # 3. 获取共享引擎并测试连接（设置短超时，避免长时间阻塞）
+        #    校验通过后, 相同连接串与连接池参数的 DatabaseManager 会直接复用该引擎
+        engine = get_engine(
             connection_url,
+            PoolSettings.from_config(db_config),
             connect_args={"connect_timeout": 5},  # 连接超时5秒
-            pool_pre_ping=True  # 检查连接是否有效
         )
 
         # 4. 尝试建立连接
-        with engine.connect() as conn:
-            # 执行简单查询验证连接（不同数据库通用）
-            normal_sql = "SELECT 1"
-            if database_type == DatabaseType.Oracle:
-                normal_sql="SELECT 1 FROM DUAL"
-            result = conn.execute(text(normal_sql))
-            if result.scalar() == 1:
-                return True, "数据库连接验证成功"
+        valid = False
+        try:
+            with engine.connect() as conn:
+                # 执行简单查询验证连接（不同数据库通用）
+                normal_sql = "SELECT 1"
+                if database_type == DatabaseType.Oracle:
+                    normal_sql="SELECT 1 FROM DUAL"
+                result = conn.execute(text(normal_sql))
+                valid = result.scalar() == 1
+        finally:
+            # 校验失败(连接异常或查询结果不符)的引擎不保留在共享注册表中
+            if not valid:
+                dispose_engine(engine)
+        if not valid:
+            return False, "数据库连接失败：验证查询未返回预期结果"
 
     except SQLAlchemyError as e:
         # 捕获SQLAlchemy相关异常，返回具体错误信息
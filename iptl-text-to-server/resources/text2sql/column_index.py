@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+import chromadb
+
+from .config import Text2SQLConfig
+from .db_manager import DatabaseManager, TableMetadata
+
+logger = logging.getLogger(__name__)
+
+class ColumnIndex:
+    """
+    宽表的列级向量索引, 用于表检索之后的第二阶段列检索
+    只索引列数超过 column_prune_min_columns 的表; 每列一条文档(表名.列名、类型、注释),
+    来自内存中的表结构快照, 不访问表数据
+    清单文件 {collection}_columns.json 记录已索引表的结构指纹, 刷新时只重建结构变化的表
+    """
+
+    UPSERT_BATCH = 1000
+
+    def __init__(self, config: Text2SQLConfig, db_manager: DatabaseManager, embed_model):
+        self.config = config
+        self.db_manager = db_manager
+        self.embed_model = embed_model
+        client = chromadb.PersistentClient(path=config.chroma_db_path)
+        self._collection = client.get_or_create_collection(
+            f"{config.chroma_collection_name}_columns",
+            metadata={"hnsw:space": "cosine"},
+        )
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.config.chroma_db_path, f"{self.config.chroma_collection_name}_columns.json")
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"[ColumnIndex] Failed to load manifest {path}: {e}")
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        path = self._manifest_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def is_wide(self, meta: Optional[TableMetadata]) -> bool:
+        return meta is not None and len(meta.columns) > self.config.column_prune_min_columns
+
+    @staticmethod
+    def _column_document(meta: TableMetadata, column: Dict[str, Any]) -> str:
+        doc = f"{meta.name}.{column['name']} ({column['type']})"
+        if column.get("comment"):
+            doc += f": {column['comment']}"
+        if meta.comment:
+            doc += f" [table: {meta.comment}]"
+        return doc
+
+    @staticmethod
+    def _column_id(table: str, column: str) -> str:
+        return hashlib.md5(f"{table}\x00{column}".encode("utf-8")).hexdigest()
+
+    def _index_table(self, meta: TableMetadata):
+        columns = meta.columns
+        for i in range(0, len(columns), self.UPSERT_BATCH):
+            batch = columns[i:i + self.UPSERT_BATCH]
+            documents = [self._column_document(meta, c) for c in batch]
+            self._collection.upsert(
+                ids=[self._column_id(meta.name, c["name"]) for c in batch],
+                embeddings=self.embed_model.get_text_embedding_batch(documents),
+                documents=documents,
+                metadatas=[{"table": meta.name, "column": c["name"]} for c in batch],
+            )
+
+    def _delete_tables(self, tables: Iterable[str]):
+        tables = list(tables)
+        if tables:
+            self._collection.delete(where={"table": {"$in": tables}})
+
+    def sync(self) -> Dict[str, int]:
+        """
+        按结构指纹增量同步: 新增/变化的宽表重新嵌入列文档, 删除已不存在或不再是宽表的表
+        返回 {"indexed": 表数, "removed": 表数}
+        """
+        manifest = self._load_manifest()
+        indexed: Dict[str, str] = manifest.get("tables", {})
+        if manifest.get("min_columns") != self.config.column_prune_min_columns:
+            # 宽表阈值变化后全部重建
+            self._delete_tables(indexed)
+            indexed = {}
+
+        table_names = self.db_manager.get_table_names()
+        catalog = self.db_manager.reflect_catalog(table_names)
+        fingerprints = self.db_manager.get_table_fingerprints(table_names)
+        wide = {t for t, meta in catalog.items() if self.is_wide(meta)}
+
+        removed = [t for t in indexed if t not in wide or indexed[t] != fingerprints.get(t)]
+        self._delete_tables(removed)
+        for t in removed:
+            indexed.pop(t)
+
+        to_index = [t for t in sorted(wide) if t not in indexed]
+        for t in to_index:
+            self._index_table(catalog[t])
+            indexed[t] = fingerprints.get(t)
+
+        self._save_manifest({"min_columns": self.config.column_prune_min_columns, "tables": indexed})
+        if to_index or removed:
+            logger.info(f"[ColumnIndex] {len(to_index)} tables indexed, {len(removed)} removed")
+        return {"indexed": len(to_index), "removed": len(removed)}
+
+    # ---------- 检索 ----------
+
+    def _wide_tables(self, tables: List[str]) -> List[str]:
+        catalog = self.db_manager.reflect_catalog(tables)
+        return [t for t in tables if self.is_wide(catalog.get(t))]
+
+    def _query(self, embedding: List[float], tables: List[str]) -> Dict[str, List[str]]:
+        selection = {}
+        for table in tables:
+            result = self._collection.query(
+                query_embeddings=[embedding],
+                n_results=self.config.top_k_columns,
+                where={"table": table},
+                include=["metadatas"],
+            )
+            selection[table] = [m["column"] for m in result["metadatas"][0]]
+        return selection
+
+    def select(self, query_str: str, tables: List[str]) -> Dict[str, List[str]]:
+        """返回 {宽表: 与问题最相关的列}; 非宽表不出现在结果中(保留全部列)"""
+        wide = self._wide_tables(tables)
+        if not wide:
+            return {}
+        return self._query(self.embed_model.get_query_embedding(query_str), wide)
+
+    async def aselect(self, query_str: str, tables: List[str]) -> Dict[str, List[str]]:
+        wide = await asyncio.to_thread(self._wide_tables, tables)
+        if not wide:
+            return {}
+        embedding = await self.embed_model.aget_query_embedding(query_str)
+        return await asyncio.to_thread(self._query, embedding, wide)
@@ -0,0 +1,123 @@
+import json
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Table, func, literal, select, text, tablesample
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.types import LargeBinary, PickleType
+
+from .statement_timeout import statement_timeout
+
+logger = logging.getLogger(__name__)
+
+
+class ColumnSampler:
+    """
+    基于有界行样本统计各列的高频取值
+    每张表只发起一次取样查询(PostgreSQL 大表额外一次行数估计), 取回至多 sample_rows 行后在内存中统计,
+    代替逐列 GROUP BY 全表扫描
+    每条语句有执行超时, 整张表有时间预算, 超出预算时跳过取样
+    TABLESAMPLE 使用固定的 REPEATABLE 种子, 高频取值的并列项按取值排序, 数据不变时多次重建得到相同的样本,
+    从而使基于表描述内容的 LLM 描述缓存保持命中
+    """
+
+    # 采样比例的放大系数, 补偿 TABLESAMPLE SYSTEM 按数据页取样带来的偏差
+    _OVERSAMPLE = 2.0
+
+    def __init__(
+        self,
+        engine: Engine,
+        sample_rows: int = 1000,
+        top_n: int = 5,
+        timeout: float = 5.0,
+        time_budget: float = 15.0,
+        seed: int = 0,
+    ):
+        self.engine = engine
+        self.sample_rows = sample_rows
+        self.top_n = top_n
+        self.timeout = timeout
+        self.time_budget = time_budget
+        self.seed = seed
+
+    @staticmethod
+    def _is_sampleable(column) -> bool:
+        return not isinstance(column.type, (LargeBinary, PickleType))
+
+    def _remaining(self, deadline: float) -> float:
+        return deadline - time.monotonic()
+
+    def _statement_timeout(self, deadline: float) -> float:
+        remaining = self._remaining(deadline)
+        if remaining <= 0:
+            raise TimeoutError("sampling time budget exhausted")
+        return min(self.timeout, remaining) if self.timeout > 0 else remaining
+
+    def _estimate_rows(self, conn: Connection, table: Table, deadline: float) -> Optional[float]:
+        """PostgreSQL 通过 pg_class.reltuples 估计表行数, 其他方言返回 None"""
+        if conn.dialect.name != "postgresql":
+            return None
+        qualified = conn.dialect.identifier_preparer.format_table(table)
+        with statement_timeout(conn, self._statement_timeout(deadline)):
+            return conn.execute(
+                text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)"),
+                {"name": qualified},
+            ).scalar()
+
+    def _build_sample_query(self, table: Table, column_names: List[str], estimated_rows: Optional[float]):
+        source = table
+        if estimated_rows and estimated_rows > self.sample_rows * 10:
+            percent = min(100.0, self.sample_rows * self._OVERSAMPLE * 100.0 / estimated_rows)
+            source = tablesample(table, func.system(percent), name="sampled", seed=literal(self.seed))
+        return select(*[source.c[name] for name in column_names]).limit(self.sample_rows)
+
+    @staticmethod
+    def _hashable(value: Any) -> Any:
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return json.dumps(value, ensure_ascii=False, default=str)
+
+    def sample(self, table: Table) -> Dict[str, List[Any]]:
+        """
+        返回 {列名: 高频取值列表}(按出现次数降序, 不含 NULL)
+        超时、超出时间预算或查询失败时返回空字典
+        """
+        column_names = [c.name for c in table.columns if self._is_sampleable(c)]
+        if not column_names:
+            return {}
+
+        deadline = time.monotonic() + self.time_budget
+        try:
+            with self.engine.connect() as conn:
+                estimated_rows = self._estimate_rows(conn, table, deadline)
+                stmt = self._build_sample_query(table, column_names, estimated_rows)
+                with statement_timeout(conn, self._statement_timeout(deadline)):
+                    rows = conn.execute(stmt).fetchall()
+        except Exception as e:
+            logger.warning(f"Sampling skipped for table {table.name}: {e}")
+            return {}
+
+        counters = [Counter() for _ in column_names]
+        for row in rows:
+            for counter, value in zip(counters, row):
+                if value is not None:
+                    counter[self._hashable(value)] += 1
+
+        return {
+            name: self._most_common(counter)
+            for name, counter in zip(column_names, counters)
+            if counter
+        }
+
+    def _most_common(self, counter: Counter) -> List[Any]:
+        """按出现次数降序取前 top_n 个取值, 次数相同时按取值排序(不依赖行的返回顺序)"""
+        try:
+            ranked = sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+        except TypeError:
+            # 取值类型不可相互比较(如混合类型), 按类型名与字符串形式排序
+            ranked = sorted(counter.items(), key=lambda item: (-item[1], type(item[0]).__name__, str(item[0])))
+        return [value for value, _ in ranked[:self.top_n]]
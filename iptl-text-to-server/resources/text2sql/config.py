@@ -18,13 +18,88 @@ class Text2SQLConfig:
     base_chroma_path: str = str(Path(__file__).resolve().parent / "chroma_db")
     chroma_collection_name: str = 'text2sql'
     top_k_tables: int = 5
+    # 混合表检索(BM25 词法 + 向量, RRF 融合)
+    enable_hybrid_retrieval: bool = True
+    enable_lexical_fast_path: bool = True  # 问题中直接提到表名/列名时只用词法结果, 跳过嵌入请求与向量检索
+    lexical_fast_path_min_score: int = 2  # 快速路径的最低置信分: 提到表名计 2 分, 提到该表的每个特征列名计 1 分
+    hybrid_candidate_k: int = 20  # 融合前每路检索的候选表数
+    rrf_k: int = 60  # RRF 平滑常数
+    # 外键关联扩展(检索到的表之间缺少直接外键时, 补充最短 JOIN 路径上的中间表)
+    enable_join_expansion: bool = True
+    join_expansion_max_tables: int = 3  # 最多补充的中间表数
+    join_max_hops: int = 3  # 两表之间 JOIN 路径的最大跳数
+    # 提示词中表结构上下文的 token 预算, 超出时按相关性降级(去取样值/注释、裁剪列、去掉低排名表); 0 表示不限制
+    schema_token_budget: int = 8000
+    # 流式生成 SQL: 第一条语句完整后立即停止生成(不等待模型输出的解释文字)
+    stream_llm_output: bool = True
     table_info_for_llm: bool = False
-    table_description_threads: int = 10  # 生成表schema时的线程数
+    table_description_threads: int = 10  # 生成表schema时数据库阶段(反射、取样)的并发数
+    description_llm_concurrency: int = 8  # 生成表描述时 LLM 调用的初始并发数, 运行中按限流情况自适应调整
+    description_llm_max_concurrency: int = 32  # LLM 调用并发数上限
+    description_llm_max_retries: int = 5  # 限流/超时等失败后的最大重试次数
+
+    # 列取样设置(生成表描述时统计各列高频取值)
+    enable_column_sampling: bool = True
+    sample_rows: int = 1000  # 每张表最多取样的行数
+    sample_top_n: int = 5  # 每列保留的高频取值个数
+    sample_statement_timeout: float = 5.0  # 单条取样语句的超时(秒)
+    sample_time_budget: float = 15.0  # 单张表取样的时间预算(秒), 超出后跳过取样
+    sample_seed: int = 0  # TABLESAMPLE 的 REPEATABLE 种子, 固定种子使重建时样本(及表描述缓存键)保持不变
+    max_concurrent_queries: int = 16  # 异步链路中同时处理的查询数上限
+    schema_refresh_interval: int = 0  # 后台增量刷新 schema 索引的间隔(秒), 0 表示不启用
 
     # 检索增强设置
     enable_row_retrieval: bool = True
-    enable_col_retrieval: bool = True
-    row_retrieval_columns: Dict[str, List[str]] = field(default_factory=dict)
+    enable_col_retrieval: bool = True  # 宽表两阶段检索: 先检索表, 再只保留与问题相关的列
+    column_prune_min_columns: int = 30  # 列数超过该值的表才建列索引并裁剪
+    top_k_columns: int = 20  # 每张宽表保留的相关列数(主键/外键列另外保留)
+    row_retrieval_columns: Dict[str, List[str]] = field(default_factory=dict)  # 需要索引取值的列, 如 {'users': ['city']}
+
+    # 取值检索设置(问题中提到的取值匹配到列中真实存在的字面量, 写入提示词)
+    value_index_auto_columns: bool = False  # 自动索引低基数文本列(主键/外键列除外)
+    value_index_max_distinct: int = 10000  # 显式配置的列最多索引的不同取值数, 超出部分不索引
+    value_index_auto_max_distinct: int = 500  # 自动选列的基数上限, 超过则不索引该列
+    value_index_max_value_chars: int = 100  # 超过该长度的取值(长文本)不索引
+    value_index_statement_timeout: float = 30.0  # 读取单列取值的语句超时(秒)
+    top_k_values: int = 10  # 每个问题写入提示词的取值数量上限
+    value_match_min_score: float = 0.0  # 取值与问题的最低余弦相似度
+
+    # 语义缓存设置(相似问题直接复用已生成的 SQL, 跳过 LLM)
+    enable_semantic_cache: bool = True
+    semantic_cache_threshold: float = 0.95  # 余弦相似度阈值
+    semantic_cache_ttl: int = 7 * 24 * 3600  # 缓存有效期(秒)
+    semantic_cache_max_entries: int = 2000
+
+    # 源数据库连接池设置
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_recycle: int = 1800  # 连接最大存活时间(秒)
+    pool_pre_ping: bool = True  # 取出连接前检测连接是否有效
+    pool_timeout: float = 30.0  # 获取连接的最长等待时间(秒)
+
+    # 单次查询返回的最大行数, 超出部分不再从数据库读取, 并在结果中标记 truncated
+    max_result_rows: int = 100
+    # 生成 SQL 的执行超时(秒), 由数据库端强制执行(PostgreSQL statement_timeout / MySQL MAX_EXECUTION_TIME 等), 0 表示不限制
+    query_timeout: float = 30.0
+
+    # 查询结果缓存设置(相同的规范化 SQL 在有效期内不再访问数据库)
+    enable_result_cache: bool = True
+    result_cache_ttl: float = 60.0  # 缓存有效期(秒)
+    result_cache_max_bytes: int = 64 * 1024 * 1024  # 结果缓存内存预算(近似字节数)
+
+    # LLM 表描述缓存(原始描述未变化时重建索引不再调用 LLM)
+    enable_description_cache: bool = True
+
+    # 嵌入请求设置
+    embedding_batch_size: int = 64  # 单次嵌入请求的最大文本数
+    enable_embedding_cache: bool = True  # 表结构文本向量的磁盘缓存, 文本不变时重建索引不再请求嵌入接口
+    embedding_memory_cache_size: int = 1024  # 内存中缓存的问题向量数量
+
+    # 访问 LLM / 嵌入接口的共享 HTTP 连接池(同一地址的各引擎复用长连接)
+    llm_max_connections: int = 100  # 单个地址的最大连接数
+    llm_max_keepalive_connections: int = 20  # 保持空闲的长连接数
+    llm_keepalive_expiry: float = 60.0  # 空闲长连接的保持时间(秒)
+    llm_http2: bool = True  # 启用 HTTP/2, 需安装 h2, 未安装时使用 HTTP/1.1
 
     @property
     def config_id(self) -> str:
@@ -35,3 +110,13 @@ class Text2SQLConfig:
         """基于配置指纹的动态向量库路径"""
         return str(Path(self.base_chroma_path) / "vectors" / self.config_id)
 
+
+    @property
+    def description_cache_path(self) -> str:
+        """LLM 表描述缓存目录, 按内容寻址, 所有 config_id 共享"""
+        return str(Path(self.base_chroma_path) / "llm_descriptions")
+
+    @property
+    def embedding_cache_path(self) -> str:
+        """嵌入向量磁盘缓存文件, 按(模型名, 文本)寻址, 所有 config_id 共享"""
+        return str(Path(self.base_chroma_path) / "embeddings.sqlite3")
@@ -0,0 +1,285 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from llama_index.core.objects import SQLTableSchema
+
+from .db_manager import DatabaseManager, TableMetadata
+from .lexical_index import tokenize
+from .tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# 原始表描述(get_raw_table_description)中的列行: "  - name (TYPE)[, samples: [...]][: comment]"
+_COLUMN_LINE = re.compile(
+    r"^(?P<prefix>\s+- )(?P<name>[^\s(]+) \((?P<type>[^()]*(?:\([^()]*\)[^()]*)*)\)"
+    r"(?P<samples>, samples: \[(?:'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|[^\]'\"])*\])?"
+    r"(?P<comment>: .*)?$"
+)
+
+# 降级层级
+LEVEL_FULL = 0
+LEVEL_NO_SAMPLES = 1
+LEVEL_NO_COMMENTS = 2
+LEVEL_TRIM_COLUMNS = 3
+
+
+def _load_tokenizer() -> Callable[[str], int]:
+    try:
+        from llama_index.core.utils import get_tokenizer
+        tokenizer = get_tokenizer()
+        return lambda text: len(tokenizer(text))
+    except Exception as e:
+        logger.warning(f"[ContextAssembler] Tokenizer unavailable, estimating tokens by length: {e}")
+        return lambda text: max(1, len(text) // 3)
+
+
+_count_tokens: Optional[Callable[[str], int]] = None
+
+
+def count_tokens(text: str) -> int:
+    global _count_tokens
+    if _count_tokens is None:
+        _count_tokens = _load_tokenizer()
+    return _count_tokens(text) if text else 0
+
+
+def key_columns(meta: TableMetadata) -> List[str]:
+    """主键列与外键列, 裁剪时总是保留以便 JOIN"""
+    keys = list(meta.primary_key)
+    for fk in meta.foreign_keys:
+        keys.extend(fk["constrained_columns"])
+    return list(dict.fromkeys(keys))
+
+
+def render_table_info(meta: TableMetadata, columns: Optional[Iterable[str]] = None, comments: bool = True) -> str:
+    """
+    与 SQLDatabase.get_single_table_info 格式一致的表信息, 基于内存中的表结构快照生成
+    columns 为 None 时包含全部列, 否则只包含给定列并注明省略的列数
+    """
+    keep = None if columns is None else set(columns)
+    parts = []
+    for column in meta.columns:
+        if keep is not None and column["name"] not in keep:
+            continue
+        if comments and column.get("comment"):
+            parts.append(f"{column['name']} ({column['type']!s}): '{column.get('comment')}'")
+        else:
+            parts.append(f"{column['name']} ({column['type']!s})")
+
+    table_info = f"Table '{meta.name}' has columns: {', '.join(parts)}, "
+    if comments and meta.comment:
+        table_info += f"with comment: ({meta.comment}) "
+    foreign_keys = [
+        f"{fk['constrained_columns']} -> {fk['referred_table']}.{fk['referred_columns']}"
+        for fk in meta.foreign_keys
+    ]
+    if foreign_keys:
+        table_info += " and foreign keys: {}".format(", ".join(foreign_keys))
+    table_info += "."
+    omitted = len(meta.columns) - len(parts)
+    if omitted:
+        table_info += f" ({omitted} columns unrelated to the question are omitted)"
+    return table_info
+
+
+def render_description(
+    context_str: str, columns: Optional[Iterable[str]] = None, samples: bool = True, comments: bool = True
+) -> str:
+    """
+    按列集合与降级选项过滤 SchemaManager 生成的表描述
+    非原始格式的描述(如 LLM 扩写的自由文本)无法按列过滤, 去掉注释时整段省略
+    """
+    keep = None if columns is None else set(columns)
+    lines = context_str.splitlines()
+    structured = any(_COLUMN_LINE.match(line) for line in lines)
+    if not structured:
+        return context_str if comments else ""
+
+    result = []
+    for line in lines:
+        m = _COLUMN_LINE.match(line)
+        if m is None:
+            result.append(line)
+            continue
+        if keep is not None and m.group("name") not in keep:
+            continue
+        line = f"{m.group('prefix')}{m.group('name')} ({m.group('type')})"
+        if samples and m.group("samples"):
+            line += m.group("samples")
+        if comments and m.group("comment"):
+            line += m.group("comment")
+        result.append(line)
+    return "\n".join(result)
+
+
+def full_context_tokens(meta: TableMetadata, context_str: str) -> int:
+    """未降级时一张表上下文的 token 数, 在索引时计算并写入 _schemas.json"""
+    table_info = render_table_info(meta)
+    if context_str:
+        table_info += " The table description is: " + context_str
+    return count_tokens(table_info)
+
+
+@dataclass
+class TableContext:
+    """ 参与组装的一张表及其降级状态 """
+    schema: SQLTableSchema
+    meta: Optional[TableMetadata]
+    ranked_columns: List[str] = field(default_factory=list)  # 按相关性排序的列(不含键列)
+    keys: List[str] = field(default_factory=list)
+    column_limit: Optional[int] = None  # 保留的非键列数, None 表示不限
+    value_hint: str = ""
+    level: int = LEVEL_FULL
+    full_tokens: Optional[int] = None  # 索引时预先计算的完整上下文 token 数
+
+    @property
+    def table_name(self) -> str:
+        return self.schema.table_name
+
+
+class ContextAssembler:
+    """
+    在 token 预算内组装提示词中的表结构上下文
+    表按检索相关性排序; 超出预算时从排名最低的表开始依次降级:
+    去掉取样值 -> 去掉注释 -> 只保留相关性较高的列(主外键列始终保留) -> 去掉整张表(排名第一的表始终保留)
+    schema_token_budget 为 0 时不限制, 仍负责宽表列裁剪与取值提示的拼接
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        budget: int = 0,
+        token_lookup: Optional[Callable[[str], Optional[int]]] = None,
+    ):
+        self.db_manager = db_manager
+        self.budget = budget
+        self.token_lookup = token_lookup or (lambda table_name: None)
+
+    # ---------- 渲染 ----------
+
+    def _kept_columns(self, ctx: TableContext) -> Optional[List[str]]:
+        if ctx.column_limit is None:
+            return None
+        return ctx.keys + ctx.ranked_columns[:ctx.column_limit]
+
+    def render(self, ctx: TableContext) -> str:
+        columns = self._kept_columns(ctx)
+        samples = ctx.level < LEVEL_NO_SAMPLES
+        comments = ctx.level < LEVEL_NO_COMMENTS
+        if ctx.meta is not None:
+            table_info = render_table_info(ctx.meta, columns, comments=comments)
+        else:
+            table_info = self.db_manager.sql_database.get_single_table_info(ctx.table_name)
+        if ctx.schema.context_str:
+            description = render_description(ctx.schema.context_str, columns, samples=samples, comments=comments)
+            if description:
+                table_info += " The table description is: " + description
+        if ctx.value_hint:
+            table_info += "\nValues matching the question (use these exact literals): " + ctx.value_hint
+        return table_info
+
+    # ---------- 组装 ----------
+
+    def _rank_columns(
+        self, meta: TableMetadata, keys: Sequence[str], selected: Optional[List[str]], question_tokens: set
+    ) -> List[str]:
+        """非键列按相关性排序: 列检索选中的列 > 名称与问题有重合的列 > 其余列(保持表中顺序)"""
+        names = [c["name"] for c in meta.columns if c["name"] not in keys]
+        selected = [c for c in (selected or []) if c in names]
+        mentioned = [c for c in names if c not in selected and question_tokens & set(tokenize(c))]
+        rest = [c for c in names if c not in selected and c not in mentioned]
+        return list(dict.fromkeys(selected + mentioned + rest))
+
+    def build(
+        self,
+        query_str: str,
+        schemas: List[SQLTableSchema],
+        column_selection: Optional[Dict[str, List[str]]] = None,
+        value_hints: Optional[Dict[str, str]] = None,
+    ) -> List[TableContext]:
+        column_selection = column_selection or {}
+        value_hints = value_hints or {}
+        catalog = self.db_manager.reflect_catalog([s.table_name for s in schemas])
+        question_tokens = set(tokenize(query_str))
+        contexts = []
+        for schema in schemas:
+            meta = catalog.get(schema.table_name)
+            ctx = TableContext(schema=schema, meta=meta, value_hint=value_hints.get(schema.table_name, ""))
+            if meta is not None:
+                ctx.keys = key_columns(meta)
+                selected = column_selection.get(schema.table_name)
+                ctx.ranked_columns = self._rank_columns(meta, ctx.keys, selected, question_tokens)
+                if selected is not None:
+                    # 宽表两阶段检索的结果: 只保留选中的列(及键列)
+                    ctx.column_limit = len([c for c in selected if c in ctx.ranked_columns])
+                else:
+                    ctx.full_tokens = self.token_lookup(schema.table_name)
+            contexts.append(ctx)
+        return contexts
+
+    def assemble(
+        self,
+        query_str: str,
+        schemas: List[SQLTableSchema],
+        column_selection: Optional[Dict[str, List[str]]] = None,
+        value_hints: Optional[Dict[str, str]] = None,
+    ) -> str:
+        contexts = self.build(query_str, schemas, column_selection, value_hints)
+        kept = self.fit(contexts)
+        active = current_span()
+        if active is not None:
+            active.set_attribute("table_count", len(kept))
+            active.set_attribute("degraded_tables", sum(1 for ctx in kept if ctx.level > LEVEL_FULL))
+            active.set_attribute("dropped_tables", len(contexts) - len(kept))
+        return "\n\n".join(self.render(ctx) for ctx in kept)
+
+    def fit(self, contexts: List[TableContext]) -> List[TableContext]:
+        """按预算降级, 返回保留的表(顺序不变)"""
+        if not self.budget or not contexts:
+            return contexts
+
+        # 快速判断: 未裁剪的表使用索引时预先计算的 token 数, 全部放得下时无需再计数
+        if all(ctx.full_tokens is not None for ctx in contexts):
+            estimate = sum(ctx.full_tokens + count_tokens(ctx.value_hint) for ctx in contexts)
+            if estimate <= self.budget:
+                return contexts
+
+        sizes = {id(ctx): count_tokens(self.render(ctx)) for ctx in contexts}
+
+        def total() -> int:
+            return sum(sizes[id(ctx)] for ctx in kept)
+
+        def update(ctx: TableContext):
+            sizes[id(ctx)] = count_tokens(self.render(ctx))
+
+        kept = list(contexts)
+        if total() <= self.budget:
+            return kept
+
+        for level in (LEVEL_NO_SAMPLES, LEVEL_NO_COMMENTS):
+            for ctx in reversed(kept):
+                ctx.level = level
+                update(ctx)
+                if total() <= self.budget:
+                    return kept
+
+        for ctx in reversed(kept):
+            if ctx.meta is None:
+                continue
+            limit = len(ctx.ranked_columns) if ctx.column_limit is None else ctx.column_limit
+            while limit > 1 and total() > self.budget:
+                limit //= 2
+                ctx.level = LEVEL_TRIM_COLUMNS
+                ctx.column_limit = limit
+                update(ctx)
+            if total() <= self.budget:
+                return kept
+
+        while len(kept) > 1 and total() > self.budget:
+            dropped = kept.pop()
+            logger.debug(f"[ContextAssembler] Dropped table {dropped.table_name} to fit the token budget")
+        if total() > self.budget:
+            logger.warning(f"[ContextAssembler] Schema context ({total()} tokens) exceeds budget {self.budget}")
+        return kept
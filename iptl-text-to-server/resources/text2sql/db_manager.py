@@ -1,22 +1,47 @@
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Dict
+from dataclasses import dataclass, field
 import os
 import json
-from sqlalchemy import create_engine, inspect, MetaData, Table, select, func
+import hashlib
+import threading
+from sqlalchemy import inspect, MetaData, Table
 from sqlalchemy.engine import Engine
+from sqlalchemy.engine.reflection import ObjectKind
 from llama_index.core import SQLDatabase
 from llama_index.llms.openai_like import OpenAILike
+from .column_sampler import ColumnSampler
+from .db_pool import PoolSettings, get_engine
 from .config import Text2SQLConfig
-from .prompts import get_dialect_knowledge
+from .description_cache import TableDescriptionCache, get_description_cache
+from .http_clients import openai_http_kwargs
+from .prompts import get_dialect_knowledge, TABLE_DESCRIPTION_PROMPT, TABLE_DESCRIPTION_PROMPT_VERSION
+
+@dataclass
+class TableMetadata:
+    """ 单张表的结构快照 """
+    name: str
+    columns: List[Dict[str, Any]] = field(default_factory=list)
+    primary_key: List[str] = field(default_factory=list)
+    foreign_keys: List[Dict[str, Any]] = field(default_factory=list)
+    comment: Optional[str] = None
+
 
 class DatabaseManager:
     """负责管理数据库连接和元数据提取"""
 
+    # 批量反射时每批的表数量, 避免单条目录查询的 IN 列表过长
+    REFLECT_BATCH_SIZE = 500
+
     def __init__(self, db_uri: str, include_tables: Optional[List[str]] = None, config: Text2SQLConfig = None, llm: Optional[OpenAILike] = None):
         self.db_uri = db_uri
         self.include_tables = include_tables
         self.config = config
-        self.engine: Engine = create_engine(db_uri)
+        # 连接池按配置创建, 并与连接校验等场景共享同一个引擎
+        self.engine: Engine = get_engine(db_uri, PoolSettings.from_config(config))
         self.cache_dir = config.chroma_db_path if config else None
+        self.description_cache: Optional[TableDescriptionCache] = None
+        if config and config.enable_description_cache:
+            self.description_cache = get_description_cache(config.description_cache_path)
         
         # 优先使用传入的 llm 实例
         if llm:
@@ -33,6 +58,7 @@ class DatabaseManager:
                 timeout=300.0,
                 reuse_client=False,
                 is_chat_model=True,
+                **openai_http_kwargs(self.config.llm_api_base, self.config),
             )
         else:
             self.llm = None
@@ -43,16 +69,33 @@ class DatabaseManager:
         else:
             self._tables = self._get_all_table_names()
 
-        self.sql_database = SQLDatabase(self.engine, include_tables=self._tables)
+        self.sql_database = SQLDatabase(self.engine, include_tables=self._tables, view_support=True)
+
+        # 表结构内存快照, 由 reflect_catalog 从 SQLDatabase 已反射的 MetaData 填充
+        self._catalog: Dict[str, TableMetadata] = {}
+        self._catalog_lock = threading.Lock()
+
+        self.sampler: Optional[ColumnSampler] = None
+        if self.config is None:
+            self.sampler = ColumnSampler(self.engine)
+        elif self.config.enable_column_sampling:
+            self.sampler = ColumnSampler(
+                self.engine,
+                sample_rows=self.config.sample_rows,
+                top_n=self.config.sample_top_n,
+                timeout=self.config.sample_statement_timeout,
+                time_budget=self.config.sample_time_budget,
+                seed=self.config.sample_seed,
+            )
 
     def _get_cache_path(self) -> Optional[str]:
         if not self.cache_dir:
             return None
         return os.path.join(self.cache_dir, "db_table_names.json")
 
-    def _get_all_table_names(self) -> List[str]:
+    def _get_all_table_names(self, refresh: bool = False) -> List[str]:
         cache_path = self._get_cache_path()
-        if cache_path and os.path.exists(cache_path):
+        if not refresh and cache_path and os.path.exists(cache_path):
             try:
                 with open(cache_path, "r", encoding="utf-8") as f:
                     return json.load(f)
@@ -78,29 +121,200 @@ class DatabaseManager:
         """返回可用表名的列表"""
         return self._tables
 
+    def refresh_tables(self) -> List[str]:
+        """
+        重新从数据库读取表名(忽略 db_table_names.json 缓存并重写)
+        并重建 SQLDatabase 与表结构快照, 使新增/修改的表结构对查询可见
+        SQLDatabase 反射一次目录, 表结构快照直接由其 MetaData 构建
+        """
+        if not self.include_tables:
+            self._tables = self._get_all_table_names(refresh=True)
+        self.sql_database = SQLDatabase(self.engine, include_tables=self._tables, view_support=True)
+        with self._catalog_lock:
+            self._catalog.clear()
+        self.reflect_catalog(self._tables)
+        return self._tables
+
+    def reflect_catalog(self, table_names: Optional[List[str]] = None, refresh: bool = False) -> Dict[str, TableMetadata]:
+        """
+        获取表结构(列、主键、外键、表注释)的内存快照
+        SQLDatabase 初始化时已将可用表反射到 MetaData, 快照直接由其中的 Table 对象构建, 不再访问数据库;
+        MetaData 中没有的表才批量反射(SQLAlchemy 2.x 下使用 get_multi_* 接口, 每类信息每批只需一次目录查询)
+        :param table_names: 需要的表, 默认全部可用表
+        :param refresh: 是否忽略已有快照与 MetaData 重新反射
+        """
+        if table_names is None:
+            table_names = self._tables
+
+        with self._catalog_lock:
+            missing = list(table_names) if refresh else [t for t in table_names if t not in self._catalog]
+            if missing:
+                if not refresh:
+                    tables = self.sql_database.metadata_obj.tables
+                    for t in missing:
+                        if t in tables:
+                            self._catalog[t] = self._table_metadata_from_table(tables[t])
+                    missing = [t for t in missing if t not in self._catalog]
+                if missing:
+                    self._catalog.update(self._reflect_tables(missing))
+            return {t: self._catalog[t] for t in table_names if t in self._catalog}
+
+    @staticmethod
+    def _table_metadata_from_table(table: Table) -> TableMetadata:
+        """将已反射的 Table 对象转换为与 Inspector 返回格式一致的 TableMetadata"""
+        columns = [
+            {
+                'name': c.name,
+                'type': c.type,
+                'nullable': c.nullable,
+                'comment': c.comment,
+            }
+            for c in table.columns
+        ]
+        # Table.foreign_key_constraints 是无序集合, 按约束列在表中的位置排序, 保证指纹稳定
+        foreign_keys, seen = [], set()
+        for c in table.columns:
+            for fk in sorted(c.foreign_keys, key=lambda fk: fk.target_fullname):
+                constraint = fk.constraint
+                if constraint in seen:
+                    continue
+                seen.add(constraint)
+                foreign_keys.append({
+                    'name': constraint.name,
+                    'constrained_columns': [col.name for col in constraint.columns],
+                    'referred_table': constraint.referred_table.name,
+                    'referred_columns': [e.column.name for e in constraint.elements],
+                })
+        return TableMetadata(
+            name=table.name,
+            columns=columns,
+            primary_key=[c.name for c in table.primary_key.columns],
+            foreign_keys=foreign_keys,
+            comment=table.comment,
+        )
+
+    def _reflect_tables(self, table_names: List[str]) -> Dict[str, TableMetadata]:
+        inspector = inspect(self.engine)
+        if not hasattr(inspector, "get_multi_columns"):
+            # SQLAlchemy 1.x 没有批量反射接口, 逐表反射(共用一个 inspector)
+            return {t: meta for t in table_names if (meta := self._reflect_single_table(inspector, t))}
+
+        catalog = {}
+        # get_multi_* 默认只反射普通表(ObjectKind.TABLE), include_tables 中的视图需要 ObjectKind.ANY
+        kind = ObjectKind.ANY
+        for i in range(0, len(table_names), self.REFLECT_BATCH_SIZE):
+            batch = table_names[i:i + self.REFLECT_BATCH_SIZE]
+            columns = inspector.get_multi_columns(filter_names=batch, kind=kind)
+            pks = inspector.get_multi_pk_constraint(filter_names=batch, kind=kind)
+            fks = inspector.get_multi_foreign_keys(filter_names=batch, kind=kind)
+            try:
+                comments = inspector.get_multi_table_comment(filter_names=batch, kind=kind)
+            except NotImplementedError:
+                comments = {}
+
+            for key, cols in columns.items():
+                table_name = key[1]
+                catalog[table_name] = TableMetadata(
+                    name=table_name,
+                    columns=cols,
+                    primary_key=(pks.get(key) or {}).get('constrained_columns') or [],
+                    foreign_keys=fks.get(key) or [],
+                    comment=(comments.get(key) or {}).get('text'),
+                )
+        return catalog
+
+    @staticmethod
+    def _reflect_single_table(inspector, table_name: str) -> Optional[TableMetadata]:
+        try:
+            try:
+                comment = inspector.get_table_comment(table_name).get('text')
+            except NotImplementedError:
+                comment = None
+            return TableMetadata(
+                name=table_name,
+                columns=inspector.get_columns(table_name),
+                primary_key=(inspector.get_pk_constraint(table_name) or {}).get('constrained_columns') or [],
+                foreign_keys=inspector.get_foreign_keys(table_name),
+                comment=comment,
+            )
+        except Exception as e:
+            print(f"Warning: Failed to reflect table {table_name}: {e}")
+            return None
+
+    def get_table_metadata(self, table_name: str) -> Optional[TableMetadata]:
+        """从内存快照中获取单张表的结构, 快照中没有时单独反射"""
+        return self.reflect_catalog([table_name]).get(table_name)
+
+    def get_table_fingerprints(self, table_names: List[str]) -> Dict[str, str]:
+        """
+        基于内存快照计算表结构指纹(列名/类型/可空/注释、主键、外键、表注释)
+        任一项变化都会导致指纹变化, 用于增量刷新索引
+        """
+        fingerprints = {}
+        for table_name, meta in self.reflect_catalog(table_names).items():
+            columns = [
+                [c['name'], str(c['type']), c.get('nullable'), c.get('comment')]
+                for c in meta.columns
+            ]
+            fks = [
+                [fk['constrained_columns'], fk['referred_table'], fk['referred_columns']]
+                for fk in meta.foreign_keys
+            ]
+            fingerprints[table_name] = self._hash_table_structure(
+                columns, meta.primary_key, fks, meta.comment
+            )
+        return fingerprints
+
+    @staticmethod
+    def _hash_table_structure(columns, pk_columns, fks, table_comment) -> str:
+        payload = json.dumps(
+            {"columns": columns, "pk": pk_columns, "fks": fks, "comment": table_comment},
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
     def get_table_info(self, table_name: str) -> str:
         """返回特定表的信息"""
         return self.sql_database.get_single_table_info(table_name)
 
+    @property
+    def use_llm_description(self) -> bool:
+        """是否使用 LLM 对原始表描述进行扩写"""
+        return bool(self.config and self.config.table_info_for_llm and self.llm)
+
     def get_detailed_table_description(self, table_name: str) -> str:
         """
         生成包含键信息的详细表描述
         可以扩展基本信息模式, 提供更详细上下文
         当前, 用了 SQLDatabase 的检查功能, 后面可以进行改进
         """
+        description = self.get_raw_table_description(table_name)
 
-        inspector = inspect(self.engine)
+        if self.use_llm_description:
+            description = self.get_detailed_table_description_for_llm(description)
+
+        return description
+
+    def get_raw_table_description(self, table_name: str) -> str:
+        """
+        基于表结构快照与列取样生成原始表描述(只访问数据库, 不调用 LLM)
+        """
+
+        meta = self.get_table_metadata(table_name)
+        if meta is None:
+            raise ValueError(f"表 {table_name} 不存在或无法反射")
 
         # 基本列信息
-        columns = inspector.get_columns(table_name)
-        pk = inspector.get_pk_constraint(table_name)
-        fks = inspector.get_foreign_keys(table_name)
+        columns = meta.columns
+        fks = meta.foreign_keys
 
         description = f"Table: {table_name}\n"
 
         # 主键
-        if pk and pk.get('constrained_columns'):
-            description += f"Primary Key: {', '.join(pk['constrained_columns'])}\n"
+        if meta.primary_key:
+            description += f"Primary Key: {', '.join(meta.primary_key)}\n"
 
         # 外键
         if fks:
@@ -109,80 +323,95 @@ class DatabaseManager:
                 description += f"  - {', '.join(fk['constrained_columns'])} -> {fk['referred_table']}.{', '.join(fk['referred_columns'])}\n"
 
         description += "Columns:\n"
-        
-        # 准备查询样本数据
-        metadata = MetaData()
-        try:
-            table_obj = Table(table_name, metadata, autoload_with=self.engine)
-        except Exception as e:
-            print(f"Warning: Failed to reflect table {table_name} for sampling: {e}")
-            table_obj = None
-
-        with self.engine.connect() as connection:
-            for col in columns:
-                col_name = col['name']
-                col_info = f"  - {col_name} ({col['type']})"
-                
-                # 获取样本数据
-                samples = []
-                if table_obj is not None and col_name in table_obj.c:
-                    try:
-                        # 查询频次最高的5个值
-                        stmt = select(table_obj.c[col_name]).group_by(table_obj.c[col_name]).order_by(func.count().desc()).limit(5)
-                        result = connection.execute(stmt)
-                        samples = [row[0] for row in result]
-                    except Exception:
-                        pass
-                
-                if samples:
-                    formatted_samples = []
-                    for s in samples:
-                        s_str = str(s)
-                        if len(s_str) > 50:
-                            s_str = s_str[:50] + "..."
-                        formatted_samples.append(s_str)
-                    col_info += f", samples: {formatted_samples}"
-                
-                # 再添加用户注释
-                if col.get('comment'):
-                    col_info += f": {col['comment']}"
-
-                description += col_info + "\n"
-        
-        if self.config and self.config.table_info_for_llm and self.llm:
-            description = self.get_detailed_table_description_for_llm(description)
+
+        # 准备查询样本数据: 复用 SQLDatabase 初始化时批量反射的 Table 对象
+        table_obj = self.sql_database.metadata_obj.tables.get(table_name)
+        if table_obj is None:
+            try:
+                table_obj = Table(table_name, MetaData(), autoload_with=self.engine)
+            except Exception as e:
+                print(f"Warning: Failed to reflect table {table_name} for sampling: {e}")
+                table_obj = None
+
+        # 基于有界行样本一次性获取所有列的高频取值
+        table_samples = {}
+        if table_obj is not None and self.sampler is not None:
+            table_samples = self.sampler.sample(table_obj)
+
+        for col in columns:
+            col_name = col['name']
+            col_info = f"  - {col_name} ({col['type']})"
+
+            samples = table_samples.get(col_name, [])
+            if samples:
+                formatted_samples = []
+                for s in samples:
+                    s_str = str(s)
+                    if len(s_str) > 50:
+                        s_str = s_str[:50] + "..."
+                    formatted_samples.append(s_str)
+                col_info += f", samples: {formatted_samples}"
+
+            # 再添加用户注释
+            if col.get('comment'):
+                col_info += f": {col['comment']}"
+
+            description += col_info + "\n"
 
         return description
 
+    def _description_cache_key(self, description: str, dialect_knowledge: str) -> Optional[str]:
+        if self.description_cache is None:
+            return None
+        return self.description_cache.make_key(
+            description, dialect_knowledge, self.config.llm_model_name, TABLE_DESCRIPTION_PROMPT_VERSION
+        )
+
+    def get_cached_description_for_llm(self, description: str) -> Optional[str]:
+        """仅查询 LLM 表描述缓存, 未命中返回 None"""
+        dialect_knowledge = get_dialect_knowledge(self.sql_database.dialect)
+        cache_key = self._description_cache_key(description, dialect_knowledge)
+        if cache_key is None:
+            return None
+        return self.description_cache.get(cache_key)
+
+    def _build_description_prompt(self, description: str, dialect_knowledge: str) -> str:
+        return TABLE_DESCRIPTION_PROMPT.format(
+            dialect=self.sql_database.dialect,
+            dialect_knowledge=dialect_knowledge,
+            description=description,
+        )
+
+    def _store_description_for_llm(self, description: str, dialect_knowledge: str, detailed_description: str):
+        cache_key = self._description_cache_key(description, dialect_knowledge)
+        if cache_key is not None and detailed_description:
+            self.description_cache.put(cache_key, detailed_description)
+
     def get_detailed_table_description_for_llm(self, description: str) -> str:
         """
         使用 LLM 生成更加详细的表描述
         """
-        
-        dialect = self.sql_database.dialect
-        dialect_knowledge = get_dialect_knowledge(dialect)
+        cached = self.get_cached_description_for_llm(description)
+        if cached is not None:
+            return cached
+
+        dialect_knowledge = get_dialect_knowledge(self.sql_database.dialect)
 
         # 调用 LLM 生成详细描述
-        llm_prompt = f"""
-        请为以下数据库表生成中文描述。
-
-        要求：
-        1. 使用中文描述。
-        2. 严禁修改、翻译或编造原始表结构中的任何表名、列名和类型信息，必须保持原样。
-        3. 描述必须简洁明了，突出表的核心业务含义和数据特点，不要冗长。
-        4. 重点说明表的作用、主键关系以及关键字段的业务含义。
-        5. 如果你对该表结构非常熟悉且有十足把握，请提供 1-3 个高质量的“自然语言查询 -> SQL语句”示例。
-           - 示例必须准确无误。
-           - 格式：Q: [查询问题] A: [SQL语句]
-           - 注意: 如果没有十足把握，请不要提供任何示例!!!
-           - 一定注意: 如果生成示例, 必须是查询语句, 即 SELECT ...
-           - 参考以下{dialect}数据库知识：
-             {dialect_knowledge} 
-
-        原始表信息：
-        {description}
+        response = self.llm.complete(self._build_description_prompt(description, dialect_knowledge))
+        detailed_description = response.text
+
+        self._store_description_for_llm(description, dialect_knowledge, detailed_description)
+        return detailed_description
+
+    async def aget_detailed_table_description_for_llm(self, description: str) -> str:
         """
-        response = self.llm.complete(llm_prompt)
+        get_detailed_table_description_for_llm 的异步版本(不查询缓存, 由调用方先行查询)
+        """
+        dialect_knowledge = get_dialect_knowledge(self.sql_database.dialect)
+
+        response = await self.llm.acomplete(self._build_description_prompt(description, dialect_knowledge))
         detailed_description = response.text
 
-        return detailed_description 
\ No newline at end of file
+        self._store_description_for_llm(description, dialect_knowledge, detailed_description)
+        return detailed_description
@@ -0,0 +1,199 @@
+import bisect
+import logging
+import threading
+import time
+from dataclasses import dataclass, astuple
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+# 连接等待时间直方图的桶上界(秒)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """ 源数据库连接池参数 """
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_recycle: int = 1800  # 连接最大存活时间(秒), 应小于 pgbouncer/数据库端的空闲断开时间
+    pool_pre_ping: bool = True
+    pool_timeout: float = 30.0  # 从连接池获取连接的最长等待时间(秒)
+
+    @classmethod
+    def from_config(cls, config: Any) -> "PoolSettings":
+        """从 Text2SQLConfig、DatabaseConfig 或其字典形式中读取连接池参数, 缺失或为 None 的项使用默认值"""
+        defaults = cls()
+        values = {}
+        for name in cls.__dataclass_fields__:
+            if isinstance(config, dict):
+                value = config.get(name)
+            else:
+                value = getattr(config, name, None)
+            values[name] = getattr(defaults, name) if value is None else value
+        return cls(**values)
+
+    def engine_kwargs(self) -> Dict[str, Any]:
+        return {
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_recycle": self.pool_recycle,
+            "pool_pre_ping": self.pool_pre_ping,
+            "pool_timeout": self.pool_timeout,
+        }
+
+
+class PoolWaitStats:
+    """ 连接获取等待时间统计(累积直方图) """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bucket_counts = [0] * (len(WAIT_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds: float):
+        index = bisect.bisect_left(WAIT_BUCKETS, seconds)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.total += seconds
+
+    def observe_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(list(WAIT_BUCKETS) + ["+Inf"], self.bucket_counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {
+                "count": self.count,
+                "sum": round(self.total, 6),
+                "timeouts": self.timeouts,
+                "buckets": buckets,
+            }
+
+
+class _InstrumentedPoolMixin:
+    """ 统计每次从连接池获取连接的等待时间 """
+
+    wait_stats: PoolWaitStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.observe_timeout()
+            raise
+        self.wait_stats.observe(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+
+class InstrumentedAsyncAdaptedQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+
+def supports_pooling(db_uri: Union[str, URL]) -> bool:
+    """SQLite 内存库使用单连接池, 不应用连接池参数"""
+    url = make_url(db_uri)
+    return not (url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"))
+
+
+def pooled_engine_kwargs(db_uri: Union[str, URL], settings: PoolSettings, async_engine: bool = False) -> Dict[str, Any]:
+    """create_engine / create_async_engine 的连接池参数"""
+    if not supports_pooling(db_uri):
+        return {}
+    kwargs = settings.engine_kwargs()
+    kwargs["poolclass"] = InstrumentedAsyncAdaptedQueuePool if async_engine else InstrumentedQueuePool
+    return kwargs
+
+
+_ENGINES: Dict[Tuple[str, tuple], Engine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def get_engine(
+    db_uri: str,
+    settings: Optional[PoolSettings] = None,
+    connect_args: Optional[Dict[str, Any]] = None,
+) -> Engine:
+    """
+    返回进程内共享的同步引擎, 相同的连接串与连接池参数复用同一个引擎
+    (例如配置数据库时用于校验连接的引擎, 随后直接被 DatabaseManager 复用)
+    connect_args 仅在首次创建引擎时生效
+    """
+    settings = settings or PoolSettings()
+    key = (db_uri, astuple(settings))
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            engine = create_engine(
+                db_uri,
+                connect_args=connect_args or {},
+                **pooled_engine_kwargs(db_uri, settings),
+            )
+            _ENGINES[key] = engine
+        return engine
+
+
+def dispose_engine(engine: Engine) -> None:
+    """从共享注册表中移除并释放引擎的全部连接"""
+    with _ENGINES_LOCK:
+        for key, value in list(_ENGINES.items()):
+            if value is engine:
+                del _ENGINES[key]
+    engine.dispose()
+
+
+def pool_status(engine: Any) -> Dict[str, Any]:
+    """单个引擎(同步或异步)连接池的实时状态"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    pool = sync_engine.pool
+    status: Dict[str, Any] = {
+        "url": sync_engine.url.render_as_string(hide_password=True),
+        "pool_class": type(pool).__name__,
+        "status": pool.status(),
+    }
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats is not None:
+        status["wait_seconds"] = wait_stats.snapshot()
+    return status
+
+
+def get_pool_stats() -> List[Dict[str, Any]]:
+    """共享注册表中所有同步引擎的连接池状态"""
+    with _ENGINES_LOCK:
+        engines = list(_ENGINES.values())
+    return [pool_status(engine) for engine in engines]
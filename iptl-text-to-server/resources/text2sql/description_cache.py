@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TableDescriptionCache:
+    """
+    LLM 表描述的内容寻址磁盘缓存
+    键为 sha256(原始表描述, 方言知识, 模型名, 提示词版本), 值为 LLM 生成的描述文本
+    原始描述不变时重建索引直接复用, 指向相同表结构的不同 config_id 共享同一目录
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(description: str, dialect_knowledge: str, model_name: str, prompt_version: str) -> str:
+        digest = hashlib.sha256()
+        for part in (description, dialect_knowledge, model_name, prompt_version):
+            data = (part or "").encode("utf-8")
+            # 写入长度前缀, 避免不同字段拼接后产生相同的字节序列
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".txt")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                value = f.read()
+        except FileNotFoundError:
+            value = None
+        except OSError as e:
+            logger.warning(f"[DescriptionCache] Failed to read {key}: {e}")
+            value = None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再原子替换, 并发写入同一键时内容相同, 谁后替换都不影响正确性
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"[DescriptionCache] Failed to write {key}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_CACHES: Dict[str, TableDescriptionCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_description_cache(cache_dir: str) -> TableDescriptionCache:
+    """按目录返回进程内共享的缓存实例, 使命中统计在各 config_id 之间汇总"""
+    cache_dir = os.path.abspath(cache_dir)
+    with _CACHES_LOCK:
+        if cache_dir not in _CACHES:
+            _CACHES[cache_dir] = TableDescriptionCache(cache_dir)
+        return _CACHES[cache_dir]
+
+
+def get_description_cache_stats() -> Dict[str, Dict[str, int]]:
+    with _CACHES_LOCK:
+        return {path: cache.stats() for path, cache in _CACHES.items()}
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+from llama_index.core.objects import SQLTableSchema
+
+from .db_manager import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+try:
+    import openai
+    _THROTTLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError)
+except ImportError:  # pragma: no cover - openai 是 llama-index-llms-openai-like 的依赖
+    _THROTTLE_ERRORS = ()
+
+# (已完成数, 总数, 表名)
+ProgressCallback = Callable[[int, int, str], None]
+
+
+def is_throttling_error(exc: BaseException) -> bool:
+    """判断是否为限流(429)或超时错误, 这类错误需要降低并发并重试"""
+    if _THROTTLE_ERRORS and isinstance(exc, _THROTTLE_ERRORS):
+        return True
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    status_code = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return status_code == 429
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 自适应并发限制器
+    每完成一轮(当前上限次数)成功调用, 上限加 1; 遇到限流/超时时上限减半
+    同一时刻涌入的多个限流错误只触发一次减半
+    """
+
+    def __init__(self, initial: int, max_limit: int, min_limit: int = 1, cooldown: float = 1.0):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._successes = 0
+        self._last_backoff = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def release(self, throttled: bool = False):
+        async with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self._last_backoff >= self.cooldown:
+                    self._last_backoff = now
+                    self.limit = max(self.min_limit, self.limit // 2)
+                    self._successes = 0
+                    logger.info(f"[DescriptionPipeline] LLM throttled, concurrency limit -> {self.limit}")
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self._successes = 0
+                    self.limit += 1
+            self._cond.notify_all()
+
+
+class DescriptionPipeline:
+    """
+    表描述生成流水线
+    DB 阶段(反射快照 + 列取样 + 描述缓存查询)在线程池中运行, 以固定信号量限制数据库压力
+    LLM 阶段使用异步客户端, 并发数由 AdaptiveConcurrencyLimiter 根据限流情况动态调整
+    两个阶段按表流水线推进, 数据库取样与 LLM 调用互不占用对方的并发额度
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        db_concurrency: int = 5,
+        llm_concurrency: int = 8,
+        llm_max_concurrency: int = 32,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        progress_callback: Optional[ProgressCallback] = None,
+    ):
+        self.db_manager = db_manager
+        self.db_concurrency = db_concurrency
+        self.llm_concurrency = llm_concurrency
+        self.llm_max_concurrency = llm_max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.progress_callback = progress_callback or self._log_progress
+
+        self._done = 0
+        self._total = 0
+        self._progress_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, db_manager: DatabaseManager, **kwargs) -> "DescriptionPipeline":
+        config = db_manager.config
+        if config is None:
+            return cls(db_manager, **kwargs)
+        return cls(
+            db_manager,
+            db_concurrency=config.table_description_threads,
+            llm_concurrency=config.description_llm_concurrency,
+            llm_max_concurrency=config.description_llm_max_concurrency,
+            max_retries=config.description_llm_max_retries,
+            **kwargs,
+        )
+
+    @staticmethod
+    def _log_progress(done: int, total: int, table_name: str):
+        if done == total or done % max(1, total // 20) == 0:
+            logger.info(f"[DescriptionPipeline] {done}/{total} tables described (last: {table_name})")
+
+    def _report(self, table_name: str):
+        with self._progress_lock:
+            self._done += 1
+            done = self._done
+        try:
+            self.progress_callback(done, self._total, table_name)
+        except Exception as e:
+            logger.warning(f"[DescriptionPipeline] Progress callback failed: {e}")
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # 指数退避 + 全抖动
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _describe_raw(self, table_name: str):
+        description = self.db_manager.get_raw_table_description(table_name)
+        cached = None
+        if self.db_manager.use_llm_description:
+            cached = self.db_manager.get_cached_description_for_llm(description)
+        return description, cached
+
+    async def _describe_with_llm(self, table_name: str, description: str, limiter: AdaptiveConcurrencyLimiter) -> str:
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire()
+            throttled = False
+            try:
+                return await self.db_manager.aget_detailed_table_description_for_llm(description)
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                if attempt >= self.max_retries:
+                    logger.warning(
+                        f"[DescriptionPipeline] LLM description failed for {table_name} after "
+                        f"{attempt + 1} attempts, using raw description: {e}"
+                    )
+                    return description
+                delay = self._backoff_delay(attempt)
+                logger.info(f"[DescriptionPipeline] LLM call for {table_name} failed ({e}), retrying in {delay:.1f}s")
+            finally:
+                await limiter.release(throttled=throttled)
+            await asyncio.sleep(delay)
+        return description
+
+    async def _process_table(
+        self,
+        table_name: str,
+        db_semaphore: asyncio.Semaphore,
+        limiter: AdaptiveConcurrencyLimiter,
+    ) -> Optional[SQLTableSchema]:
+        try:
+            async with db_semaphore:
+                description, cached = await asyncio.to_thread(self._describe_raw, table_name)
+        except Exception as exc:
+            print(f'Table {table_name} generated an exception: {exc}')
+            self._report(table_name)
+            return None
+
+        if cached is not None:
+            description = cached
+        elif self.db_manager.use_llm_description:
+            description = await self._describe_with_llm(table_name, description, limiter)
+
+        self._report(table_name)
+        return SQLTableSchema(table_name=table_name, context_str=description)
+
+    async def run(self, table_names: List[str]) -> List[SQLTableSchema]:
+        self._done = 0
+        self._total = len(table_names)
+        db_semaphore = asyncio.Semaphore(max(1, self.db_concurrency))
+        limiter = AdaptiveConcurrencyLimiter(self.llm_concurrency, self.llm_max_concurrency)
+
+        results = await asyncio.gather(
+            *(self._process_table(t, db_semaphore, limiter) for t in table_names)
+        )
+        return [schema for schema in results if schema is not None]
@@ -0,0 +1,269 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from pydantic import PrivateAttr
+
+from .metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 进程间共享 sqlite 文件时, 等待写锁的最长时间(秒)
+SQLITE_BUSY_TIMEOUT = 30.0
+
+
+class EmbeddingStore:
+    """
+    向量的 sqlite 磁盘缓存
+    键为 sha256(模型名, 文本), 值为 float32 向量; 同一目录下的各 config_id 共享, 表结构不变时重建索引无需重新嵌入
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    # 单条 SELECT 的 IN 列表长度上限, 低于 sqlite 默认的变量数限制
+    _SELECT_CHUNK = 500
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        try:
+            with self._lock:
+                for i in range(0, len(keys), self._SELECT_CHUNK):
+                    chunk = keys[i:i + self._SELECT_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        except sqlite3.Error as e:
+            logger.warning(f"[EmbeddingCache] Failed to read {self.path}: {e}")
+        return found
+
+    def put_many(self, model: str, items: Sequence[Tuple[str, List[float]]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, model, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items
+        ]
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"[EmbeddingCache] Failed to write {self.path}: {e}")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_STORES: Dict[str, EmbeddingStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_embedding_store(path: str) -> EmbeddingStore:
+    """按路径返回进程内共享的磁盘缓存实例"""
+    path = os.path.abspath(path)
+    with _STORES_LOCK:
+        if path not in _STORES:
+            _STORES[path] = EmbeddingStore(path)
+        return _STORES[path]
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    带缓存的嵌入模型包装
+    文本(表结构描述等)嵌入: 批内去重, 先查磁盘缓存, 仅对未命中的文本按 embed_batch_size 分批调用底层模型
+    问题嵌入: 缓存在内存 LRU 中, 语义缓存查找、表检索与语义缓存写入对同一问题只请求一次
+    对外方法不派发 llama_index 嵌入事件, 事件只由底层模型的实际请求产生, 嵌入耗时指标不含缓存命中
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _store: Optional[EmbeddingStore] = PrivateAttr(default=None)
+    _memory: LRUCache = PrivateAttr()
+    _memory_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _stats: Dict[str, int] = PrivateAttr(default_factory=dict)
+
+    def __init__(
+        self,
+        inner: BaseEmbedding,
+        store: Optional[EmbeddingStore] = None,
+        batch_size: Optional[int] = None,
+        memory_size: int = 1024,
+        **kwargs: Any,
+    ):
+        batch_size = batch_size or inner.embed_batch_size
+        super().__init__(model_name=inner.model_name, embed_batch_size=batch_size, **kwargs)
+        inner.embed_batch_size = batch_size
+        self._inner = inner
+        self._store = store
+        self._memory = LRUCache(maxsize=max(1, memory_size))
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    def _key(self, kind: str, text: str) -> str:
+        digest = hashlib.sha256()
+        for part in (kind, self.model_name, text):
+            data = part.encode("utf-8")
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _count(self, name: str, amount: int = 1):
+        if amount:
+            with self._memory_lock:
+                self._stats[name] += amount
+
+    def stats(self) -> Dict[str, int]:
+        with self._memory_lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        return stats
+
+    # ---------- 查找与回填 ----------
+
+    def _plan(self, texts: List[str]) -> Tuple[List[str], Dict[str, str]]:
+        """返回每条文本的键, 以及去重后的 键 -> 文本"""
+        keys = [self._key("text", t) for t in texts]
+        unique: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            unique.setdefault(key, text)
+        return keys, unique
+
+    def _load_texts(self, keys: List[str]) -> Dict[str, List[float]]:
+        if self._store is None:
+            return {}
+        found = self._store.get_many(keys)
+        self._count("disk_hits", len(found))
+        return found
+
+    def _store_texts(self, items: List[Tuple[str, List[float]]]) -> None:
+        if self._store is not None:
+            self._store.put_many(self.model_name, items)
+
+    def _record_requests(self, total: int, missing: int):
+        CACHE_REQUESTS.inc(total - missing, cache="embedding", result="hit")
+        CACHE_REQUESTS.inc(missing, cache="embedding", result="miss")
+        self._count("misses", missing)
+
+    def _embed_texts(self, texts: List[str]) -> List[Embedding]:
+        keys, unique = self._plan(texts)
+        found = self._load_texts(list(unique))
+        missing = [k for k in unique if k not in found]
+        self._record_requests(len(unique), len(missing))
+        if missing:
+            vectors = self._inner.get_text_embedding_batch([unique[k] for k in missing])
+            new_items = list(zip(missing, vectors))
+            self._store_texts(new_items)
+            found.update(new_items)
+        return [found[k] for k in keys]
+
+    async def _aembed_texts(self, texts: List[str]) -> List[Embedding]:
+        keys, unique = self._plan(texts)
+        found = await asyncio.to_thread(self._load_texts, list(unique))
+        missing = [k for k in unique if k not in found]
+        self._record_requests(len(unique), len(missing))
+        if missing:
+            vectors = await self._inner.aget_text_embedding_batch([unique[k] for k in missing])
+            new_items = list(zip(missing, vectors))
+            await asyncio.to_thread(self._store_texts, new_items)
+            found.update(new_items)
+        return [found[k] for k in keys]
+
+    def _cached_query(self, query: str) -> Tuple[str, Optional[List[float]]]:
+        key = self._key("query", query)
+        with self._memory_lock:
+            vector = self._memory.get(key)
+        if vector is not None:
+            self._count("memory_hits")
+        self._record_requests(1, 0 if vector is not None else 1)
+        return key, vector.tolist() if vector is not None else None
+
+    def _remember_query(self, key: str, vector: List[float]) -> None:
+        # 以 float32 数组保存, 内存占用约为 Python 列表的 1/8
+        with self._memory_lock:
+            self._memory[key] = np.asarray(vector, dtype=np.float32)
+
+    # ---------- BaseEmbedding 公共接口 ----------
+
+    def get_query_embedding(self, query: str) -> Embedding:
+        key, vector = self._cached_query(query)
+        if vector is None:
+            vector = self._inner.get_query_embedding(query)
+            self._remember_query(key, vector)
+        return vector
+
+    async def aget_query_embedding(self, query: str) -> Embedding:
+        key, vector = self._cached_query(query)
+        if vector is None:
+            vector = await self._inner.aget_query_embedding(query)
+            self._remember_query(key, vector)
+        return vector
+
+    def get_text_embedding(self, text: str) -> Embedding:
+        return self._embed_texts([text])[0]
+
+    async def aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aembed_texts([text]))[0]
+
+    def get_text_embedding_batch(self, texts: List[str], show_progress: bool = False, **kwargs: Any) -> List[Embedding]:
+        return self._embed_texts(list(texts))
+
+    async def aget_text_embedding_batch(
+        self, texts: List[str], show_progress: bool = False, **kwargs: Any
+    ) -> List[Embedding]:
+        return await self._aembed_texts(list(texts))
+
+    # 抽象方法: 仅在绕过上面公共接口时使用
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self.aget_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self.get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self.aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed_texts(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._aembed_texts(texts)
@@ -1,28 +1,47 @@
-from threading import settrace_all_threads
-from llama_index.core.query_engine import SQLTableRetrieverQueryEngine
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
 from llama_index.llms.openai_like import OpenAILike
 from llama_index.embeddings.openai_like import OpenAILikeEmbedding
 from llama_index.core import Settings
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.llms.llm import LLM
 
 from .config import Text2SQLConfig
+from .context_assembler import ContextAssembler
 from .db_manager import DatabaseManager
+from .http_clients import openai_http_kwargs
+from .metrics import STAGE_SECONDS, CACHE_REQUESTS, install_llama_index_instrumentation
+from .tracing import span
 from .prompts import get_text_to_sql_template, get_dialect_knowledge
 from .retriever_manager import RetrieverManager
+from .schema_refresher import SchemaRefreshPoller
+from .semantic_cache import SemanticSQLCache
+from .sql_retriever import Text2SQLQueryEngine
 from llama_index.core import PromptTemplate
 
-
+logger = logging.getLogger(__name__)
 
 
 class Text2SQLEngine:
     """
     文本转 SQL 功能的核心引擎
     负责协调数据库连接、模式提取、检索设置和查询执行
+    llm / embed_model 未传入时按配置创建 OpenAI 兼容客户端(传入主要用于基准测试与本地替身)
     """
 
-    def __init__(self, config: Text2SQLConfig):
+    def __init__(
+        self,
+        config: Text2SQLConfig,
+        llm: Optional[LLM] = None,
+        embed_model: Optional[BaseEmbedding] = None,
+    ):
         self.config = config
+        install_llama_index_instrumentation()
 
-        self.llm = OpenAILike(
+        self.llm = llm or OpenAILike(
             model=self.config.llm_model_name,
             api_key=self.config.llm_api_key,
             api_base=self.config.llm_api_base,
@@ -32,6 +51,7 @@ class Text2SQLEngine:
             timeout=300.0,    # 增加超时时间到 300s
             reuse_client=False,
             is_chat_model=True,
+            **openai_http_kwargs(self.config.llm_api_base, self.config),
         )
         Settings.llm = self.llm
 
@@ -42,12 +62,35 @@ class Text2SQLEngine:
             llm=self.llm
         )
 
-        self.retriever_manager = RetrieverManager(self.config, self.db_manager)
+        self.retriever_manager = RetrieverManager(self.config, self.db_manager, embed_model=embed_model)
         self.table_retriever = self.retriever_manager.setup_table_retriever()
+        self.value_retriever = self.retriever_manager.setup_value_retriever()
+        self.column_retriever = self.retriever_manager.setup_column_retriever()
+        self.context_assembler = ContextAssembler(
+            self.db_manager,
+            budget=self.config.schema_token_budget,
+            token_lookup=self.retriever_manager.schema_tokens,
+        )
+
+        self.semantic_cache: Optional[SemanticSQLCache] = None
+        if self.config.enable_semantic_cache:
+            self.semantic_cache = SemanticSQLCache(self.config, self.retriever_manager.embed_model)
 
         self._prompt_text = ""
         self._build_query_engine()
 
+        # schema 刷新后的回调(如失效结果缓存), 参数为刷新的表差异
+        self._schema_listeners: List[Callable[[Dict[str, List[str]]], None]] = []
+        self._refresh_lock = threading.Lock()
+        self._schema_poller: Optional[SchemaRefreshPoller] = None
+        if self.config.schema_refresh_interval > 0:
+            self._schema_poller = SchemaRefreshPoller(
+                self.refresh_schema,
+                self.config.schema_refresh_interval,
+                name=f"schema-refresh-{self.config.config_id[:8]}",
+            )
+            self._schema_poller.start()
+
     def _get_prompt_text(self) -> str:
         template = get_text_to_sql_template()
         if isinstance(template, PromptTemplate):
@@ -64,14 +107,28 @@ class Text2SQLEngine:
     def _build_query_engine(self):
         text_to_sql_prompt = self._build_text_to_sql_prompt()
         # print(text_to_sql_prompt)
-        self.query_engine = SQLTableRetrieverQueryEngine(
+        self.query_engine = Text2SQLQueryEngine(
             sql_database=self.db_manager.sql_database,
             table_retriever=self.table_retriever,
+            value_retriever=self.value_retriever,
+            column_retriever=self.column_retriever,
+            context_assembler=self.context_assembler,
+            stream_llm_output=self.config.stream_llm_output,
             text_to_sql_prompt=text_to_sql_prompt,
             llm=self.llm,
-            synthesize_response=False,
-            sql_only=True,
         )
+        if self.semantic_cache:
+            self.semantic_cache.bind(self._get_cache_version(text_to_sql_prompt))
+
+    def _get_cache_version(self, text_to_sql_prompt: PromptTemplate) -> str:
+        """提示词模板(含方言知识)、模型与 schema 索引共同决定语义缓存版本"""
+        parts = [
+            text_to_sql_prompt.get_template(),
+            str(text_to_sql_prompt.kwargs.get("dialect_knowledge", "")),
+            self.config.llm_model_name,
+            self.retriever_manager.schema_version,
+        ]
+        return hashlib.md5("\n".join(parts).encode("utf-8")).hexdigest()
 
     def update_prompt(self):
         if self._get_prompt_text() != self._prompt_text:
@@ -81,8 +138,75 @@ class Text2SQLEngine:
     def query(self, query_str: str) -> str:
         """执行自然语言查询并返回结果"""
 
+        if self.semantic_cache:
+            with STAGE_SECONDS.time(stage="semantic_cache"), span("semantic_cache") as s:
+                # 会走词法快速路径的问题只做精确匹配, 整个请求不产生嵌入调用
+                fuzzy = not self.retriever_manager.takes_fast_path(query_str)
+                cached_sql = self.semantic_cache.lookup(query_str, fuzzy=fuzzy)
+                s.set_attribute("hit", cached_sql is not None)
+            CACHE_REQUESTS.inc(cache="semantic", result="hit" if cached_sql else "miss")
+            if cached_sql:
+                return cached_sql
+
         response = self.query_engine.query(query_str)
-        return str(response)
+        sql = str(response)
+
+        if self.semantic_cache:
+            self.semantic_cache.put(query_str, sql, fuzzy=fuzzy)
+        return sql
+
+    async def aquery(self, query_str: str) -> str:
+        """异步执行自然语言查询, 嵌入与 LLM 请求均不阻塞事件循环"""
+
+        if self.semantic_cache:
+            with STAGE_SECONDS.time(stage="semantic_cache"), span("semantic_cache") as s:
+                fuzzy = not await asyncio.to_thread(self.retriever_manager.takes_fast_path, query_str)
+                cached_sql = await self.semantic_cache.alookup(query_str, fuzzy=fuzzy)
+                s.set_attribute("hit", cached_sql is not None)
+            CACHE_REQUESTS.inc(cache="semantic", result="hit" if cached_sql else "miss")
+            if cached_sql:
+                return cached_sql
+
+        response = await self.query_engine.aquery(query_str)
+        sql = str(response)
+
+        if self.semantic_cache:
+            await asyncio.to_thread(self.semantic_cache.put, query_str, sql, fuzzy)
+        return sql
+
+    def forget(self, sql: str):
+        """SQL 校验或执行失败时, 从语义缓存中移除该 SQL"""
+        if self.semantic_cache:
+            self.semantic_cache.discard(sql)
+
+    def add_schema_listener(self, listener: Callable[[Dict[str, List[str]]], None]):
+        self._schema_listeners.append(listener)
+
+    def refresh_schema(self) -> Dict[str, List[str]]:
+        """
+        增量刷新 schema 索引: 仅重新描述/嵌入新增或结构变化的表, 删除已不存在的表
+        同时增量刷新列取值索引与宽表列索引
+        有变化时重建查询引擎(语义缓存随 schema 版本自动失效)并通知监听者
+        """
+        with self._refresh_lock:
+            diff = self.retriever_manager.refresh_table_index()
+            self.retriever_manager.refresh_value_index()
+            self.retriever_manager.refresh_column_index()
+            if any(diff.values()):
+                self._build_query_engine()
+                for listener in self._schema_listeners:
+                    try:
+                        listener(diff)
+                    except Exception as e:
+                        logger.error(f"Schema listener failed: {e}", exc_info=True)
+            return diff
+
+    def close(self):
+        """停止后台任务(引擎被淘汰时调用)"""
+        if self._schema_poller:
+            self._schema_poller.stop()
+        if self.semantic_cache:
+            self.semantic_cache.flush()
 
     def get_prompts(self) -> dict:
         """返回当前使用的提示词"""
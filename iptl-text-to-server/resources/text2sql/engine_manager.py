@@ -1,29 +1,37 @@
 import logging
+import time
+from concurrent.futures import Future
 from threading import Lock
+from typing import Callable, Dict, List, Tuple
 from cachetools import TTLCache
 from .config import Text2SQLConfig
+from .db_pool import dispose_engine
 from .engine import Text2SQLEngine
+from .metrics import ENGINE_POOL_EVENTS
 
 logger = logging.getLogger(__name__)
 
 class EngineCache(TTLCache):
     """
     继承 TTLCache 以实现资源回收回调。
-    当缓存项因过期(TTL)或超出大小(maxsize)被移除时，popitem 会被调用。
+    当缓存项因过期(TTL)或超出大小(maxsize)被移除时, 交给 on_removed 回调处理(是否回收由 EnginePool 按引用计数决定)。
     """
+    def __init__(self, maxsize, ttl, on_removed: Callable[[str, Text2SQLEngine], None], timer=time.monotonic):
+        super().__init__(maxsize=maxsize, ttl=ttl, timer=timer)
+        self._on_removed = on_removed
+
     def popitem(self):
         key, value = super().popitem()
-        self._dispose_resource(key, value)
+        ENGINE_POOL_EVENTS.inc(event="eviction")
+        self._on_removed(key, value)
         return key, value
 
-    def _dispose_resource(self, key, engine: Text2SQLEngine):
-        try:
-            logger.info(f"[EnginePool] Evicting engine for config_id: {key}. Disposing resources...")
-            if hasattr(engine, 'db_manager') and engine.db_manager.engine:
-                engine.db_manager.engine.dispose()
-                logger.info(f"[EnginePool] Database connection disposed for config_id: {key}")
-        except Exception as e:
-            logger.error(f"[EnginePool] Error disposing engine for {key}: {e}")
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, value in expired:
+            ENGINE_POOL_EVENTS.inc(event="expiration")
+            self._on_removed(key, value)
+        return expired
 
 class EnginePool:
     """
@@ -42,39 +50,132 @@ class EnginePool:
 
     def _initialize(self):
         # ttl=1800s (30分钟), maxsize可根据服务器内存调整
-        self.cache = EngineCache(maxsize=10, ttl=1800)
+        self.cache = EngineCache(maxsize=10, ttl=1800, on_removed=self._on_removed)
+        # 仅保护 cache / _building / _holders / _retained 的读写, 构建与回收过程不持有该锁
         self.pool_lock = Lock()
+        # config_id -> 正在构建中的 Future, 同一 config 的并发请求共享同一次构建
+        self._building: Dict[str, Future] = {}
+        # config_id -> 通过 acquire 持有引擎且尚未 release 的调用方数量
+        self._holders: Dict[str, int] = {}
+        # 已移出缓存但仍被持有的引擎; 同一 config 的下次请求直接复用, 不会再构建一份(及第二个 schema 轮询线程)
+        self._retained: Dict[str, Text2SQLEngine] = {}
+        # 已移出缓存且无人持有、等待在锁外回收的引擎
+        self._removed: List[Tuple[str, Text2SQLEngine]] = []
+
+    def _on_removed(self, key: str, engine: Text2SQLEngine):
+        """缓存淘汰/过期回调(在 pool_lock 内被调用)"""
+        if self._holders.get(key):
+            self._retained[key] = engine
+        else:
+            self._removed.append((key, engine))
+
+    def _dispose_removed(self):
+        with self.pool_lock:
+            removed, self._removed = self._removed, []
+        for key, engine in removed:
+            self._dispose_resource(key, engine)
+
+    @staticmethod
+    def _dispose_resource(key: str, engine: Text2SQLEngine):
+        """停止后台 schema 轮询并释放数据库连接池"""
+        try:
+            logger.info(f"[EnginePool] Evicting engine for config_id: {key}. Disposing resources...")
+            engine.close()
+            if hasattr(engine, 'db_manager') and engine.db_manager.engine:
+                dispose_engine(engine.db_manager.engine)
+                logger.info(f"[EnginePool] Database connection disposed for config_id: {key}")
+        except Exception as e:
+            logger.error(f"[EnginePool] Error disposing engine for {key}: {e}")
 
-    def get_engine(self, config: Text2SQLConfig) -> Text2SQLEngine:
+    def acquire(self, config: Text2SQLConfig) -> Text2SQLEngine:
+        """
+        获取引擎并登记为持有者(如长期持有引擎的 Text2SQLService)
+        持有期间引擎过期或被淘汰也不会被回收, 不再使用时调用 release
+        """
+        return self.get_engine(config, hold=True)
+
+    def release(self, config_id: str):
+        """释放 acquire 登记的持有; 最后一个持有者释放且引擎已移出缓存时回收资源"""
+        with self.pool_lock:
+            count = self._holders.get(config_id, 0) - 1
+            if count > 0:
+                self._holders[config_id] = count
+                return
+            self._holders.pop(config_id, None)
+            engine = self._retained.pop(config_id, None)
+        if engine is not None:
+            self._dispose_resource(config_id, engine)
+
+    def _hold(self, key: str, hold: bool):
+        if hold:
+            self._holders[key] = self._holders.get(key, 0) + 1
+
+    def get_engine(self, config: Text2SQLConfig, hold: bool = False) -> Text2SQLEngine:
         """
         获取或创建引擎实例。如果是新创建，会触发初始化流程（含DDL扫描和向量索引加载）。
+        不同 config_id 的构建可并发进行, 同一 config_id 的并发请求等待同一次构建(single-flight)。
+        构建失败时异常传递给所有等待者, 且不会缓存失败结果, 下次请求重新构建。
+        :param hold: 是否登记为持有者(见 acquire)
         """
         key = config.config_id
-        
+
+        try:
+            return self._get_engine(config, key, hold)
+        finally:
+            self._dispose_removed()
+
+    def _get_engine(self, config: Text2SQLConfig, key: str, hold: bool) -> Text2SQLEngine:
         with self.pool_lock:
+            # TTLCache 只在写入时清理过期项; 先清理, 使过期但仍被持有的引擎进入 _retained 被复用
+            self.cache.expire()
             if key in self.cache:
                 logger.info(f"[EnginePool] Cache hit for config_id: {key}")
-                return self.cache[key]
-            
-            # 双重检查
-            if key in self.cache:
+                ENGINE_POOL_EVENTS.inc(event="hit")
+                self._hold(key, hold)
                 return self.cache[key]
 
-            logger.info(f"[EnginePool] Cache miss. Initializing new engine for config_id: {key}")
-            try:
-                # 实例化引擎（耗时操作）
-                # 注意：这里仍在锁内，防止并发创建同一个config的多个实例
-                # 对于不同的config，理想情况下应该允许并发，但在Python GIL下
-                # 以及为了简化实现，这里使用全局锁也是可接受的，
-                # 除非初始化非常非常慢且高并发。
-                # 考虑到初始化涉及大量IO（DB, 向量库），如果需要更高并发，
-                # 可以使用基于key的锁（如 weakref Dict[str, Lock]）。
-                engine = Text2SQLEngine(config)
+            engine = self._retained.pop(key, None)
+            if engine is not None:
+                # 移出缓存后仍被持有的引擎重新放回缓存
+                logger.info(f"[EnginePool] Reusing retained engine for config_id: {key}")
+                ENGINE_POOL_EVENTS.inc(event="hit")
                 self.cache[key] = engine
+                self._hold(key, hold)
                 return engine
-            except Exception as e:
-                logger.error(f"[EnginePool] Failed to initialize engine: {e}")
-                raise e
+
+            future = self._building.get(key)
+            is_builder = future is None
+            if is_builder:
+                future = Future()
+                self._building[key] = future
+
+        if not is_builder:
+            ENGINE_POOL_EVENTS.inc(event="wait")
+            logger.info(f"[EnginePool] Waiting for in-flight initialization of config_id: {key}")
+            engine = future.result()
+            with self.pool_lock:
+                self._hold(key, hold)
+            return engine
+
+        logger.info(f"[EnginePool] Cache miss. Initializing new engine for config_id: {key}")
+        ENGINE_POOL_EVENTS.inc(event="miss")
+        try:
+            # 实例化引擎（耗时操作），在锁外执行
+            engine = Text2SQLEngine(config)
+        except BaseException as e:
+            logger.error(f"[EnginePool] Failed to initialize engine: {e}")
+            ENGINE_POOL_EVENTS.inc(event="build_error")
+            with self.pool_lock:
+                self._building.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self.pool_lock:
+            self.cache[key] = engine
+            self._building.pop(key, None)
+            self._hold(key, hold)
+        future.set_result(engine)
+        return engine
 
     def warm_up(self, config: Text2SQLConfig):
         """
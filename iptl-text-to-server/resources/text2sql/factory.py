@@ -38,6 +38,12 @@ def build_text2sql_config_from_global() -> Text2SQLConfig:
         raise ValueError("数据库尚未配置")
 
     config = Text2SQLConfig(db_uri=db_uri)
+    if db_config:
+        # 数据库配置中显式指定的执行超时与连接池参数覆盖默认值
+        for name in ("query_timeout", "pool_size", "max_overflow", "pool_recycle", "pool_pre_ping", "pool_timeout"):
+            value = getattr(db_config, name)
+            if value is not None:
+                setattr(config, name, value)
     
     model_config = get_global_model_config()
     if model_config:
@@ -71,3 +77,16 @@ def warm_up_engine_task():
         logger.info("[Factory] Engine warm-up completed.")
     except Exception as e:
         logger.error(f"[Factory] Engine warm-up failed: {e}", exc_info=True)
+
+def refresh_schema_task():
+    """
+    用于后台任务的 schema 增量刷新函数。
+    捕获异常并记录日志，避免崩溃。
+    """
+    try:
+        logger.info("[Factory] Starting schema refresh...")
+        config = build_text2sql_config_from_global()
+        diff = EnginePool().get_engine(config).refresh_schema()
+        logger.info(f"[Factory] Schema refresh completed: {diff}")
+    except Exception as e:
+        logger.error(f"[Factory] Schema refresh failed: {e}", exc_info=True)
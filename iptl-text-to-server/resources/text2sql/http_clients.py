@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import threading
+import weakref
+from dataclasses import dataclass, astuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from .metrics import REGISTRY, CallbackGauge, Counter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "text2sql_http_requests_total",
+    "Requests sent through the shared model-gateway HTTP clients.",
+    ["host"],
+))
+HTTP_CONNECTIONS_OPENED = REGISTRY.register(Counter(
+    "text2sql_http_connections_opened_total",
+    "New TCP connections opened by the shared HTTP clients (requests minus opened = reused).",
+    ["host"],
+))
+
+
+@dataclass(frozen=True)
+class HttpClientSettings:
+    """ 访问模型网关的共享 HTTP 连接池参数 """
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0  # 空闲连接保持时间(秒)
+    http2: bool = True  # 仅在安装了 h2 时生效
+
+    @classmethod
+    def from_config(cls, config: Any) -> "HttpClientSettings":
+        defaults = cls()
+        return cls(
+            max_connections=getattr(config, "llm_max_connections", None) or defaults.max_connections,
+            max_keepalive_connections=getattr(config, "llm_max_keepalive_connections", None)
+            or defaults.max_keepalive_connections,
+            keepalive_expiry=getattr(config, "llm_keepalive_expiry", None) or defaults.keepalive_expiry,
+            http2=getattr(config, "llm_http2", defaults.http2),
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+def _open_connections(transport: Any) -> int:
+    pool = getattr(transport, "_pool", None)
+    return len(getattr(pool, "connections", ()) or ())
+
+
+class _InstrumentedTransport(httpx.HTTPTransport):
+    """ 统计请求数与新建连接数(通过 httpcore trace 扩展捕获 connect_tcp 事件) """
+
+    def __init__(self, host: str, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        HTTP_REQUESTS.inc(host=self.host)
+        previous = request.extensions.get("trace")
+
+        def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == "connection.connect_tcp.complete":
+                HTTP_CONNECTIONS_OPENED.inc(host=self.host)
+            if previous is not None:
+                previous(event_name, info)
+
+        request.extensions["trace"] = trace
+        return super().handle_request(request)
+
+
+class _InstrumentedAsyncTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, host: str, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        HTTP_REQUESTS.inc(host=self.host)
+        previous = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == "connection.connect_tcp.complete":
+                HTTP_CONNECTIONS_OPENED.inc(host=self.host)
+            if previous is not None:
+                await previous(event_name, info)
+
+        request.extensions["trace"] = trace
+        return await super().handle_async_request(request)
+
+
+class _LoopLocalAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    按事件循环分别维护连接池的异步传输层
+    异步连接绑定创建它的事件循环, 而表描述生成等流程会在独立的 asyncio.run 中调用 LLM,
+    因此同一个 AsyncClient 在不同事件循环中使用各自的连接池; 事件循环被回收后其连接池随之释放
+    """
+
+    def __init__(self, factory: Callable[[], httpx.AsyncBaseTransport]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncBaseTransport]" = \
+            weakref.WeakKeyDictionary()
+
+    def _prune(self) -> None:
+        # 已关闭的事件循环中的连接不可再用, 直接丢弃(套接字随对象回收关闭)
+        for loop in [loop for loop in self._transports.keys() if loop.is_closed()]:
+            self._transports.pop(loop, None)
+
+    def _transport(self) -> httpx.AsyncBaseTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                self._prune()
+                transport = self._factory()
+                self._transports[loop] = transport
+            return transport
+
+    def transports(self) -> List[httpx.AsyncBaseTransport]:
+        with self._lock:
+            self._prune()
+            return list(self._transports.values())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.pop(loop, None)
+        if transport is not None:
+            await transport.aclose()
+
+
+class _SharedClient(httpx.Client):
+    """
+    共享的同步客户端
+    OpenAILike 在 reuse_client=False 时每次调用都以 with 语句包裹 OpenAI 客户端, 退出时会关闭传入的 httpx 客户端,
+    因此调用方的 close 不生效, 连接池只在 SharedHttpClients.close 时释放
+    """
+
+    def close(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        super().close()
+
+
+class _SharedAsyncClient(httpx.AsyncClient):
+    async def aclose(self) -> None:
+        pass
+
+
+class SharedHttpClients:
+    """ 同一模型网关地址共享的同步/异步 HTTP 客户端 """
+
+    def __init__(self, base_url: str, settings: HttpClientSettings):
+        self.base_url = base_url
+        self.settings = settings
+        self.host = httpx.URL(base_url).host or base_url
+        http2 = settings.http2 and H2_AVAILABLE
+        self.http2 = http2
+        limits = settings.limits()
+
+        self._sync_transport = _InstrumentedTransport(self.host, limits=limits, http2=http2)
+        self.client = _SharedClient(transport=self._sync_transport)
+        self._async_transport = _LoopLocalAsyncTransport(
+            lambda: _InstrumentedAsyncTransport(self.host, limits=limits, http2=http2)
+        )
+        self.async_client = _SharedAsyncClient(transport=self._async_transport)
+
+    def open_connections(self) -> int:
+        return _open_connections(self._sync_transport) + sum(
+            _open_connections(t) for t in self._async_transport.transports()
+        )
+
+    def close(self) -> None:
+        self.client.shutdown()
+
+
+_CLIENTS: Dict[Tuple[str, tuple], SharedHttpClients] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_http_clients(base_url: str, settings: Optional[HttpClientSettings] = None) -> SharedHttpClients:
+    """返回进程内共享的 HTTP 客户端, 相同地址与参数的 LLM / 嵌入模型复用同一连接池"""
+    settings = settings or HttpClientSettings()
+    key = (base_url.rstrip("/"), astuple(settings))
+    with _CLIENTS_LOCK:
+        clients = _CLIENTS.get(key)
+        if clients is None:
+            clients = SharedHttpClients(base_url, settings)
+            _CLIENTS[key] = clients
+            logger.info(f"[HttpClients] Created shared client for {clients.host} (http2={clients.http2})")
+        return clients
+
+
+def openai_http_kwargs(base_url: Optional[str], config: Any = None) -> Dict[str, Any]:
+    """OpenAILike / OpenAILikeEmbedding 的 http_client / async_http_client 参数; 未配置地址时返回空"""
+    if not base_url:
+        return {}
+    clients = get_http_clients(base_url, HttpClientSettings.from_config(config))
+    return {"http_client": clients.client, "async_http_client": clients.async_client}
+
+
+def _connection_samples() -> Iterable[Tuple[Tuple[str, ...], float]]:
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+    totals: Dict[str, int] = {}
+    for c in clients:
+        totals[c.host] = totals.get(c.host, 0) + c.open_connections()
+    return [((host,), count) for host, count in totals.items()]
+
+
+REGISTRY.register(CallbackGauge(
+    "text2sql_http_open_connections",
+    "Connections currently held by the shared model-gateway HTTP pools.",
+    ["host"],
+    _connection_samples,
+))
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from llama_index.core.objects import ObjectRetriever, SQLTableSchema
+from llama_index.core.schema import QueryType
+
+from .db_manager import TableMetadata
+from .tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class JoinEdge:
+    """ 一条外键关系: table.columns -> referred_table.referred_columns """
+    table: str
+    columns: Tuple[str, ...]
+    referred_table: str
+    referred_columns: Tuple[str, ...]
+
+
+class JoinGraph:
+    """
+    由反射得到的外键构建的无向表关联图(每个 config_id 一份, 随 schema 刷新重建)
+    用于在检索到的表之间查找最短 JOIN 路径, 补充路径上缺失的中间表
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._adjacency: Dict[str, Dict[str, List[JoinEdge]]] = {}
+
+    def rebuild(self, catalog: Dict[str, TableMetadata]):
+        adjacency: Dict[str, Dict[str, List[JoinEdge]]] = {name: {} for name in catalog}
+        edges = 0
+        for name, meta in catalog.items():
+            for fk in meta.foreign_keys:
+                referred = fk.get("referred_table")
+                if not referred or referred == name or referred not in catalog:
+                    continue
+                edge = JoinEdge(name, tuple(fk["constrained_columns"]), referred, tuple(fk["referred_columns"]))
+                adjacency[name].setdefault(referred, []).append(edge)
+                adjacency[referred].setdefault(name, []).append(edge)
+                edges += 1
+        with self._lock:
+            self._adjacency = adjacency
+        logger.info(f"[JoinGraph] Built over {len(adjacency)} tables, {edges} foreign keys")
+
+    def neighbors(self, table: str) -> List[str]:
+        return sorted(self._adjacency.get(table, {}))
+
+    def edges(self, a: str, b: str) -> List[JoinEdge]:
+        return list(self._adjacency.get(a, {}).get(b, []))
+
+    def _paths_from(self, source: str, targets: set, max_hops: int) -> Dict[str, List[str]]:
+        """从 source 出发的有界 BFS, 返回到各 target 的最短路径(含两端)"""
+        with self._lock:
+            adjacency = self._adjacency
+        parents: Dict[str, Optional[str]] = {source: None}
+        depth = {source: 0}
+        queue = deque([source])
+        found: Dict[str, List[str]] = {}
+        while queue and len(found) < len(targets):
+            node = queue.popleft()
+            if depth[node] >= max_hops:
+                continue
+            for neighbor in sorted(adjacency.get(node, {})):
+                if neighbor in parents:
+                    continue
+                parents[neighbor] = node
+                depth[neighbor] = depth[node] + 1
+                if neighbor in targets:
+                    path = [neighbor]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    found[neighbor] = path[::-1]
+                    # 到达目标表后不再穿过它继续扩展, 路径只经过非目标的中间表
+                    continue
+                queue.append(neighbor)
+        return found
+
+    def bridge_tables(self, tables: Sequence[str], max_hops: int, budget: int) -> List[str]:
+        """
+        返回连接 tables 所需的中间表(不含 tables 本身), 至多 budget 张
+        优先补充较短的路径, 同等长度时优先排名靠前的表
+        """
+        seeds = [t for t in dict.fromkeys(tables) if t in self._adjacency]
+        if len(seeds) < 2 or budget <= 0:
+            return []
+        seed_set = set(seeds)
+
+        candidates = []
+        for rank, source in enumerate(seeds):
+            later = set(seeds[rank + 1:])
+            if not later:
+                break
+            for target, path in self._paths_from(source, later, max_hops).items():
+                inner = path[1:-1]
+                if inner:
+                    candidates.append((len(path), rank, seeds.index(target), inner))
+
+        added: List[str] = []
+        for _, _, _, inner in sorted(candidates, key=lambda c: c[:3]):
+            new = [t for t in inner if t not in seed_set and t not in added]
+            if new and len(added) + len(new) <= budget:
+                added.extend(new)
+        return added
+
+
+class JoinPathExpander:
+    """
+    表检索的后处理: 检索结果之间没有直接外键关系时, 按外键图补充最短 JOIN 路径上的中间表
+    补充的表排在检索结果之后; 接口与 ObjectRetriever[SQLTableSchema] 一致
+    """
+
+    def __init__(
+        self,
+        retriever: ObjectRetriever[SQLTableSchema],
+        graph: JoinGraph,
+        schema_lookup: Callable[[str], Optional[SQLTableSchema]],
+        max_hops: int = 3,
+        budget: int = 3,
+    ):
+        self.retriever = retriever
+        self.graph = graph
+        self.schema_lookup = schema_lookup
+        self.max_hops = max_hops
+        self.budget = budget
+
+    def expand(self, schemas: List[SQLTableSchema]) -> List[SQLTableSchema]:
+        bridges = self.graph.bridge_tables([s.table_name for s in schemas], self.max_hops, self.budget)
+        extra = [s for s in map(self.schema_lookup, bridges) if s is not None]
+        active = current_span()
+        if active is not None:
+            active.set_attribute("join_tables", len(extra))
+        if extra:
+            logger.debug(f"[JoinGraph] Added bridge tables: {[s.table_name for s in extra]}")
+        return schemas + extra
+
+    def retrieve(self, str_or_query_bundle: QueryType) -> List[SQLTableSchema]:
+        return self.expand(self.retriever.retrieve(str_or_query_bundle))
+
+    async def aretrieve(self, str_or_query_bundle: QueryType) -> List[SQLTableSchema]:
+        schemas = await self.retriever.aretrieve(str_or_query_bundle)
+        return await asyncio.to_thread(self.expand, schemas)
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from llama_index.core.objects import ObjectRetriever, SQLTableSchema
+from llama_index.core.schema import QueryBundle, QueryType
+
+from .metrics import TABLE_RETRIEVALS
+from .tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+_IDENTIFIER = re.compile(r"[A-Za-z0-9_]+")
+_SUBWORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+
+def identifiers(text: str) -> List[str]:
+    """文本中的标识符(小写), 如 order_items、userId"""
+    return [t.lower() for t in _IDENTIFIER.findall(text)]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    词法检索的切词:
+    标识符保留整体, 并按下划线/驼峰拆成子词(order_items -> order_items, order, items);
+    中文按连续汉字切成二元组(单个汉字保留本身)
+    """
+    tokens = []
+    for ident in _IDENTIFIER.findall(text):
+        lower = ident.lower()
+        tokens.append(lower)
+        parts = [p.lower() for part in ident.split("_") for p in _SUBWORD.findall(part)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+@dataclass
+class LexicalDocument:
+    """ 一张表的词法文档 """
+    table_name: str
+    context_str: str
+    columns: List[str] = field(default_factory=list)
+    text: str = ""  # 表/列注释等附加文本
+
+
+class LexicalIndex:
+    """
+    进程内的 BM25 表索引, 文档由表名(加权)、列名、注释与 SchemaManager 生成的表描述组成
+    无需嵌入请求; rebuild 整体替换内部数据, 检索与重建可并发进行
+    """
+
+    # 表名在文档中的重复次数, 提高表名命中的权重
+    TABLE_NAME_WEIGHT = 3
+    # 列名在超过该数量的表中出现时(如 id、name、status)不作为"直接提到"的依据
+    ANCHOR_COLUMN_MAX_TABLES = 3
+    # 作为直接提到依据的最短标识符长度
+    ANCHOR_MIN_CHARS = 3
+    # 直接提到的置信分: 完整表名计 TABLE_MENTION_SCORE, 每个不同的特征列名计 1
+    TABLE_MENTION_SCORE = 2
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._docs: Dict[str, LexicalDocument] = {}
+        self._postings: Dict[str, List[Tuple[str, int]]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._avg_len = 0.0
+        self._column_tables: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _doc_tokens(self, doc: LexicalDocument) -> List[str]:
+        tokens = tokenize(doc.table_name) * self.TABLE_NAME_WEIGHT
+        tokens += tokenize(" ".join(doc.columns))
+        tokens += tokenize(doc.text)
+        tokens += tokenize(doc.context_str)
+        return tokens
+
+    def rebuild(self, documents: Sequence[LexicalDocument]):
+        docs = {d.table_name: d for d in documents}
+        postings: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+        doc_len = {}
+        column_tables: Dict[str, Set[str]] = defaultdict(set)
+        for name, doc in docs.items():
+            counts = Counter(self._doc_tokens(doc))
+            doc_len[name] = sum(counts.values())
+            for token, tf in counts.items():
+                postings[token].append((name, tf))
+            for column in doc.columns:
+                column_tables[column.lower()].add(name)
+        avg_len = sum(doc_len.values()) / len(doc_len) if doc_len else 0.0
+        with self._lock:
+            self._docs = docs
+            self._postings = dict(postings)
+            self._doc_len = doc_len
+            self._avg_len = avg_len
+            self._column_tables = dict(column_tables)
+
+    def get(self, table_name: str) -> Optional[LexicalDocument]:
+        return self._docs.get(table_name)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """BM25 检索, 返回 [(表名, 分数)] 按分数降序"""
+        with self._lock:
+            postings, doc_len, avg_len, n = self._postings, self._doc_len, self._avg_len, len(self._docs)
+        if not n:
+            return []
+        scores: Dict[str, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            entries = postings.get(token)
+            if not entries:
+                continue
+            idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+            for name, tf in entries:
+                norm = self.k1 * (1 - self.b + self.b * doc_len[name] / (avg_len or 1.0))
+                scores[name] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
+
+    def mentioned_tables(self, query: str, min_score: int = 1) -> List[str]:
+        """
+        问题中直接提到的表, 按置信分降序(同分按首次出现顺序), 只返回分数不低于 min_score 的表
+        完整出现的表名计 TABLE_MENTION_SCORE 分; 只属于少数几张表的列名, 每个不同的列名为这些表各计 1 分
+        """
+        with self._lock:
+            docs, column_tables = self._docs, self._column_tables
+        lowered = {name.lower(): name for name in docs}
+        scores: Dict[str, int] = {}
+        for ident in dict.fromkeys(identifiers(query)):
+            if len(ident) < self.ANCHOR_MIN_CHARS:
+                continue
+            if ident in lowered:
+                name = lowered[ident]
+                scores[name] = scores.get(name, 0) + self.TABLE_MENTION_SCORE
+                continue
+            tables = column_tables.get(ident)
+            if tables and len(tables) <= self.ANCHOR_COLUMN_MAX_TABLES:
+                for t in sorted(tables):
+                    scores[t] = scores.get(t, 0) + 1
+        ranked = sorted(scores, key=lambda name: scores[name], reverse=True)
+        return [name for name in ranked if scores[name] >= min_score]
+
+
+class HybridTableRetriever:
+    """
+    词法 + 向量的混合表检索, 接口与 ObjectRetriever[SQLTableSchema] 一致
+    - 快速路径: 问题中有把握地提到了表(表名, 或同一张表的多个特征列名, 置信分不低于 fast_path_min_score),
+      且 BM25 排名第一的表就是提到的表之一时, 只用词法结果(提到的表优先), 不发起嵌入请求与向量检索
+    - 其余情况: 词法与向量各取候选, 按 RRF(倒数排名融合)合并
+    """
+
+    def __init__(
+        self,
+        vector_retriever: ObjectRetriever[SQLTableSchema],
+        lexical_index: LexicalIndex,
+        top_k: int,
+        candidate_k: int = 20,
+        rrf_k: int = 60,
+        fast_path: bool = True,
+        fast_path_min_score: int = 2,
+    ):
+        self.vector_retriever = vector_retriever
+        self.lexical_index = lexical_index
+        self.top_k = top_k
+        self.candidate_k = candidate_k
+        self.rrf_k = rrf_k
+        self.fast_path = fast_path
+        self.fast_path_min_score = fast_path_min_score
+
+    def _schema(self, table_name: str) -> Optional[SQLTableSchema]:
+        doc = self.lexical_index.get(table_name)
+        if doc is None:
+            return None
+        return SQLTableSchema(table_name=doc.table_name, context_str=doc.context_str)
+
+    def _confident_mentions(self, query_str: str, lexical: List[Tuple[str, float]]) -> List[str]:
+        if not self.fast_path or not lexical:
+            return []
+        mentioned = self.lexical_index.mentioned_tables(query_str, self.fast_path_min_score)
+        if lexical[0][0] not in mentioned:
+            return []
+        return mentioned
+
+    def takes_fast_path(self, query_str: str) -> bool:
+        """问题是否会走快速路径(供检索之前的阶段判断是否需要问题向量)"""
+        return bool(self._confident_mentions(query_str, self.lexical_index.search(query_str, self.candidate_k)))
+
+    def _fast_path(self, query_str: str, lexical: List[Tuple[str, float]]) -> Optional[List[SQLTableSchema]]:
+        mentioned = self._confident_mentions(query_str, lexical)
+        if not mentioned:
+            return None
+        names = list(dict.fromkeys(mentioned + [name for name, _ in lexical]))[:self.top_k]
+        return [s for s in map(self._schema, names) if s is not None] or None
+
+    def _fuse(self, lexical: List[Tuple[str, float]], vector: List[SQLTableSchema]) -> List[SQLTableSchema]:
+        scores: Dict[str, float] = defaultdict(float)
+        schemas: Dict[str, SQLTableSchema] = {}
+        for rank, schema in enumerate(vector):
+            scores[schema.table_name] += 1.0 / (self.rrf_k + rank + 1)
+            schemas[schema.table_name] = schema
+        for rank, (name, _) in enumerate(lexical):
+            scores[name] += 1.0 / (self.rrf_k + rank + 1)
+        ranked = sorted(scores, key=lambda name: scores[name], reverse=True)
+        fused = []
+        for name in ranked:
+            schema = schemas.get(name) or self._schema(name)
+            if schema is not None:
+                fused.append(schema)
+            if len(fused) >= self.top_k:
+                break
+        return fused
+
+    @staticmethod
+    def _record_path(fast: bool):
+        TABLE_RETRIEVALS.inc(path="fast" if fast else "hybrid")
+        active = current_span()
+        if active is not None:
+            active.set_attribute("fast_path", fast)
+
+    @staticmethod
+    def _query_str(str_or_query_bundle: QueryType) -> str:
+        if isinstance(str_or_query_bundle, QueryBundle):
+            return str_or_query_bundle.query_str
+        return str(str_or_query_bundle)
+
+    def retrieve(self, str_or_query_bundle: QueryType) -> List[SQLTableSchema]:
+        query_str = self._query_str(str_or_query_bundle)
+        lexical = self.lexical_index.search(query_str, self.candidate_k)
+        fast = self._fast_path(query_str, lexical)
+        self._record_path(fast is not None)
+        if fast:
+            return fast
+        return self._fuse(lexical, self.vector_retriever.retrieve(str_or_query_bundle))
+
+    async def aretrieve(self, str_or_query_bundle: QueryType) -> List[SQLTableSchema]:
+        query_str = self._query_str(str_or_query_bundle)
+        lexical = await asyncio.to_thread(self.lexical_index.search, query_str, self.candidate_k)
+        fast = self._fast_path(query_str, lexical)
+        self._record_path(fast is not None)
+        if fast:
+            return fast
+        return self._fuse(lexical, await self.vector_retriever.aretrieve(str_or_query_bundle))
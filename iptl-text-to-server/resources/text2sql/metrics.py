@@ -0,0 +1,317 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 默认延迟直方图桶上界(秒), 覆盖从毫秒级的缓存命中到分钟级的 LLM/索引构建
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """ 单调递增计数器 """
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self._header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """ 累积直方图, 输出 _bucket / _sum / _count 三组样本 """
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> (各桶计数(非累积, 最后一个为 +Inf), 总和)
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        """统计 with 代码块的耗时(秒), 代码块抛出异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            value = self._values.get(self._label_values(labels))
+            return sum(value[0]) if value else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), t[0])) for k, (c, t) in self._values.items())
+        lines = self._header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + [float("inf")], counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """ 抓取时通过回调读取当前值的仪表, 回调返回 [(标签值元组, 数值), ...] """
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[Tuple[LabelValues, float]]],
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        try:
+            samples = list(self.callback())
+        except Exception as e:
+            logger.warning(f"[Metrics] Failed to collect {self.name}: {e}")
+            samples = []
+        for key, value in samples:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """ 指标注册表, 以 Prometheus 文本格式(0.0.4)输出全部指标 """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# 查询链路各阶段耗时
+# stage: queue_wait / semantic_cache / table_retrieval / value_retrieval / column_retrieval / context_assembly /
+#        embedding / llm / validation / execution / total
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "text2sql_stage_duration_seconds",
+    "Latency of each text2sql pipeline stage.",
+    ["stage"],
+))
+QUERIES = REGISTRY.register(Counter(
+    "text2sql_queries_total",
+    "Text2SQL queries by outcome.",
+    ["status"],
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "text2sql_cache_requests_total",
+    "Cache lookups by cache and result.",
+    ["cache", "result"],
+))
+TABLE_RETRIEVALS = REGISTRY.register(Counter(
+    "text2sql_table_retrievals_total",
+    "Table retrievals by path (fast = lexical only, hybrid = lexical + vector).",
+    ["path"],
+))
+LLM_STREAMS = REGISTRY.register(Counter(
+    "text2sql_llm_streams_total",
+    "Streamed SQL generations by outcome (early_stop = generation cancelled once the SQL was complete).",
+    ["outcome"],
+))
+
+# 索引构建/加载/增量刷新
+INDEX_SECONDS = REGISTRY.register(Histogram(
+    "text2sql_index_duration_seconds",
+    "Duration of schema index builds, loads and refreshes.",
+    ["operation"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0),
+))
+INDEX_TABLES = REGISTRY.register(Counter(
+    "text2sql_index_tables_total",
+    "Tables embedded into or removed from the schema index.",
+    ["change"],
+))
+
+# 引擎池
+ENGINE_POOL_EVENTS = REGISTRY.register(Counter(
+    "text2sql_engine_pool_events_total",
+    "EnginePool cache events (hit, miss, wait, eviction, expiration, build_error).",
+    ["event"],
+))
+
+
+def _db_pool_samples(field: str):
+    from .db_pool import get_pool_stats
+    return [((s["url"],), s[field]) for s in get_pool_stats() if field in s]
+
+
+REGISTRY.register(CallbackGauge(
+    "text2sql_db_pool_checked_out",
+    "Connections currently checked out of the source database pool.",
+    ["url"],
+    lambda: _db_pool_samples("checked_out"),
+))
+REGISTRY.register(CallbackGauge(
+    "text2sql_db_pool_overflow",
+    "Overflow connections currently open in the source database pool.",
+    ["url"],
+    lambda: _db_pool_samples("overflow"),
+))
+
+
+_instrumentation_installed = False
+_instrumentation_lock = threading.Lock()
+
+
+def install_llama_index_instrumentation():
+    """
+    注册 llama_index 事件处理器, 统计嵌入请求耗时(STAGE_SECONDS, stage=embedding)并记录 embedding 子 span,
+    LLM 调用结束时将 token 用量写入当前 span
+    嵌入调用分散在表检索、语义缓存等多处, 通过事件统一统计; 重复调用只注册一次
+    """
+    global _instrumentation_installed
+    with _instrumentation_lock:
+        if _instrumentation_installed:
+            return
+        try:
+            import llama_index.core.instrumentation as instrument
+            from cachetools import LRUCache
+            from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+            from llama_index.core.instrumentation.events.embedding import EmbeddingEndEvent, EmbeddingStartEvent
+            from llama_index.core.instrumentation.events.llm import LLMChatEndEvent, LLMCompletionEndEvent
+        except ImportError as e:
+            logger.info(f"[Metrics] llama_index instrumentation unavailable: {e}")
+            return
+
+        from .tracing import current_span, llm_usage_attributes, record_span
+
+        starts = LRUCache(maxsize=4096)
+        starts_lock = threading.Lock()
+
+        class _EmbeddingTimingHandler(BaseEventHandler):
+            @classmethod
+            def class_name(cls) -> str:
+                return "Text2SQLEmbeddingTimingHandler"
+
+            def handle(self, event, **kwargs):
+                if isinstance(event, EmbeddingStartEvent):
+                    with starts_lock:
+                        starts[event.span_id] = event.timestamp
+                elif isinstance(event, EmbeddingEndEvent):
+                    with starts_lock:
+                        started = starts.pop(event.span_id, None)
+                    if started is not None:
+                        STAGE_SECONDS.observe((event.timestamp - started).total_seconds(), stage="embedding")
+                        record_span(
+                            "embedding",
+                            started.timestamp(),
+                            event.timestamp.timestamp(),
+                            chunks=len(event.chunks),
+                        )
+                elif isinstance(event, (LLMChatEndEvent, LLMCompletionEndEvent)):
+                    span = current_span()
+                    if span is not None:
+                        span.set_attributes(**llm_usage_attributes(event.response))
+
+        instrument.get_dispatcher().add_event_handler(_EmbeddingTimingHandler())
+        _instrumentation_installed = True
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
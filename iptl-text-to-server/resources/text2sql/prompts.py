@@ -1,5 +1,6 @@
 from llama_index.core import PromptTemplate
 import os
+import hashlib
 from resources.config.config_save import get_global_prompts_config
 
 
@@ -19,6 +20,16 @@ def get_text_to_sql_template() -> PromptTemplate:
     return TEXT_TO_SQL_PROMPT
 
 
+# 表描述生成提示词, 模板内容变化时版本号随之变化, 使已缓存的 LLM 表描述失效
+table_description_path = os.path.join(current_dir, 'prompts', 'table_description.md')
+
+with open(table_description_path, 'r', encoding='utf-8') as f:
+    TABLE_DESCRIPTION_TMPL = f.read()
+
+TABLE_DESCRIPTION_PROMPT = PromptTemplate(TABLE_DESCRIPTION_TMPL)
+TABLE_DESCRIPTION_PROMPT_VERSION = hashlib.sha256(TABLE_DESCRIPTION_TMPL.encode('utf-8')).hexdigest()[:16]
+
+
 # Dialect Knowledge Logic
 def load_dialect_template(filename):
     path = os.path.join(current_dir, 'prompts', 'dialects', filename)
@@ -0,0 +1,115 @@
+import logging
+import threading
+from typing import Any, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+
+def _backend_id(driver_connection: Any) -> Optional[int]:
+    """获取驱动连接在数据库端的会话标识(PostgreSQL backend pid / MySQL connection id)"""
+    # psycopg2
+    if hasattr(driver_connection, "get_backend_pid"):
+        return driver_connection.get_backend_pid()
+    # psycopg 3
+    info = getattr(driver_connection, "info", None)
+    if info is not None and hasattr(info, "backend_pid"):
+        return info.backend_pid
+    # asyncpg
+    if hasattr(driver_connection, "get_server_pid"):
+        return driver_connection.get_server_pid()
+    # pymysql / aiomysql / mysqlclient
+    if hasattr(driver_connection, "thread_id"):
+        return driver_connection.thread_id()
+    return None
+
+
+class QueryCancelToken:
+    """
+    数据库查询取消令牌
+    执行方在取得连接后调用 bind 记录会话标识, 调用方(例如请求被取消时)调用 cancel 终止正在执行的语句:
+    PostgreSQL: 通过连接池之外的旁路连接执行 pg_cancel_backend
+    MySQL: 通过连接池之外的旁路连接执行 KILL QUERY
+    SQLite: sqlite3.Connection.interrupt()
+    cancel 可在任意线程调用, 先于 bind 调用时会在 bind 时立即取消
+    """
+
+    def __init__(self, engine: Engine):
+        # 用于建立旁路连接的同步引擎
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._dialect: Optional[str] = None
+        self._driver_connection: Any = None
+        self._backend_id: Optional[int] = None
+        self._bound = False
+        self.cancelled = False
+
+    def bind(self, dialect: str, driver_connection: Any) -> None:
+        with self._lock:
+            self._dialect = dialect
+            self._driver_connection = driver_connection
+            try:
+                self._backend_id = _backend_id(driver_connection)
+            except Exception as e:
+                logger.warning(f"[QueryCancel] Failed to get backend id: {e}")
+            self._bound = True
+            if self.cancelled:
+                self._cancel_backend()
+
+    def unbind(self) -> None:
+        # 正在发出的取消完成前阻塞, 连接归还连接池之后不会再收到针对旧会话的取消
+        with self._lock:
+            self._bound = False
+            self._driver_connection = None
+            self._backend_id = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            if self._bound:
+                self._cancel_backend()
+
+    def _side_connection(self) -> Any:
+        """
+        通过相同连接串的 NullPool 引擎新建一条连接, 不经过查询所用的连接池:
+        连接池耗尽时取消仍能发出, 也不会占用执行查询所需的连接; 连接关闭时直接断开
+        """
+        return create_engine(self.engine.url, poolclass=NullPool).raw_connection()
+
+    def _cancel_backend(self) -> None:
+        """
+        调用方持有 self._lock: 取消语句发出前会话保持绑定, unbind 需等待,
+        因此 backend id 不会在取消发出前被归还连接池的连接复用
+        """
+        dialect, driver_connection, backend_id = self._dialect, self._driver_connection, self._backend_id
+        try:
+            if dialect == "sqlite":
+                # aiosqlite 的驱动连接包装了 sqlite3.Connection
+                sqlite_conn = getattr(driver_connection, "_conn", driver_connection)
+                sqlite_conn.interrupt()
+            elif dialect == "postgresql" and backend_id is not None:
+                self._execute_on_side_connection(f"SELECT pg_cancel_backend({int(backend_id)})")
+            elif dialect in ("mysql", "mariadb") and backend_id is not None:
+                self._execute_on_side_connection(f"KILL QUERY {int(backend_id)}")
+            else:
+                logger.info(f"[QueryCancel] Cancellation not supported for dialect {dialect}")
+                return
+            logger.info(f"[QueryCancel] Cancelled running query on {dialect} (backend {backend_id})")
+        except Exception as e:
+            logger.warning(f"[QueryCancel] Failed to cancel query on {dialect}: {e}")
+
+    def _execute_on_side_connection(self, statement: str) -> None:
+        dbapi_conn = self._side_connection()
+        try:
+            cursor = dbapi_conn.cursor()
+            try:
+                cursor.execute(statement)
+            finally:
+                cursor.close()
+        finally:
+            dbapi_conn.close()
@@ -0,0 +1,140 @@
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from cachetools import TLRUCache
+from sqlglot import exp, parse_one
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str, str]
+
+
+@dataclass
+class _CachedResult:
+    rows: Any
+    tables: Set[str]
+    size: int
+    expires_at: float
+
+
+def extract_tables(sql: str, dialect: str) -> Set[str]:
+    """从 SQL 的 sqlglot AST 中提取引用的物理表名(小写, 不含 CTE 别名)"""
+    expression = parse_one(sql, dialect=dialect)
+    cte_names = {cte.alias_or_name.lower() for cte in expression.find_all(exp.CTE)}
+    return {
+        t.name.lower()
+        for t in expression.find_all(exp.Table)
+        if t.name and t.name.lower() not in cte_names
+    }
+
+
+def _normalize_table_name(table_name: str) -> str:
+    return table_name.strip().strip('"`[]').split(".")[-1].strip('"`[]').lower()
+
+
+class QueryResultCache:
+    """
+    SQL 执行结果缓存
+    以 (config_id, 方言, 校验后的规范化 SQL) 为键, 每个条目有独立 TTL
+    总内存以结果的近似字节数为预算, 超出时按 LRU 淘汰
+    可按表名失效: 任何引用了该表的缓存结果都会被移除
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, default_ttl: float = 60.0):
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._cache = TLRUCache(
+            maxsize=max_bytes,
+            ttu=lambda key, value, now: value.expires_at,
+            timer=time.monotonic,
+            getsizeof=lambda value: value.size,
+        )
+        # 表名 -> 引用该表的缓存键
+        self._table_index: Dict[str, Set[CacheKey]] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _estimate_size(rows: Any) -> int:
+        """以 JSON 序列化长度近似结果占用的内存"""
+        try:
+            return len(json.dumps(rows, default=str, ensure_ascii=False))
+        except Exception:
+            return len(str(rows))
+
+    def get(self, config_id: str, dialect: str, sql: str) -> Optional[Any]:
+        key = (config_id, dialect, sql)
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value.rows
+
+    def put(self, config_id: str, dialect: str, sql: str, rows: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+
+        try:
+            tables = extract_tables(sql, dialect)
+        except Exception as e:
+            logger.warning(f"[ResultCache] Failed to extract tables, result not cached: {e}")
+            return
+
+        size = self._estimate_size(rows)
+        key = (config_id, dialect, sql)
+        value = _CachedResult(rows=rows, tables=tables, size=size, expires_at=time.monotonic() + ttl)
+
+        with self._lock:
+            if size > self._cache.maxsize:
+                return
+            self._cache[key] = value
+            for table in tables:
+                self._table_index.setdefault(table, set()).add(key)
+            self._prune_table_index()
+
+    def _prune_table_index(self) -> None:
+        """移除已被淘汰或过期条目在表索引中的残留键"""
+        indexed = sum(len(keys) for keys in self._table_index.values())
+        if indexed <= 2 * len(self._cache) + 64:
+            return
+        for table in list(self._table_index):
+            keys = {k for k in self._table_index[table] if k in self._cache}
+            if keys:
+                self._table_index[table] = keys
+            else:
+                del self._table_index[table]
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """移除引用了任一给定表的缓存结果, 返回移除的条目数"""
+        removed = 0
+        with self._lock:
+            for table in {_normalize_table_name(t) for t in tables}:
+                for key in self._table_index.pop(table, set()):
+                    if self._cache.pop(key, None) is not None:
+                        removed += 1
+        if removed:
+            logger.info(f"[ResultCache] Invalidated {removed} cached results.")
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._table_index.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "bytes": self._cache.currsize,
+                "max_bytes": self._cache.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
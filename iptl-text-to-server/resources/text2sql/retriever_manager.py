@@ -1,34 +1,97 @@
 from typing import List, Dict, Optional
 import os
 import json
+import hashlib
 import logging
+import uuid
 import chromadb
 from filelock import FileLock
 from llama_index.core import VectorStoreIndex, Settings
+from llama_index.core.base.embeddings.base import BaseEmbedding
 from llama_index.core.objects import SQLTableSchema, SQLTableNodeMapping, ObjectIndex, ObjectRetriever
-from llama_index.core.retrievers import BaseRetriever
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.embeddings.openai_like import OpenAILikeEmbedding
 from llama_index.core import StorageContext
+from llama_index.core.schema import TextNode
 
+from .column_index import ColumnIndex
 from .config import Text2SQLConfig
+from .context_assembler import full_context_tokens, render_table_info
 from .db_manager import DatabaseManager
+from .embeddings import CachedEmbedding, get_embedding_store
+from .http_clients import openai_http_kwargs
+from .join_graph import JoinGraph, JoinPathExpander
+from .lexical_index import HybridTableRetriever, LexicalDocument, LexicalIndex
+from .metrics import INDEX_SECONDS, INDEX_TABLES
 from .schema_manager import SchemaManager
+from .value_index import ValueIndex
 
 logger = logging.getLogger(__name__)
 
+
+class CatalogTableNodeMapping(SQLTableNodeMapping):
+    """
+    SQLTableNodeMapping 的节点文本通过 get_single_table_info 逐表查询数据库目录(每张表 3 次以上的目录查询)
+    这里改为取自 DatabaseManager 的批量反射快照, 节点文本与 id 与原实现一致(已有向量索引与嵌入缓存保持有效)
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        super().__init__(db_manager.sql_database)
+        self._db_manager = db_manager
+
+    def to_node(self, obj: SQLTableSchema) -> TextNode:
+        meta = self._db_manager.get_table_metadata(obj.table_name)
+        table_info = render_table_info(meta) if meta is not None else self._db_manager.get_table_info(obj.table_name)
+        table_text = f"Schema of table {obj.table_name}:\n{table_info}\n"
+        metadata = {"name": obj.table_name}
+        if obj.context_str is not None:
+            table_text += f"Context of table {obj.table_name}:\n{obj.context_str}"
+            metadata["context"] = obj.context_str
+
+        return TextNode(
+            id_=str(uuid.uuid5(namespace=uuid.NAMESPACE_DNS, name=f"{obj.table_name}{obj.context_str}")),
+            text=table_text,
+            metadata=metadata,
+            excluded_embed_metadata_keys=["name", "context"],
+            excluded_llm_metadata_keys=["name", "context"],
+        )
+
+
 class RetrieverManager:
-    def __init__(self, config: Text2SQLConfig, db_manager: DatabaseManager):
+    def __init__(self, config: Text2SQLConfig, db_manager: DatabaseManager, embed_model: Optional[BaseEmbedding] = None):
         self.config = config
         self.db_manager = db_manager
 
-        self.embed_model = OpenAILikeEmbedding(
+        embed_model = embed_model or OpenAILikeEmbedding(
             model_name=self.config.embedding_model_name,
             api_key=self.config.embedding_api_key,
-            api_base=self.config.embedding_api_base
+            api_base=self.config.embedding_api_base,
+            **openai_http_kwargs(self.config.embedding_api_base, self.config),
         )
+        # 索引构建与查询检索共用带缓存的嵌入模型: 批内去重 + 磁盘缓存(表结构文本) + 内存缓存(问题)
+        if not isinstance(embed_model, CachedEmbedding):
+            store = get_embedding_store(self.config.embedding_cache_path) if self.config.enable_embedding_cache else None
+            embed_model = CachedEmbedding(
+                embed_model,
+                store=store,
+                batch_size=self.config.embedding_batch_size,
+                memory_size=self.config.embedding_memory_cache_size,
+            )
+        self.embed_model = embed_model
         Settings.embed_model = self.embed_model
 
+        # schema 索引指纹, 索引重建后变化(用于语义缓存失效)
+        self.schema_version: str = ""
+        self.value_index: Optional[ValueIndex] = None
+        self.column_index: Optional[ColumnIndex] = None
+        self.lexical_index: Optional[LexicalIndex] = None
+        self.hybrid_retriever: Optional[HybridTableRetriever] = None
+        self.join_graph: Optional[JoinGraph] = None
+        # 表名 -> SchemaManager 生成的表描述(_schemas.json 的内存副本)
+        self._schema_contexts: Dict[str, str] = {}
+        # 表名 -> 完整表上下文的 token 数, 供 ContextAssembler 快速判断是否超出预算
+        self._schema_tokens: Dict[str, int] = {}
+
     def _schema_cache_path(self) -> str:
         return os.path.join(
             self.config.chroma_db_path,
@@ -38,99 +101,266 @@ class RetrieverManager:
     def _build_and_persist_schemas(self) -> List[SQLTableSchema]:
         schema_manager = SchemaManager(self.db_manager)
         schemas = schema_manager.get_table_schema()
+        fingerprints = self.db_manager.get_table_fingerprints([s.table_name for s in schemas])
+        catalog = self.db_manager.reflect_catalog([s.table_name for s in schemas])
+        data = [
+            {
+                "table_name": s.table_name,
+                "context_str": s.context_str,
+                "fingerprint": fingerprints.get(s.table_name),
+                "tokens": self._context_tokens(catalog, s.table_name, s.context_str),
+            }
+            for s in schemas
+        ]
+        self._save_schema_cache(data)
+        return schemas
+
+    def _load_schema_cache(self) -> List[dict]:
+        path = self._schema_cache_path()
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to load schema cache {path}: {e}")
+            return []
+
+    def _save_schema_cache(self, data: List[dict]):
         path = self._schema_cache_path()
         os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-        data = [{"table_name": s.table_name, "context_str": s.context_str} for s in schemas]
-        with open(path, "w", encoding="utf-8") as f:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False)
-        return schemas
+        os.replace(tmp_path, path)
+
+    def _compute_schema_version(self) -> str:
+        path = self._schema_cache_path()
+        if not os.path.exists(path):
+            return ""
+        with open(path, "rb") as f:
+            return hashlib.md5(f.read()).hexdigest()
+
+    def _index_lock(self) -> FileLock:
+        # 使用文件锁防止并发构建导致向量库损坏
+        return FileLock(os.path.join(self.config.chroma_db_path, "index_build.lock"))
+
+    @staticmethod
+    def _context_tokens(catalog: dict, table_name: str, context_str: str) -> Optional[int]:
+        meta = catalog.get(table_name)
+        return full_context_tokens(meta, context_str or "") if meta is not None else None
+
+    def takes_fast_path(self, query_str: str) -> bool:
+        """表检索是否会走词法快速路径(不需要问题向量)"""
+        return self.hybrid_retriever is not None and self.hybrid_retriever.takes_fast_path(query_str)
+
+    def schema_tokens(self, table_name: str) -> Optional[int]:
+        """索引时计算的完整表上下文 token 数, 未知时返回 None"""
+        return self._schema_tokens.get(table_name)
+
+    def _table_schema(self, table_name: str) -> Optional[SQLTableSchema]:
+        """按表名返回索引中的表结构对象(供检索后处理补充的表使用)"""
+        if table_name not in self._schema_contexts:
+            return None
+        return SQLTableSchema(table_name=table_name, context_str=self._schema_contexts[table_name])
+
+    def _lexical_documents(self) -> List[LexicalDocument]:
+        """由 _schemas.json(SchemaManager 生成的表描述)与表结构快照构建词法文档"""
+        catalog = self.db_manager.reflect_catalog(list(self._schema_contexts))
+        documents = []
+        for table_name, context_str in self._schema_contexts.items():
+            meta = catalog.get(table_name)
+            columns = [c["name"] for c in meta.columns] if meta else []
+            comments = [meta.comment or ""] + [c.get("comment") or "" for c in meta.columns] if meta else []
+            documents.append(LexicalDocument(
+                table_name=table_name,
+                context_str=context_str,
+                columns=columns,
+                text=" ".join(c for c in comments if c),
+            ))
+        return documents
+
+    def _on_schema_cache_changed(self):
+        """_schemas.json 变化后重建依赖它的进程内结构: 表描述映射、token 数、词法索引、外键关联图"""
+        cache = self._load_schema_cache()
+        self._schema_contexts = {item["table_name"]: item.get("context_str") or "" for item in cache}
+        tokens = {item["table_name"]: item["tokens"] for item in cache if item.get("tokens") is not None}
+        missing = [t for t in self._schema_contexts if t not in tokens]
+        if missing:
+            # 旧版本缓存没有 token 数, 在内存中补算
+            catalog = self.db_manager.reflect_catalog(missing)
+            for t in missing:
+                count = self._context_tokens(catalog, t, self._schema_contexts[t])
+                if count is not None:
+                    tokens[t] = count
+        self._schema_tokens = tokens
+        if self.lexical_index is not None:
+            self.lexical_index.rebuild(self._lexical_documents())
+        if self.join_graph is not None:
+            self.join_graph.rebuild(self.db_manager.reflect_catalog(list(self._schema_contexts)))
 
     def setup_table_retriever(self) -> ObjectRetriever[SQLTableSchema]:
         # 确保目录存在
         os.makedirs(self.config.chroma_db_path, exist_ok=True)
-        
-        # 使用文件锁防止并发构建导致向量库损坏
-        lock_path = os.path.join(self.config.chroma_db_path, "index_build.lock")
-        lock = FileLock(lock_path)
 
-        with lock:
+        with self._index_lock():
             db = chromadb.PersistentClient(path=self.config.chroma_db_path)
             chromadb_collection = db.get_or_create_collection(self.config.chroma_collection_name)
             vector_store = ChromaVectorStore(chroma_collection=chromadb_collection)
-            table_node_mapping = SQLTableNodeMapping(self.db_manager.sql_database)
+            table_node_mapping = CatalogTableNodeMapping(self.db_manager)
 
             # 检查索引是否已存在 (通过 collection 计数或 schema 缓存文件)
             # 这里的 count() 检查是最直接的
             if chromadb_collection.count() == 0:
                 logger.info(f"Initializing vector index at {self.config.chroma_db_path}...")
-                schemas = self._build_and_persist_schemas()
-                storage_context = StorageContext.from_defaults(vector_store=vector_store)
-                obj_index = ObjectIndex.from_objects(
-                    schemas,
-                    table_node_mapping,
-                    index_cls=VectorStoreIndex,
-                    storage_context=storage_context,
-                )
+                with INDEX_SECONDS.time(operation="build"):
+                    schemas = self._build_and_persist_schemas()
+                    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+                    obj_index = ObjectIndex.from_objects(
+                        schemas,
+                        table_node_mapping,
+                        index_cls=VectorStoreIndex,
+                        storage_context=storage_context,
+                    )
+                INDEX_TABLES.inc(len(schemas), change="built")
                 logger.info("Vector index built successfully.")
             else:
                 logger.info(f"Loading existing vector index from {self.config.chroma_db_path}...")
-                index = VectorStoreIndex.from_vector_store(
-                    vector_store,
-                )
-                obj_index = ObjectIndex.from_objects_and_index(
-                    [], # 空列表，因为我们是从 existing index 加载
-                    index,
-                    table_node_mapping,
-                )
+                with INDEX_SECONDS.time(operation="load"):
+                    index = VectorStoreIndex.from_vector_store(
+                        vector_store,
+                    )
+                    obj_index = ObjectIndex.from_objects_and_index(
+                        [], # 空列表，因为我们是从 existing index 加载
+                        index,
+                        table_node_mapping,
+                    )
+
+            self._collection = chromadb_collection
+            self._obj_index = obj_index
+            self.schema_version = self._compute_schema_version()
+
+        if self.config.enable_hybrid_retrieval:
+            self.lexical_index = LexicalIndex()
+        if self.config.enable_join_expansion:
+            self.join_graph = JoinGraph()
+        self._on_schema_cache_changed()
 
-        return obj_index.as_retriever(similarity_top_k=self.config.top_k_tables)
+        if self.lexical_index is not None:
+            logger.info(f"Lexical index built over {len(self.lexical_index)} tables.")
+            retriever = self.hybrid_retriever = HybridTableRetriever(
+                obj_index.as_retriever(similarity_top_k=max(self.config.hybrid_candidate_k, self.config.top_k_tables)),
+                self.lexical_index,
+                top_k=self.config.top_k_tables,
+                candidate_k=self.config.hybrid_candidate_k,
+                rrf_k=self.config.rrf_k,
+                fast_path=self.config.enable_lexical_fast_path,
+                fast_path_min_score=self.config.lexical_fast_path_min_score,
+            )
+        else:
+            retriever = obj_index.as_retriever(similarity_top_k=self.config.top_k_tables)
 
+        if self.join_graph is not None:
+            retriever = JoinPathExpander(
+                retriever,
+                self.join_graph,
+                self._table_schema,
+                max_hops=self.config.join_max_hops,
+                budget=self.config.join_expansion_max_tables,
+            )
+        return retriever
 
-    # TODO
-    def build_row_retrievers(self) -> Optional[Dict[str, BaseRetriever]]:
+    def refresh_table_index(self) -> Dict[str, List[str]]:
         """
-        如果配置的话, 则为特定的列构建行检索器
-        返回一个字典, 将表名映射到检索器
+        增量刷新表索引:
+        比较当前表结构指纹与 _schemas.json 中记录的指纹,
+        仅对新增/变化的表重新生成描述并嵌入, 删除已不存在的表
+        返回 {"added": [...], "changed": [...], "dropped": [...]}
+        需先调用 setup_table_retriever
         """
-        if not self.config.enable_row_retrieval:
-            return None
+        with self._index_lock(), INDEX_SECONDS.time(operation="refresh"):
+            table_names = self.db_manager.refresh_tables()
+            fingerprints = self.db_manager.get_table_fingerprints(table_names)
 
-        row_retrievers = {}
-
-        # self.config.row_retriever_columns 是 Dict[str, List[str]类型
-        # 例如: {'users': ["city", "country"], 'products': ["category"]}
-        for table_name, columns in self.config.row_retrieval_columns.items():
-            if table_name not in self.db_manager.get_table_names():
-                continue
-
-            try:
-                documents = []
-                from sqlalchemy import text
-                # 增强健壮性：处理连接失败
-                with self.db_manager.engine.connect() as conn:
-                    for col in columns:
-                        # 修正拼写错误 (虽然原代码看似正确，但确保是 DISTINCT)
-                        query = text(f'SELECT DISTINCT {col} FROM {table_name} WHERE {col} is NOT NULL')
-                        result = conn.execute(query)
-                        for row in result:
-                            val = str(row[0])
-                            documents.append(f'{col}: {val}')
-
-
-                if not documents:
+            cached = {item["table_name"]: item for item in self._load_schema_cache()}
+            added = [t for t in table_names if t not in cached]
+            dropped = [t for t in cached if t not in set(table_names)]
+            changed = []
+            for t in table_names:
+                if t not in cached or t not in fingerprints:
                     continue
+                if cached[t].get("fingerprint") is None:
+                    # 旧版本缓存没有指纹, 以当前结构为基线, 不触发重建
+                    cached[t]["fingerprint"] = fingerprints[t]
+                elif cached[t]["fingerprint"] != fingerprints[t]:
+                    changed.append(t)
 
-                from llama_index.core import Document
-                docs = [Document(text=d) for d in documents]
-                index = VectorStoreIndex.from_documents(docs, embedding_model=self.embed_model)
+            diff = {"added": added, "changed": changed, "dropped": dropped}
+            stale = changed + dropped
+            if stale:
+                self._collection.delete(where={"name": {"$in": stale}})
+                for t in stale:
+                    cached.pop(t, None)
 
-                row_retrievers[table_name] = index.as_retriever()
+            to_describe = added + changed
+            if to_describe:
+                logger.info(f"Refreshing {len(to_describe)} tables in vector index...")
+                schemas = SchemaManager(self.db_manager).get_table_schema(to_describe)
+                catalog = self.db_manager.reflect_catalog(to_describe)
+                table_node_mapping = CatalogTableNodeMapping(self.db_manager)
+                self._obj_index.index.insert_nodes([table_node_mapping.to_node(s) for s in schemas])
+                for s in schemas:
+                    cached[s.table_name] = {
+                        "table_name": s.table_name,
+                        "context_str": s.context_str,
+                        "fingerprint": fingerprints.get(s.table_name),
+                        "tokens": self._context_tokens(catalog, s.table_name, s.context_str),
+                    }
 
-            except Exception as e:
-                logger.error(f'Error building row retriever for {table_name}: {e}', exc_info=True)
+            self._save_schema_cache(list(cached.values()))
+            self.schema_version = self._compute_schema_version()
+            if any(diff.values()):
+                self._on_schema_cache_changed()
 
-        return row_retrievers if row_retrievers else None
+        for change, tables in diff.items():
+            if tables:
+                INDEX_TABLES.inc(len(tables), change=change)
+        logger.info(f"Schema refresh finished: {len(added)} added, {len(changed)} changed, {len(dropped)} dropped.")
+        return diff
+
+
+    def setup_value_retriever(self) -> Optional[ValueIndex]:
+        """
+        构建/加载列取值索引(需先调用 setup_table_retriever)
+        已在清单中的列直接复用, 只为新配置的列读取并嵌入取值; 取值的增量更新由 refresh_value_index 完成
+        """
+        if not self.config.enable_row_retrieval:
+            return None
+        with self._index_lock(), INDEX_SECONDS.time(operation="values_load"):
+            self.value_index = ValueIndex(self.config, self.db_manager, self.embed_model)
+            result = self.value_index.sync(only_missing=True)
+        logger.info(f"[ValueIndex] Loaded: {result}")
+        return self.value_index
+
+    def refresh_value_index(self) -> Dict[str, int]:
+        """重新读取各列取值, 仅嵌入新增取值并删除已消失的取值"""
+        if self.value_index is None:
+            return {}
+        with self._index_lock(), INDEX_SECONDS.time(operation="values_refresh"):
+            return self.value_index.sync()
+
+    def setup_column_retriever(self) -> Optional[ColumnIndex]:
+        """构建/加载宽表的列索引, 按结构指纹只为新增或变化的宽表嵌入列文档"""
+        if not self.config.enable_col_retrieval:
+            return None
+        with self._index_lock(), INDEX_SECONDS.time(operation="columns_load"):
+            self.column_index = ColumnIndex(self.config, self.db_manager, self.embed_model)
+            result = self.column_index.sync()
+        logger.info(f"[ColumnIndex] Loaded: {result}")
+        return self.column_index
 
-    # TODO
-    def build_col_retrievers(self) -> Optional[Dict[str, Dict[str, BaseRetriever]]]:
-        return None
+    def refresh_column_index(self) -> Dict[str, int]:
+        if self.column_index is None:
+            return {}
+        with self._index_lock(), INDEX_SECONDS.time(operation="columns_refresh"):
+            return self.column_index.sync()
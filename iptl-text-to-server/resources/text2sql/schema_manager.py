@@ -1,7 +1,9 @@
-from typing import List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import threading
+from typing import List, Optional
 from llama_index.core.objects import SQLTableSchema
 from .db_manager import DatabaseManager
+from .description_pipeline import DescriptionPipeline, ProgressCallback
 
 class SchemaManager:
     """生成表的描述"""
@@ -9,43 +11,46 @@ class SchemaManager:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
 
-    def get_table_schema(self) -> List[SQLTableSchema]:
+    def get_table_schema(
+        self,
+        table_names: Optional[List[str]] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> List[SQLTableSchema]:
         """
         对管理的表创建 SQLTableSchema 对象
         context_str 将包含详细描述, 包括主键/外键信息
-        使用多线程加速描述生成
+        数据库取样与 LLM 调用分为两个独立限流的异步阶段并发执行
+        :param table_names: 仅处理指定的表(增量刷新), 默认处理全部表
+        :param progress_callback: 进度回调 (已完成数, 总数, 表名), 默认输出日志
         """
-        schemas = []
-        table_names = self.db_manager.get_table_names()
-
-        # 获取线程数配置，默认为 5
-        max_workers = 5
-        if self.db_manager.config:
-            max_workers = self.db_manager.config.table_description_threads
-
-        # print(max_workers)
-        def _process_table(table_name: str) -> SQLTableSchema:
-            """处理单个表的辅助函数"""
-            # 获取详细描述(DDL + 键 + 注释)
-            description = self.db_manager.get_detailed_table_description(table_name)
-            
-            # 创建 SQLTableSchema
-            return SQLTableSchema(
-                table_name=table_name,
-                context_str=description
-            )
-
-        # 使用线程池并发执行
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交所有任务
-            future_to_table = {executor.submit(_process_table, table): table for table in table_names}
-            
-            for future in as_completed(future_to_table):
-                table = future_to_table[future]
-                try:
-                    schema = future.result()
-                    schemas.append(schema)
-                except Exception as exc:
-                    print(f'Table {table} generated an exception: {exc}')
-
-        return schemas
\ No newline at end of file
+        if table_names is None:
+            table_names = self.db_manager.get_table_names()
+
+        # 一次性批量反射所有表结构, 后续描述生成直接读取内存快照
+        self.db_manager.reflect_catalog(table_names)
+
+        pipeline = DescriptionPipeline.from_config(self.db_manager, progress_callback=progress_callback)
+        return self._run_coroutine(pipeline.run(table_names))
+
+    @staticmethod
+    def _run_coroutine(coro):
+        """在同步上下文中运行协程; 若当前线程已有事件循环, 则在新线程中运行"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+
+        result = {}
+
+        def _runner():
+            try:
+                result["value"] = asyncio.run(coro)
+            except BaseException as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=_runner, name="schema-description")
+        thread.start()
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
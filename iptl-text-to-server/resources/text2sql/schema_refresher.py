@@ -0,0 +1,32 @@
+import logging
+import threading
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaRefreshPoller:
+    """
+    后台定时触发 schema 增量刷新的守护线程
+    refresh_fn 抛出的异常只记录日志, 不会终止轮询
+    """
+
+    def __init__(self, refresh_fn: Callable[[], Dict[str, List[str]]], interval: float, name: str = "schema-refresh"):
+        self.refresh_fn = refresh_fn
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        logger.info(f"[SchemaRefreshPoller] Started, interval={self.interval}s")
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.refresh_fn()
+            except Exception as e:
+                logger.error(f"[SchemaRefreshPoller] Schema refresh failed: {e}", exc_info=True)
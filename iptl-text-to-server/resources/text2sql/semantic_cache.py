@@ -0,0 +1,377 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+from .config import Text2SQLConfig
+from .embeddings import SQLITE_BUSY_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SemanticCacheEntry:
+    """ 语义缓存条目 """
+    question: str
+    sql: str
+    embedding: Optional[List[float]]  # 为空时只参与精确匹配
+    created_at: float
+    last_access: float
+
+
+class SemanticCacheStore:
+    """
+    语义缓存的 sqlite 持久化, 按条目增量写入(写入/删除只涉及变化的行, 不重写整个缓存)
+    meta 表记录缓存版本; entries 表的键为归一化后的问题, 向量以 float32 存储(只做精确匹配的条目为 NULL)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, question TEXT NOT NULL, sql TEXT NOT NULL,"
+            " embedding BLOB, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def load(self) -> Tuple[Optional[str], List[Tuple[str, SemanticCacheEntry]]]:
+        """返回 (缓存版本, [(键, 条目)]), 条目按最近访问时间升序"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            rows = self._conn.execute(
+                "SELECT key, question, sql, embedding, created_at, last_access FROM entries ORDER BY last_access"
+            ).fetchall()
+        entries = [
+            (key, SemanticCacheEntry(
+                question=question,
+                sql=sql,
+                embedding=np.frombuffer(blob, dtype=np.float32).tolist() if blob is not None else None,
+                created_at=created_at,
+                last_access=last_access,
+            ))
+            for key, question, sql, blob, created_at, last_access in rows
+        ]
+        return (row[0] if row else None), entries
+
+    def reset(self, version: str) -> None:
+        """清空条目并记录新版本"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+            self._conn.commit()
+
+    def put(
+        self,
+        key: str,
+        entry: SemanticCacheEntry,
+        evicted: Iterable[str] = (),
+        touched: Iterable[Tuple[str, float]] = (),
+    ) -> None:
+        """写入一个条目, 同时删除因容量上限被淘汰的条目、更新待写入的最近访问时间"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, question, sql, embedding, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry.question, entry.sql,
+                 np.asarray(entry.embedding, dtype=np.float32).tobytes() if entry.embedding is not None else None,
+                 entry.created_at, entry.last_access),
+            )
+            self._delete(evicted)
+            self._touch(touched)
+            self._conn.commit()
+
+    def touch(self, touched: Iterable[Tuple[str, float]]) -> None:
+        """批量更新条目的最近访问时间 [(键, 时间)]"""
+        with self._lock:
+            self._touch(touched)
+            self._conn.commit()
+
+    def delete(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            self._delete(keys)
+            self._conn.commit()
+
+    def _delete(self, keys: Iterable[str]) -> None:
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in keys])
+
+    def _touch(self, touched: Iterable[Tuple[str, float]]) -> None:
+        self._conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?", [(t, k) for k, t in touched])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SemanticSQLCache:
+    """
+    基于问题向量的 NL→SQL 语义缓存
+    同一 config_id 下, 与历史问题的余弦相似度超过阈值时直接返回已生成的 SQL, 跳过检索与 LLM
+    缓存以 LRU + TTL 方式淘汰, 以 sqlite 增量持久化在 chroma_db_path 目录下
+    缓存版本由提示词模板与 schema 索引共同决定, 版本变化时自动清空
+    """
+
+    FILE_NAME = "semantic_cache.sqlite3"
+    # 早期版本每次写入都整体重写的 JSON 文件, 不再读取, sqlite 缓存成功打开后删除
+    LEGACY_FILE_NAME = "semantic_cache.json"
+    # 命中时更新的最近访问时间先在内存中累积, 达到该数量或下次写入条目时一并持久化
+    TOUCH_FLUSH_SIZE = 32
+
+    def __init__(self, config: Text2SQLConfig, embed_model: BaseEmbedding):
+        self.config = config
+        self.embed_model = embed_model
+        self.threshold = config.semantic_cache_threshold
+        self.ttl = config.semantic_cache_ttl
+        self.max_entries = config.semantic_cache_max_entries
+
+        self._path = os.path.join(config.chroma_db_path, self.FILE_NAME)
+        self._store: Optional[SemanticCacheStore] = None
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, SemanticCacheEntry]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._stored_version: Optional[str] = None
+        # 尚未持久化的最近访问时间: 键 -> 时间
+        self._touched: Dict[str, float] = {}
+
+        # 归一化后的向量矩阵, 条目变化后懒重建
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(question: str) -> str:
+        return " ".join(question.strip().lower().split())
+
+    def bind(self, version: str) -> None:
+        """
+        绑定缓存版本(提示词 + schema 指纹)
+        首次绑定时从磁盘加载, 版本不一致则丢弃全部旧条目
+        """
+        with self._lock:
+            if version == self._version:
+                return
+
+            if self._version is None:
+                self._load()
+
+            if self._stored_version != version:
+                if self._entries:
+                    logger.info(f"[SemanticCache] Version changed, dropping {len(self._entries)} cached entries.")
+                self._entries.clear()
+                self._invalidate_matrix()
+                self._stored_version = version
+                self._version = version
+                self._persist("reset", version)
+            else:
+                self._version = version
+
+    def _load(self) -> None:
+        self._stored_version = None
+        try:
+            self._store = SemanticCacheStore(self._path)
+            self._stored_version, entries = self._store.load()
+        except Exception as e:
+            logger.warning(f"[SemanticCache] Failed to load cache file {self._path}: {e}")
+            return
+
+        legacy_path = os.path.join(self.config.chroma_db_path, self.LEGACY_FILE_NAME)
+        try:
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+        except OSError as e:
+            logger.warning(f"[SemanticCache] Failed to remove legacy cache file {legacy_path}: {e}")
+        for key, entry in entries:
+            self._entries[key] = entry
+        self._invalidate_matrix()
+        if entries:
+            logger.info(f"[SemanticCache] Loaded {len(entries)} entries from {self._path}")
+
+    def _persist(self, operation: str, *args) -> None:
+        """将一次变更写入 sqlite; 持久化失败只影响重启后的缓存, 不影响本次请求"""
+        if self._store is None:
+            return
+        try:
+            getattr(self._store, operation)(*args)
+        except Exception as e:
+            logger.warning(f"[SemanticCache] Failed to save cache file {self._path}: {e}")
+
+    def _invalidate_matrix(self) -> None:
+        self._matrix = None
+        self._matrix_keys = []
+
+    def _get_matrix(self, dim: int) -> np.ndarray:
+        """有向量的条目组成的 (条目数, dim) 矩阵; 只做精确匹配的条目(embedding 为空)不参与"""
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e.embedding is not None]
+            if not self._matrix_keys:
+                self._matrix = np.empty((0, dim), dtype=np.float32)
+                return self._matrix
+            vectors = np.array([self._entries[k].embedding for k in self._matrix_keys], dtype=np.float32)
+            vectors = vectors.reshape(len(self._matrix_keys), -1)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._matrix = vectors / norms
+        return self._matrix
+
+    def _evict_expired(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if now - e.created_at > self.ttl]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self._invalidate_matrix()
+            self._persist("delete", expired)
+
+    def _touch(self, key: str, now: float) -> str:
+        entry = self._entries[key]
+        entry.last_access = now
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # 重启后按持久化的最近访问时间恢复 LRU 顺序
+        self._touched[key] = now
+        if len(self._touched) >= self.TOUCH_FLUSH_SIZE:
+            self._flush_touched()
+        return entry.sql
+
+    def _pop_touched(self) -> List[Tuple[str, float]]:
+        touched = list(self._touched.items())
+        self._touched.clear()
+        return touched
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            self._persist("touch", self._pop_touched())
+
+    def flush(self) -> None:
+        """持久化尚未写入的最近访问时间(引擎关闭时调用)"""
+        with self._lock:
+            self._flush_touched()
+
+    def lookup(self, question: str, fuzzy: bool = True) -> Optional[str]:
+        """
+        查找语义相近问题对应的 SQL, 未命中返回 None
+        fuzzy=False 时只做归一化后的精确匹配, 不请求问题向量(如表检索会走词法快速路径时)
+        """
+        key = self._normalize(question)
+        now = time.time()
+
+        with self._lock:
+            self._evict_expired(now)
+            if key in self._entries:
+                return self._touch(key, now)
+            if not self._entries or not fuzzy:
+                self.misses += 1
+                return None
+
+        embedding = self.embed_model.get_query_embedding(question)
+        return self._lookup_by_embedding(key, embedding, now)
+
+    async def alookup(self, question: str, fuzzy: bool = True) -> Optional[str]:
+        """lookup 的异步版本, 问题嵌入使用异步接口"""
+        key = self._normalize(question)
+        now = time.time()
+
+        with self._lock:
+            self._evict_expired(now)
+            if key in self._entries:
+                return self._touch(key, now)
+            if not self._entries or not fuzzy:
+                self.misses += 1
+                return None
+
+        embedding = await self.embed_model.aget_query_embedding(question)
+        return self._lookup_by_embedding(key, embedding, now)
+
+    def _lookup_by_embedding(self, key: str, embedding: List[float], now: float) -> Optional[str]:
+        query_vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query_vec)
+        if norm > 0:
+            query_vec = query_vec / norm
+
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            matrix = self._get_matrix(query_vec.shape[0])
+            if not self._matrix_keys or matrix.shape[1] != query_vec.shape[0]:
+                # 没有可比较的向量(全部为只做精确匹配的条目), 或嵌入模型维度变化
+                self.misses += 1
+                return None
+
+            scores = matrix @ query_vec
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                best_key = self._matrix_keys[best]
+                if best_key in self._entries:
+                    logger.info(f"[SemanticCache] Hit (similarity={scores[best]:.4f}) for question: {key}")
+                    return self._touch(best_key, now)
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, sql: str, fuzzy: bool = True) -> None:
+        """
+        写入问题与生成的 SQL
+        fuzzy=False 时不请求问题向量, 条目只用于精确匹配
+        """
+        if not sql or not sql.strip():
+            return
+
+        key = self._normalize(question)
+        # lookup 时已请求过的问题向量由 CachedEmbedding 的内存缓存直接返回
+        embedding = self.embed_model.get_query_embedding(question) if fuzzy else None
+
+        now = time.time()
+        entry = SemanticCacheEntry(
+            question=question,
+            sql=sql,
+            embedding=list(embedding) if embedding is not None else None,
+            created_at=now,
+            last_access=now,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            self._invalidate_matrix()
+            self._persist("put", key, entry, evicted, self._pop_touched())
+
+    def discard(self, sql: str) -> None:
+        """移除生成该 SQL 的全部条目(例如 SQL 校验或执行失败时)"""
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if e.sql == sql]
+            for k in keys:
+                del self._entries[k]
+            if keys:
+                self._invalidate_matrix()
+                self._persist("delete", keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._invalidate_matrix()
+            self._persist("delete", keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -1,9 +1,17 @@
-from typing import Optional, Dict, Any, List, Union
+import asyncio
+import threading
+import time
+from typing import Optional, Dict, Any, List, Union, Iterable
 from .engine import Text2SQLEngine
 from .factory import build_text2sql_config_from_global
 from .sql_validator import SQLSecurityChecker
-from .sql_executor import SQLExecutor
+from .sql_executor import SQLExecutor, AsyncSQLExecutor, ExecutionResult
 from .engine_manager import EnginePool
+from .result_cache import QueryResultCache
+from .description_cache import get_description_cache_stats
+from .db_pool import PoolSettings, get_pool_stats, pool_status
+from .metrics import STAGE_SECONDS, QUERIES, CACHE_REQUESTS
+from .tracing import span, start_trace
 
 
 class Text2SQLService:
@@ -14,64 +22,218 @@ class Text2SQLService:
         self._engine: Optional[Text2SQLEngine] = None
         self._engine_config_id: Optional[str] = None
         self._executor: Optional[SQLExecutor] = None
+        self._async_executor: Optional[AsyncSQLExecutor] = None
         self._checker: Optional[SQLSecurityChecker] = None
+        self._result_cache: Optional[QueryResultCache] = None
+        self._query_semaphore: Optional[asyncio.Semaphore] = None
+        self._max_result_rows: int = 100
+        self._query_timeout: float = 30.0
+        self._init_lock = threading.Lock()
 
     def _initialize(self):
-        if self._engine is None:
-            config = build_text2sql_config_from_global()
-            self._engine = EnginePool().get_engine(config)
-            self._executor = SQLExecutor(self._engine.db_manager.engine)
-            self._checker = SQLSecurityChecker(max_limit=50)
-            self._engine_config_id = config.config_id
+        with self._init_lock:
+            if self._engine is None:
+                config = build_text2sql_config_from_global()
+                # 服务在进程内长期持有引擎, 引擎过期后不会被回收, 而是被后续请求复用
+                engine = EnginePool().acquire(config)
+                self._executor = SQLExecutor(engine.db_manager.engine)
+                self._async_executor = AsyncSQLExecutor(engine.db_manager.engine, PoolSettings.from_config(config))
+                self._checker = SQLSecurityChecker(max_limit=50)
+                self._engine_config_id = config.config_id
+                self._max_result_rows = config.max_result_rows
+                self._query_timeout = config.query_timeout
+                if config.enable_result_cache:
+                    self._result_cache = QueryResultCache(
+                        max_bytes=config.result_cache_max_bytes,
+                        default_ttl=config.result_cache_ttl,
+                    )
+                self._query_semaphore = asyncio.Semaphore(config.max_concurrent_queries)
+                engine.add_schema_listener(self._on_schema_refreshed)
+                self._engine = engine
         self._engine.update_prompt()
 
+    def _get_dialect(self) -> str:
+        dialect = self._engine.db_manager.sql_database.dialect
+
+        mapping = {
+            "postgresql": "postgres",
+            "mysql": "mysql",
+            "sqlite": "sqlite",
+            "oracle": "oracle",
+        }
+        return mapping.get(dialect.lower(), dialect)
+
+    def _validate(self, sql: str, dialect: str) -> str:
+        """校验 SQL, 并下推 max_result_rows + 1 的 LIMIT(多取一行用于判断结果是否被截断)"""
+        with STAGE_SECONDS.time(stage="validation"), span("validation", dialect=dialect):
+            return self._checker.validata(sql, dialect=dialect, limit=self._max_result_rows + 1)
+
+    def _execute(self, sql: str, dialect: str) -> ExecutionResult:
+        """流式执行校验后的 SQL(最多读取 max_result_rows + 1 行), 优先读取结果缓存"""
+        with span("execution", dialect=dialect) as s:
+            result = None
+            if self._result_cache is not None:
+                result = self._result_cache.get(self._engine_config_id, dialect, sql)
+                CACHE_REQUESTS.inc(cache="result", result="miss" if result is None else "hit")
+                s.set_attribute("cache_hit", result is not None)
+            if result is None:
+                with STAGE_SECONDS.time(stage="execution"):
+                    result = self._executor.execute_bounded(sql, self._max_result_rows, self._query_timeout)
+                if self._result_cache is not None:
+                    self._result_cache.put(self._engine_config_id, dialect, sql, result)
+            s.set_attributes(row_count=len(result.rows), truncated=result.truncated)
+            return result
+
+    async def _aexecute(self, sql: str, dialect: str) -> ExecutionResult:
+        """_execute 的异步版本"""
+        with span("execution", dialect=dialect) as s:
+            result = None
+            if self._result_cache is not None:
+                result = self._result_cache.get(self._engine_config_id, dialect, sql)
+                CACHE_REQUESTS.inc(cache="result", result="miss" if result is None else "hit")
+                s.set_attribute("cache_hit", result is not None)
+            if result is None:
+                with STAGE_SECONDS.time(stage="execution"):
+                    result = await self._async_executor.execute_bounded(sql, self._max_result_rows, self._query_timeout)
+                if self._result_cache is not None:
+                    await asyncio.to_thread(self._result_cache.put, self._engine_config_id, dialect, sql, result)
+            s.set_attributes(row_count=len(result.rows), truncated=result.truncated)
+            return result
+
+    @staticmethod
+    def _truncate_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """截断结果中的过长字符串"""
+        truncated_results = []
+        for row in results:
+            new_row = {}
+            for k, v in row.items():
+                if isinstance(v, (str, int, float, bool, type(None))):
+                    val = v
+                else:
+                    val = str(v)
+
+                if isinstance(v, str) and len(v) > 100:
+                    new_row[k] = val[:100] + "..."
+                else:
+                    new_row[k] = val
+            truncated_results.append(new_row)
+        return truncated_results
+
+    def _format_result(self, result: ExecutionResult) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        未超出行数上限时直接返回行列表;
+        超出时返回 {"rows": [...], "truncated": True, "row_limit": N}, 提示调用方结果不完整
+        """
+        rows = self._truncate_results(result.rows)
+        if not result.truncated:
+            return rows
+        return {
+            "rows": rows,
+            "truncated": True,
+            "row_limit": self._max_result_rows,
+        }
+
+    def _on_schema_refreshed(self, diff: Dict[str, List[str]]):
+        """表结构变化或表被删除后, 失效引用这些表的结果缓存"""
+        if self._result_cache is not None:
+            self._result_cache.invalidate_tables(diff.get("changed", []) + diff.get("dropped", []))
+
+    def invalidate_cached_results(self, tables: Optional[Iterable[str]] = None) -> int:
+        """按表名失效结果缓存, 未指定表名时清空全部"""
+        if self._result_cache is None:
+            return 0
+        if not tables:
+            count = self._result_cache.stats()["entries"]
+            self._result_cache.clear()
+            return count
+        return self._result_cache.invalidate_tables(tables)
+
+    def pool_stats(self) -> List[Dict[str, Any]]:
+        """源数据库同步引擎与异步引擎的连接池状态"""
+        stats = get_pool_stats()
+        if self._async_executor is not None and self._async_executor.async_engine is not None:
+            stats.append(pool_status(self._async_executor.async_engine))
+        return stats
+
     def query(self, query: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
         """
-        Text -> SQL -> Validate -> Execute
+        Execute natural language query and return results.
         """
-        try:
-            self._initialize()
+        generated_sql = None
+        status = "error"
+        started = time.perf_counter()
+        with start_trace("text2sql.query") as trace:
+            try:
+                self._initialize()
 
-            generated_sql = self._engine.query(query)
-            dialect = self._engine.db_manager.sql_database.dialect
+                generated_sql = self._engine.query(query)
+                dialect = self._get_dialect()
+                trace.set_attributes(sql=generated_sql, dialect=dialect)
 
-            mapping = {
-                "postgresql": "postgres",
-                "mysql": "mysql",
-                "sqlite": "sqlite",
-                "oracle": "oracle",
-            }
-            dialect = mapping.get(dialect.lower(), dialect)
+                print(f"LLM生成的SQL: {generated_sql}")
+                validated_sql = self._validate(generated_sql, dialect)
 
-            print(f"LLM生成的SQL: {generated_sql}")
-            validated_sql = self._checker.validata(generated_sql, dialect=dialect)
+                # print(f"验证后的SQL: {validated_sql}")
+                result = self._execute(validated_sql, dialect)
 
-            # print(f"验证后的SQL: {validated_sql}")
-            results = self._executor.execute(validated_sql)
+                status = "ok"
+                return self._format_result(result)
+
+            except Exception as e:
+                trace.record_error(e)
+                if generated_sql and self._engine is not None:
+                    self._engine.forget(generated_sql)
+                return {
+                    "error": str(e),
+                    "query": query
+                }
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage="total")
+                QUERIES.inc(status=status)
+
+    async def aquery(self, query: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        query 的异步版本: 网络请求使用异步接口, 同步/CPU 密集步骤放到线程池,
+        并通过信号量限制同时处理的请求数
+        调用方取消任务(如 MCP 客户端断开)时, 正在等待的 LLM 请求随任务一同取消, 正在执行的数据库语句由执行器终止
+        """
+        generated_sql = None
+        status = "cancelled"
+        started = time.perf_counter()
+        with start_trace("text2sql.query") as trace:
+            try:
+                # 首次调用会构建引擎(DDL 扫描、向量索引), 放到线程池避免阻塞事件循环
+                await asyncio.to_thread(self._initialize)
 
-            # 截断结果中的过长字符串, 并且截断行数
-            truncated_results = []
-            for row in results[:100]:
-                new_row = {}
-                for k, v in row.items():
-                    if isinstance(v, (str, int, float, bool, type(None))):
-                        val = v
-                    else:
-                        val = str(v)
+                with STAGE_SECONDS.time(stage="queue_wait"), span("queue_wait"):
+                    await self._query_semaphore.acquire()
+                try:
+                    generated_sql = await self._engine.aquery(query)
+                    dialect = self._get_dialect()
+                    trace.set_attributes(sql=generated_sql, dialect=dialect)
 
-                    if isinstance(v, str) and len(v) > 100:
-                        new_row[k] = val[:100] + "..."
-                    else:
-                        new_row[k] = val
-                truncated_results.append(new_row)
+                    print(f"LLM生成的SQL: {generated_sql}")
+                    validated_sql = await asyncio.to_thread(self._validate, generated_sql, dialect)
 
-            return truncated_results
+                    result = await self._aexecute(validated_sql, dialect)
+                finally:
+                    self._query_semaphore.release()
 
-        except Exception as e:
-            return {
-                "error": str(e),
-                "query": query
-            }
+                status = "ok"
+                return self._format_result(result)
+
+            except Exception as e:
+                status = "error"
+                trace.record_error(e)
+                if generated_sql and self._engine is not None:
+                    await asyncio.to_thread(self._engine.forget, generated_sql)
+                return {
+                    "error": str(e),
+                    "query": query
+                }
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage="total")
+                QUERIES.inc(status=status)
 
 _SERVICE = Text2SQLService()
 
@@ -83,3 +245,31 @@ class ToolContainer:
         """
         # 在内部初始化，确保不捕获外部的 _AGENT 或 _SERVICE
         return _SERVICE.query(query)
+
+    @staticmethod
+    async def aquery_database(query: str) -> list[dict[str, Any]] | dict[str, Any]:
+        """
+        使用自然语言查询数据库（异步，不阻塞事件循环）。
+        """
+        return await _SERVICE.aquery(query)
+
+    @staticmethod
+    def invalidate_cached_results(tables: Optional[List[str]] = None) -> int:
+        """
+        失效引用了指定表的查询结果缓存。
+        """
+        return _SERVICE.invalidate_cached_results(tables)
+
+    @staticmethod
+    def description_cache_stats() -> Dict[str, Dict[str, int]]:
+        """
+        LLM 表描述缓存的命中/未命中次数(按缓存目录)。
+        """
+        return get_description_cache_stats()
+
+    @staticmethod
+    def pool_stats() -> List[Dict[str, Any]]:
+        """
+        源数据库连接池的实时状态(已借出、溢出连接数与获取连接的等待时间直方图)。
+        """
+        return _SERVICE.pool_stats()
@@ -1,6 +1,36 @@
-from typing import List, Dict, Any, Union
+import asyncio
+import logging
+from typing import List, Dict, Any, Union, Optional, NamedTuple
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import ResourceClosedError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from .db_pool import PoolSettings, pooled_engine_kwargs
+from .query_cancel import QueryCancelToken
+from .statement_timeout import statement_timeout, async_statement_timeout
+
+logger = logging.getLogger(__name__)
+
+# 同步驱动 -> 对应的异步驱动
+ASYNC_DRIVER_MAP = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+# 流式读取时每批从游标获取的行数
+FETCH_BATCH_SIZE = 500
+
+
+class ExecutionResult(NamedTuple):
+    """ 有行数上限的查询结果 """
+    rows: List[Dict[str, Any]]
+    truncated: bool  # 结果行数超过上限, 只返回了前 max_rows 行
+
 
 class SQLExecutor:
     """使用 SQLAlchemy 进行 SQL 执行"""
@@ -33,4 +63,185 @@ class SQLExecutor:
                     trans.rollback()
                     raise e
         except Exception as e:
-            raise RuntimeError(f'数据库执行错误: {str(e)}')
\ No newline at end of file
+            raise RuntimeError(f'数据库执行错误: {str(e)}')
+
+    def execute_bounded(
+        self,
+        sql: str,
+        max_rows: int,
+        timeout: Optional[float] = None,
+        cancel_token: Optional[QueryCancelToken] = None,
+    ) -> ExecutionResult:
+        """
+        流式执行 SQL 查询, 最多读取 max_rows + 1 行
+        使用服务端游标(驱动支持时)分批 fetchmany, 读满上限后立即停止并关闭游标, 不会把整个结果集拉到内存
+        :param timeout: 语句执行超时(秒), 由数据库端强制执行
+        :param cancel_token: 取消令牌, 调用方可通过它终止正在执行的语句
+        """
+
+        try:
+            with self.engine.connect() as conn:
+                if cancel_token is not None:
+                    cancel_token.bind(conn.dialect.name, conn.connection.driver_connection)
+                trans = conn.begin()
+                try:
+                    if cancel_token is not None and cancel_token.cancelled:
+                        raise RuntimeError('查询已取消')
+
+                    with statement_timeout(conn, timeout):
+                        # 只对生成的查询启用服务端游标; 连接级的 execution_options 会让设置超时的
+                        # SET/SELECT 也经由命名游标执行(psycopg2 下为 DECLARE ... CURSOR FOR SET ..., 语法错误)
+                        result = conn.execute(
+                            text(sql),
+                            execution_options={"stream_results": True, "max_row_buffer": FETCH_BATCH_SIZE},
+                        )
+
+                        if not result.returns_rows:
+                            # 由下方的 except 分支回滚
+                            raise PermissionError('检测到非查询SQL, 操作已回滚并拦截')
+
+                        rows = _fetch_bounded(result, max_rows)
+                        result.close()
+                    trans.commit()
+                    return ExecutionResult(rows=rows[:max_rows], truncated=len(rows) > max_rows)
+                except Exception as e:
+                    trans.rollback()
+                    raise e
+                finally:
+                    if cancel_token is not None:
+                        cancel_token.unbind()
+        except Exception as e:
+            raise RuntimeError(f'数据库执行错误: {str(e)}')
+
+
+def _fetch_bounded(result, max_rows: int) -> List[Dict[str, Any]]:
+    """分批读取至多 max_rows + 1 行"""
+    keys = list(result.keys())
+    rows = []
+    while len(rows) <= max_rows:
+        batch = result.fetchmany(min(FETCH_BATCH_SIZE, max_rows + 1 - len(rows)))
+        if not batch:
+            break
+        rows.extend(dict(zip(keys, row)) for row in batch)
+    return rows
+
+
+class AsyncSQLExecutor:
+    """
+    使用 SQLAlchemy asyncio 扩展进行异步 SQL 执行
+    同步引擎的驱动存在对应异步驱动(asyncpg/aiomysql/aiosqlite)且已安装时使用原生异步连接,
+    否则退化为在线程池中运行 SQLExecutor, 保证不阻塞事件循环
+    """
+    def __init__(self, engine: Union[Engine, str], pool_settings: Optional[PoolSettings] = None):
+        self._sync_executor = SQLExecutor(engine)
+        self.async_engine: Optional[AsyncEngine] = self._create_async_engine(
+            self._sync_executor.engine, pool_settings or PoolSettings()
+        )
+
+    @staticmethod
+    def _create_async_engine(engine: Engine, pool_settings: PoolSettings) -> Optional[AsyncEngine]:
+        async_driver = ASYNC_DRIVER_MAP.get(engine.url.drivername)
+        if not async_driver:
+            return None
+        try:
+            url = engine.url.set(drivername=async_driver)
+            return create_async_engine(
+                url,
+                **pooled_engine_kwargs(url, pool_settings, async_engine=True),
+            )
+        except Exception as e:
+            logger.info(f"[AsyncSQLExecutor] Async driver {async_driver} unavailable, falling back to thread pool: {e}")
+            return None
+
+    async def execute(self, sql: str) -> List[Dict[str, Any]]:
+        """异步执行 SQL 查询并将结果以字典列表的形式返回"""
+
+        if self.async_engine is None:
+            return await asyncio.to_thread(self._sync_executor.execute, sql)
+
+        try:
+            async with self.async_engine.connect() as conn:
+                trans = await conn.begin()
+                try:
+                    result = await conn.execute(text(sql))
+
+                    if result.returns_rows:
+                        keys = result.keys()
+                        rows = [dict(list(zip(keys, row))) for row in result]
+                        await trans.commit()
+                        return rows
+                    else:
+                        await trans.rollback()
+                        raise PermissionError('检测到非查询SQL, 操作已回滚并拦截')
+                except Exception as e:
+                    await trans.rollback()
+                    raise e
+        except Exception as e:
+            raise RuntimeError(f'数据库执行错误: {str(e)}')
+
+    async def execute_bounded(self, sql: str, max_rows: int, timeout: Optional[float] = None) -> ExecutionResult:
+        """
+        SQLExecutor.execute_bounded 的异步版本
+        所在任务被取消(如 MCP 客户端断开连接)时, 同时终止数据库端正在执行的语句:
+        实际执行放在受 shield 保护的子任务中, 取消时先通过取消令牌终止语句, 子任务随后以数据库错误结束并正常归还连接
+        (直接取消驱动层的 await 会让驱动在语句仍在运行时关闭连接, 部分驱动会因此一直等待语句结束)
+        """
+        cancel_token = QueryCancelToken(self._sync_executor.engine)
+
+        if self.async_engine is None or not self.async_engine.dialect.supports_server_side_cursors:
+            coro = asyncio.to_thread(self._sync_executor.execute_bounded, sql, max_rows, timeout, cancel_token)
+        else:
+            coro = self._execute_bounded(sql, max_rows, timeout, cancel_token)
+
+        task = asyncio.ensure_future(coro)
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # 取消需要建立旁路连接, 在线程池中执行
+            await asyncio.shield(asyncio.to_thread(cancel_token.cancel))
+            # 子任务在后台结束, 其异常已无人关心
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            raise
+
+    async def _execute_bounded(
+        self,
+        sql: str,
+        max_rows: int,
+        timeout: Optional[float],
+        cancel_token: QueryCancelToken,
+    ) -> ExecutionResult:
+        try:
+            async with self.async_engine.connect() as conn:
+                raw_conn = await conn.get_raw_connection()
+                cancel_token.bind(conn.dialect.name, raw_conn.driver_connection)
+                trans = await conn.begin()
+                try:
+                    async with async_statement_timeout(conn, timeout):
+                        result = await conn.stream(text(sql), execution_options={"max_row_buffer": FETCH_BATCH_SIZE})
+
+                        # AsyncResult 没有 returns_rows, 非查询语句的结果已被自动关闭, 由下方的 except 分支回滚
+                        try:
+                            keys = list(result.keys())
+                        except ResourceClosedError:
+                            raise PermissionError('检测到非查询SQL, 操作已回滚并拦截')
+
+                        rows = []
+                        while len(rows) <= max_rows:
+                            batch = await result.fetchmany(min(FETCH_BATCH_SIZE, max_rows + 1 - len(rows)))
+                            if not batch:
+                                break
+                            rows.extend(dict(zip(keys, row)) for row in batch)
+                        await result.close()
+                    await trans.commit()
+                    return ExecutionResult(rows=rows[:max_rows], truncated=len(rows) > max_rows)
+                except Exception as e:
+                    await trans.rollback()
+                    raise e
+                finally:
+                    cancel_token.unbind()
+        except Exception as e:
+            raise RuntimeError(f'数据库执行错误: {str(e)}')
+
+    async def dispose(self):
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from llama_index.core.callbacks.base import CallbackManager
+from llama_index.core.indices.struct_store.sql_query import BaseSQLTableQueryEngine
+from llama_index.core.indices.struct_store.sql_retriever import NLSQLRetriever
+from llama_index.core.llms.llm import LLM
+from llama_index.core.objects import ObjectRetriever, SQLTableSchema
+from llama_index.core.prompts import BasePromptTemplate
+from llama_index.core.schema import NodeWithScore, QueryBundle, QueryType, TextNode
+from llama_index.core.utilities.sql_wrapper import SQLDatabase
+
+from .column_index import ColumnIndex
+from .context_assembler import ContextAssembler
+from .metrics import LLM_STREAMS, STAGE_SECONDS
+from .sql_stream import SQLStreamExtractor
+from .tracing import span
+from .value_index import ValueIndex, ValueMatch, format_value_hints
+
+logger = logging.getLogger(__name__)
+
+
+class Text2SQLRetriever(NLSQLRetriever):
+    """
+    在 NLSQLRetriever 基础上提供完整的异步链路
+    原实现的 aretrieve_with_metadata 仍同步执行表检索(嵌入请求)和表结构反射, 会阻塞事件循环
+    这里改为异步检索表, 表结构反射放到线程池中执行
+    传入 value_retriever 时, 在检索到的表范围内匹配问题中提到的取值, 随表结构一起写入提示词
+    传入 column_retriever 时, 宽表只保留与问题相关的列(及主外键列和匹配到取值的列)
+    传入 context_assembler 时, 由其完成宽表列裁剪并在 token 预算内组装表结构上下文;
+    未传入时按原格式拼接全部列
+    stream_llm_output 为 True 时流式读取 LLM 输出, SQL 语句完整后即关闭流, 不等待后续的解释文字
+    """
+
+    def __init__(
+        self,
+        sql_database: SQLDatabase,
+        table_retriever: ObjectRetriever[SQLTableSchema],
+        value_retriever: Optional[ValueIndex] = None,
+        column_retriever: Optional[ColumnIndex] = None,
+        context_assembler: Optional[ContextAssembler] = None,
+        stream_llm_output: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(sql_database, table_retriever=table_retriever, **kwargs)
+        self._table_retriever = table_retriever
+        self._value_retriever = value_retriever
+        self._column_retriever = column_retriever
+        self._context_assembler = context_assembler
+        self._stream_llm_output = stream_llm_output
+
+    def _format_table_context(
+        self,
+        query_str: str,
+        table_schema_objs: List[SQLTableSchema],
+        value_matches: Optional[List[ValueMatch]] = None,
+        column_selection: Optional[Dict[str, List[str]]] = None,
+    ) -> str:
+        """将检索到的表拼接为提示词中的表结构上下文"""
+        value_matches = value_matches or []
+        value_hints = format_value_hints(value_matches)
+        # 宽表裁剪时保留匹配到取值的列
+        column_selection = {
+            table_name: columns + [m.column for m in value_matches if m.table == table_name]
+            for table_name, columns in (column_selection or {}).items()
+        }
+        if self._context_assembler is not None:
+            with STAGE_SECONDS.time(stage="context_assembly"), span("context_assembly"):
+                return self._context_assembler.assemble(query_str, table_schema_objs, column_selection, value_hints)
+
+        context_strs = []
+        for table_schema_obj in table_schema_objs:
+            table_name = table_schema_obj.table_name
+            table_info = self._sql_database.get_single_table_info(table_name)
+            if table_schema_obj.context_str:
+                table_info += " The table description is: " + table_schema_obj.context_str
+            hint = value_hints.get(table_name)
+            if hint:
+                table_info += "\nValues matching the question (use these exact literals): " + hint
+            context_strs.append(table_info)
+        return "\n\n".join(context_strs)
+
+    def _retrieve_values(self, query_str: str, table_schema_objs: List[SQLTableSchema]) -> List[ValueMatch]:
+        if self._value_retriever is None or not table_schema_objs:
+            return []
+        with STAGE_SECONDS.time(stage="value_retrieval"), span("value_retrieval") as s:
+            matches = self._value_retriever.retrieve(query_str, [t.table_name for t in table_schema_objs])
+            s.set_attribute("value_count", len(matches))
+            return matches
+
+    async def _aretrieve_values(self, query_str: str, table_schema_objs: List[SQLTableSchema]) -> List[ValueMatch]:
+        if self._value_retriever is None or not table_schema_objs:
+            return []
+        with STAGE_SECONDS.time(stage="value_retrieval"), span("value_retrieval") as s:
+            matches = await self._value_retriever.aretrieve(query_str, [t.table_name for t in table_schema_objs])
+            s.set_attribute("value_count", len(matches))
+            return matches
+
+    def _select_columns(self, query_str: str, table_schema_objs: List[SQLTableSchema]) -> Dict[str, List[str]]:
+        if self._column_retriever is None or not table_schema_objs:
+            return {}
+        with STAGE_SECONDS.time(stage="column_retrieval"), span("column_retrieval") as s:
+            selection = self._column_retriever.select(query_str, [t.table_name for t in table_schema_objs])
+            s.set_attribute("pruned_tables", len(selection))
+            return selection
+
+    async def _aselect_columns(self, query_str: str, table_schema_objs: List[SQLTableSchema]) -> Dict[str, List[str]]:
+        if self._column_retriever is None or not table_schema_objs:
+            return {}
+        with STAGE_SECONDS.time(stage="column_retrieval"), span("column_retrieval") as s:
+            selection = await self._column_retriever.aselect(query_str, [t.table_name for t in table_schema_objs])
+            s.set_attribute("pruned_tables", len(selection))
+            return selection
+
+    def _get_table_context(self, query_bundle: QueryBundle) -> str:
+        with STAGE_SECONDS.time(stage="table_retrieval"), span("table_retrieval") as s:
+            table_schema_objs = self._table_retriever.retrieve(query_bundle.query_str)
+            s.set_attribute("table_count", len(table_schema_objs))
+        value_matches = self._retrieve_values(query_bundle.query_str, table_schema_objs)
+        column_selection = self._select_columns(query_bundle.query_str, table_schema_objs)
+        return self._format_table_context(query_bundle.query_str, table_schema_objs, value_matches, column_selection)
+
+    async def _aget_table_context(self, query_bundle: QueryBundle) -> str:
+        with STAGE_SECONDS.time(stage="table_retrieval"), span("table_retrieval") as s:
+            table_schema_objs = await self._table_retriever.aretrieve(query_bundle.query_str)
+            s.set_attribute("table_count", len(table_schema_objs))
+        value_matches, column_selection = await asyncio.gather(
+            self._aretrieve_values(query_bundle.query_str, table_schema_objs),
+            self._aselect_columns(query_bundle.query_str, table_schema_objs),
+        )
+        return await asyncio.to_thread(
+            self._format_table_context, query_bundle.query_str, table_schema_objs, value_matches, column_selection
+        )
+
+    def _sql_extractor(self) -> SQLStreamExtractor:
+        return SQLStreamExtractor(backslash_escapes=self._sql_database.dialect in ("mysql", "mariadb"))
+
+    def _stream_predict(self, llm_span, **prompt_args: Any) -> str:
+        """流式生成, 返回截至第一条完整 SQL 语句的输出(未识别到完整语句时返回全部输出)"""
+        extractor = self._sql_extractor()
+        tokens = self._llm.stream(self._text_to_sql_prompt, **prompt_args)
+        try:
+            for delta in tokens:
+                sql_text = extractor.feed(delta)
+                if sql_text is not None:
+                    self._record_stream(llm_span, early_stop=True)
+                    return sql_text
+        finally:
+            # 关闭生成器会关闭底层 HTTP 响应, 服务端随之停止生成
+            tokens.close()
+        self._record_stream(llm_span, early_stop=False)
+        return extractor.text
+
+    async def _astream_predict(self, llm_span, **prompt_args: Any) -> str:
+        extractor = self._sql_extractor()
+        found = asyncio.get_running_loop().create_future()
+
+        async def pump():
+            tokens = await self._llm.astream(self._text_to_sql_prompt, **prompt_args)
+            async for delta in tokens:
+                if not found.done():
+                    sql_text = extractor.feed(delta)
+                    if sql_text is not None:
+                        found.set_result(sql_text)
+
+        # 异步生成器链(llama_index -> openai -> httpx)存在循环引用, 只 aclose 外层生成器要等到垃圾回收才会关闭连接;
+        # 这里在独立任务中读取输出, SQL 完整后取消该任务, 取消在最内层的网络读取处抛出, 逐层关闭底层 HTTP 响应
+        task = asyncio.ensure_future(pump())
+        try:
+            await asyncio.wait([task, found], return_when=asyncio.FIRST_COMPLETED)
+            if found.done():
+                self._record_stream(llm_span, early_stop=True)
+                return found.result()
+            task.result()
+        finally:
+            task.cancel()
+        self._record_stream(llm_span, early_stop=False)
+        return extractor.text
+
+    @staticmethod
+    def _record_stream(llm_span, early_stop: bool):
+        LLM_STREAMS.inc(outcome="early_stop" if early_stop else "completed")
+        llm_span.set_attribute("early_stop", early_stop)
+
+    def _build_result(self, sql_query_str: str) -> Tuple[List[NodeWithScore], Dict]:
+        if not self._sql_only:
+            raise NotImplementedError("Text2SQLRetriever 仅支持 sql_only 模式")
+        sql_only_node = TextNode(text=f"{sql_query_str}")
+        return [NodeWithScore(node=sql_only_node)], {"sql_query": sql_query_str, "result": sql_query_str}
+
+    def retrieve_with_metadata(
+        self, str_or_query_bundle: QueryType
+    ) -> Tuple[List[NodeWithScore], Dict]:
+        if isinstance(str_or_query_bundle, str):
+            query_bundle = QueryBundle(str_or_query_bundle)
+        else:
+            query_bundle = str_or_query_bundle
+
+        table_desc_str = self._get_table_context(query_bundle)
+        logger.info(f"> Table desc str: {table_desc_str}")
+
+        prompt_args = dict(query_str=query_bundle.query_str, schema=table_desc_str, dialect=self._sql_database.dialect)
+        with STAGE_SECONDS.time(stage="llm"), span("llm", schema_chars=len(table_desc_str)) as s:
+            if self._stream_llm_output:
+                response_str = self._stream_predict(s, **prompt_args)
+            else:
+                response_str = self._llm.predict(self._text_to_sql_prompt, **prompt_args)
+
+        sql_query_str = self._sql_parser.parse_response_to_sql(response_str, query_bundle)
+        logger.debug(f"> Predicted SQL query: {sql_query_str}")
+        return self._build_result(sql_query_str)
+
+    async def aretrieve_with_metadata(
+        self, str_or_query_bundle: QueryType
+    ) -> Tuple[List[NodeWithScore], Dict]:
+        if isinstance(str_or_query_bundle, str):
+            query_bundle = QueryBundle(str_or_query_bundle)
+        else:
+            query_bundle = str_or_query_bundle
+
+        table_desc_str = await self._aget_table_context(query_bundle)
+        logger.info(f"> Table desc str: {table_desc_str}")
+
+        prompt_args = dict(query_str=query_bundle.query_str, schema=table_desc_str, dialect=self._sql_database.dialect)
+        with STAGE_SECONDS.time(stage="llm"), span("llm", schema_chars=len(table_desc_str)) as s:
+            if self._stream_llm_output:
+                response_str = await self._astream_predict(s, **prompt_args)
+            else:
+                response_str = await self._llm.apredict(self._text_to_sql_prompt, **prompt_args)
+
+        sql_query_str = self._sql_parser.parse_response_to_sql(response_str, query_bundle)
+        logger.debug(f"> Predicted SQL query: {sql_query_str}")
+        return self._build_result(sql_query_str)
+
+
+class Text2SQLQueryEngine(BaseSQLTableQueryEngine):
+    """
+    与 SQLTableRetrieverQueryEngine 等价的查询引擎, 使用 Text2SQLRetriever 以支持非阻塞的 aquery
+    仅生成 SQL, 不执行也不合成回答
+    """
+
+    def __init__(
+        self,
+        sql_database: SQLDatabase,
+        table_retriever: ObjectRetriever[SQLTableSchema],
+        value_retriever: Optional[ValueIndex] = None,
+        column_retriever: Optional[ColumnIndex] = None,
+        context_assembler: Optional[ContextAssembler] = None,
+        stream_llm_output: bool = False,
+        llm: Optional[LLM] = None,
+        text_to_sql_prompt: Optional[BasePromptTemplate] = None,
+        callback_manager: Optional[CallbackManager] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._sql_retriever = Text2SQLRetriever(
+            sql_database,
+            table_retriever=table_retriever,
+            value_retriever=value_retriever,
+            column_retriever=column_retriever,
+            context_assembler=context_assembler,
+            stream_llm_output=stream_llm_output,
+            llm=llm,
+            text_to_sql_prompt=text_to_sql_prompt,
+            sql_only=True,
+            callback_manager=callback_manager,
+        )
+        super().__init__(
+            synthesize_response=False,
+            llm=llm,
+            callback_manager=callback_manager,
+            **kwargs,
+        )
+
+    @property
+    def sql_retriever(self) -> NLSQLRetriever:
+        return self._sql_retriever
@@ -0,0 +1,157 @@
+import re
+from typing import Optional
+
+# SQL 起始标记: 提示词要求的 "SQLQuery:" 前缀, 或 Markdown 代码块
+_QUERY_MARKER = "SQLQuery:"
+_RESULT_MARKER = "SQLResult:"
+_FENCE = "```"
+_FENCE_START = re.compile(r"```[A-Za-z]*[ \t]*\n")
+# 没有任何标记时, 只有整段输出直接以大写的 SELECT / WITH 开头才视为 SQL(避免把 "With the ..." 之类的说明文字当作 SQL)
+_BARE_START = re.compile(r"\s*(?:SELECT|WITH)\b")
+
+_NORMAL = "normal"
+_LINE_COMMENT = "line_comment"
+_BLOCK_COMMENT = "block_comment"
+_QUOTES = {"'": "single_quote", '"': "double_quote", "`": "backtick"}
+
+
+class SQLStreamExtractor:
+    """
+    增量扫描 LLM 的流式输出, 在第一条 SQL 语句完整时给出截止位置
+    语句结束的判断: 字符串/引号标识符/注释之外的分号, 代码块的结束围栏, 或 "SQLResult:" 标记
+    输出中没有可识别的 SQL 起始标记时不提前结束, 由调用方读完整个响应
+    """
+
+    def __init__(self, backslash_escapes: bool = False):
+        # MySQL 字符串中的反斜杠是转义符, 其余方言按字面处理
+        self.backslash_escapes = backslash_escapes
+        self.text = ""
+        self._origin: Optional[int] = None  # 起始标记的位置
+        self._pos = 0
+        self._state = _NORMAL
+
+    def feed(self, delta: str) -> Optional[str]:
+        """
+        追加一段输出; SQL 语句完整时返回从起始标记到语句末尾的文本(交给 SQL 解析器), 否则返回 None
+        """
+        self.text += delta
+        if self._origin is None and not self._find_start():
+            return None
+        end = self._scan()
+        return self.text[self._origin:end] if end is not None else None
+
+    def _find_start(self) -> bool:
+        text = self.text
+        candidates = []
+        marker = text.find(_QUERY_MARKER)
+        if marker != -1:
+            start = self._skip_fence(marker + len(_QUERY_MARKER))
+            if start is None:
+                return False
+            candidates.append((marker, start))
+        fence = _FENCE_START.search(text)
+        if fence is not None:
+            candidates.append((fence.start(), fence.end()))
+        if candidates:
+            self._origin, self._pos = min(candidates)
+        elif _BARE_START.match(text):
+            self._origin, self._pos = 0, 0
+        else:
+            return False
+        return True
+
+    def _skip_fence(self, i: int) -> Optional[int]:
+        """
+        "SQLQuery:" 之后紧跟代码块时(SQLQuery:\\n```sql\\n...), 从围栏行之后开始扫描, 到结束围栏为止
+        返回扫描起点; 尚不能判断后面是否为围栏(输出不完整)时返回 None
+        """
+        text = self.text
+        j = i
+        while j < len(text) and text[j].isspace():
+            j += 1
+        rest = text[j:j + len(_FENCE)]
+        if not _FENCE.startswith(rest):
+            return i
+        if j + len(_FENCE) > len(text):
+            return None
+        fence = _FENCE_START.match(text, j)
+        if fence is None:
+            # 围栏行尚未结束
+            return None if "\n" not in text[j:] else i
+        return fence.end()
+
+    def _pending(self, i: int, token: str) -> Optional[bool]:
+        """text[i:] 是否以 token 开头; 剩余文本不足以判断时返回 None"""
+        rest = self.text[i:i + len(token)]
+        if len(rest) < len(token):
+            return None if token.startswith(rest) else False
+        return rest == token
+
+    def _scan(self) -> Optional[int]:
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            state = self._state
+            if state == _NORMAL:
+                if ch == ";":
+                    return i + 1
+                if ch == "`":
+                    fence = self._pending(i, _FENCE)
+                    if fence is None:
+                        break
+                    if fence:
+                        return i
+                if ch == "S":
+                    result = self._pending(i, _RESULT_MARKER)
+                    if result is None:
+                        break
+                    if result:
+                        return i
+                if ch == "-":
+                    comment = self._pending(i, "--")
+                    if comment is None:
+                        break
+                    if comment:
+                        self._state = _LINE_COMMENT
+                        i += 2
+                        continue
+                if ch == "/":
+                    comment = self._pending(i, "/*")
+                    if comment is None:
+                        break
+                    if comment:
+                        self._state = _BLOCK_COMMENT
+                        i += 2
+                        continue
+                if ch in _QUOTES:
+                    self._state = _QUOTES[ch]
+            elif state == _LINE_COMMENT:
+                if ch == "\n":
+                    self._state = _NORMAL
+            elif state == _BLOCK_COMMENT:
+                if ch == "*":
+                    closed = self._pending(i, "*/")
+                    if closed is None:
+                        break
+                    if closed:
+                        self._state = _NORMAL
+                        i += 2
+                        continue
+            else:
+                if ch == "\\" and self.backslash_escapes and state != _QUOTES["`"]:
+                    if i + 1 >= len(text):
+                        break
+                    i += 2
+                    continue
+                if _QUOTES.get(ch) == state:
+                    # 连续两个引号是转义, 需要看到下一个字符才能判断
+                    if i + 1 >= len(text):
+                        break
+                    if text[i + 1] == ch:
+                        i += 2
+                        continue
+                    self._state = _NORMAL
+            i += 1
+        self._pos = i
+        return None
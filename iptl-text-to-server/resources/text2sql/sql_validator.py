@@ -1,4 +1,6 @@
-from sqlglot import exp, parse_one, parse, optimizer
+import threading
+from cachetools import LRUCache
+from sqlglot import exp, parse, optimizer
 from sqlglot.optimizer.simplify import simplify
 from sqlglot.optimizer.canonicalize import canonicalize
 from typing import Set, Optional, Any
@@ -12,10 +14,20 @@ class SQLSecurityChecker:
     最后执行验证的 SQL
     """
 
-    def __init__(self, blocked_tables: Optional[Set[str]] = None, max_limit: int = 50):
+    WRITE_OPERATIONS = (
+        exp.Insert, exp.Update, exp.Delete, exp.Drop,
+        exp.Create, exp.Alter, exp.Merge,
+        # exp.Union
+    )
+
+    def __init__(self, blocked_tables: Optional[Set[str]] = None, max_limit: int = 50, cache_size: int = 1024):
         self.blocked_tables = {t.lower() for t in blocked_tables} if blocked_tables else set()
         self.max_limit = max_limit
 
+        # 校验结果缓存: 相同 SQL 重复校验时直接返回上次的结果(或再次抛出上次的拦截原因)
+        self._verdict_cache: Optional[LRUCache] = LRUCache(maxsize=cache_size) if cache_size > 0 else None
+        self._cache_lock = threading.Lock()
+
         # 禁止执行可能导致远程代码执行、拒绝服务攻击、数据泄露的功能
         self.forbidden_funcs = {
             'sys_exec', 'shell_exec', 'load_file', 'sleep', 'benchmark',
@@ -26,32 +38,65 @@ class SQLSecurityChecker:
             'schema', 'version', 'connection_id', 'last_insert_id',
         }
 
-    def validata(self, sql: str, dialect: str = 'postgresql', optimize: bool = True) -> str:
-        """验证并优化给定的 SQL 查询"""
-
-        if len([e for e in parse(sql, read=dialect)]) > 1:
-            raise ValueError('安全拦截: 不允许执行多个 SQL 语句')
+    def validata(self, sql: str, dialect: str = 'postgresql', optimize: bool = True, limit: Optional[int] = None) -> str:
+        """
+        验证并优化给定的 SQL 查询
+        :param limit: 指定时将不超过该值的 LIMIT 下推到查询中(原查询的 LIMIT 更小时保留原值)
+        """
+        if self._verdict_cache is None:
+            return self._validate(sql, dialect, optimize, limit)
+
+        key = (sql, dialect, optimize, limit, frozenset(self.blocked_tables))
+        with self._cache_lock:
+            verdict = self._verdict_cache.get(key)
+        if verdict is None:
+            try:
+                verdict = (True, self._validate(sql, dialect, optimize, limit))
+            except ValueError as e:
+                verdict = (False, str(e))
+            with self._cache_lock:
+                self._verdict_cache[key] = verdict
+
+        passed, value = verdict
+        if not passed:
+            raise ValueError(value)
+        return value
+
+    def _validate(self, sql: str, dialect: str, optimize: bool, limit: Optional[int]) -> str:
+        """只解析一次 SQL, 依次完成语句数量检查、安全检查、优化与 LIMIT 下推"""
 
         try:
-            expression = parse_one(sql, dialect=dialect)
-            # print(expression.__repr__())
+            statements = [e for e in parse(sql, read=dialect) if e is not None]
+            # print(statements.__repr__())
         except Exception as e:
             raise ValueError(f'SQL 语法错误{str(e)}')
 
+        if len(statements) > 1:
+            raise ValueError('安全拦截: 不允许执行多个 SQL 语句')
+        if not statements:
+            raise ValueError('SQL 语法错误: 未包含任何语句')
+
+        expression = statements[0]
         if not isinstance(expression, exp.Query):
             raise ValueError('安全拦截: 仅允许 SELECT 语句(只读模式)')
 
-        self._check_recursive(expression)
+        self._check_tree(expression)
 
         if optimize:
             expression = self._optimize_query(expression)
 
-        # expression = self._apply_limit_optimization(expression)
+        if limit is not None:
+            expression = self._apply_limit_optimization(expression, limit)
 
         return expression.sql(dialect=dialect)
 
-    def _check_recursive(self, node):
-        """递归检查 AST 是否存在安全违规 """
+    def _check_tree(self, expression):
+        """迭代遍历 AST 的全部节点, 检查是否存在安全违规"""
+        for node in expression.walk():
+            self._check_node(node)
+
+    def _check_node(self, node):
+        """检查单个 AST 节点是否存在安全违规 """
 
         if isinstance(node, exp.Table):
             table_name = node.name.lower()
@@ -69,12 +114,7 @@ class SQLSecurityChecker:
             if func_name in self.forbidden_funcs:
                 raise ValueError(f'安全拦截：检测到黑名单中的自定义/匿名函数 {func_name}')
 
-        write_operations = (
-            exp.Insert, exp.Update, exp.Delete, exp.Drop,
-            exp.Create, exp.Alter, exp.Merge,
-            # exp.Union
-        )
-        if isinstance(node, write_operations):
+        if isinstance(node, self.WRITE_OPERATIONS):
             raise ValueError(f'安全拦截: 只读模式下不允许执行{type(node).__name__}操作')
 
         if isinstance(node, exp.Join):
@@ -104,10 +144,6 @@ class SQLSecurityChecker:
             if 'information_schema' in col_name:
                 raise ValueError(f'安全拦截: 禁止访问系统元数据')
 
-
-        for child in node.iter_expressions():
-            self._check_recursive(child)
-
     def _optimize_query(self, expression):
         """对查询结构应用安全优化, 简化布尔表达式, 消除不必要的子查询和公用表表达式"""
         rules = [
@@ -125,22 +161,27 @@ class SQLSecurityChecker:
 
         return expression
 
-    def _apply_limit_optimization(self, expression: exp.Select) -> exp.Select:
-        """强制查询设置最大限制, 以防止检索过多数据, 保证不超过 max_limit"""
+    def _apply_limit_optimization(self, expression: exp.Select, max_limit: Optional[int] = None) -> exp.Select:
+        """强制查询设置最大限制, 以防止检索过多数据, 保证不超过 max_limit(默认使用实例的 max_limit)"""
 
         if not isinstance(expression, exp.Query):
             raise ValueError('安全拦截: 只允许对 SELECT 做查询限制')
 
+        max_limit = self.max_limit if max_limit is None else max_limit
         current_limit = expression.args.get('limit')
-        final_limit = self.max_limit
+        final_limit = max_limit
 
         if current_limit:
-                limit_node = current_limit.this
+                # LIMIT n 的数值在 expression 参数中, FETCH FIRST n ROWS 的数值在 count 参数中
+                if isinstance(current_limit, exp.Fetch):
+                    limit_node = current_limit.args.get('count')
+                else:
+                    limit_node = current_limit.expression or current_limit.this
 
                 if isinstance(limit_node, exp.Literal) and limit_node.is_number:
                     try:
                         user_val = int(limit_node.this)
-                        if user_val < self.max_limit:
+                        if user_val < max_limit:
                             final_limit = user_val
                     except (ValueError, TypeError):
                         pass
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def statement_timeout(conn: Connection, seconds: Optional[float]):
+    """
+    在当前连接上为后续语句设置执行超时, 退出时恢复
+    PostgreSQL: SET LOCAL statement_timeout (随事务结束自动失效)
+    MySQL: SESSION MAX_EXECUTION_TIME (仅对 SELECT 生效)
+    SQL Server(pyodbc): 连接级 query timeout
+    Oracle: call_timeout
+    SQLite: 通过 progress handler 中断超时语句
+    其他方言不做限制
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+
+    dialect = conn.dialect.name
+    timeout_ms = max(1, int(seconds * 1000))
+    dbapi_conn = conn.connection.driver_connection
+    reset = None
+
+    try:
+        if dialect == "postgresql":
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+        elif dialect in ("mysql", "mariadb"):
+            previous = conn.exec_driver_sql("SELECT @@SESSION.max_execution_time").scalar()
+            conn.exec_driver_sql(f"SET SESSION max_execution_time = {timeout_ms}")
+            reset = lambda: conn.exec_driver_sql(f"SET SESSION max_execution_time = {int(previous or 0)}")
+        elif dialect == "mssql" and hasattr(dbapi_conn, "timeout"):
+            previous = dbapi_conn.timeout
+            dbapi_conn.timeout = max(1, int(seconds))
+            reset = lambda: setattr(dbapi_conn, "timeout", previous)
+        elif dialect == "oracle" and hasattr(dbapi_conn, "call_timeout"):
+            previous = dbapi_conn.call_timeout
+            dbapi_conn.call_timeout = timeout_ms
+            reset = lambda: setattr(dbapi_conn, "call_timeout", previous)
+        # aiosqlite 的连接只能在其工作线程中设置 progress handler, 由 async_statement_timeout 另行处理
+        elif dialect == "sqlite" and isinstance(dbapi_conn, sqlite3.Connection):
+            deadline = time.monotonic() + seconds
+            # 返回非 0 时 SQLite 中断当前语句(抛出 OperationalError: interrupted)
+            dbapi_conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 1000)
+            reset = lambda: dbapi_conn.set_progress_handler(None, 0)
+    except Exception as e:
+        logger.warning(f"Failed to set statement timeout for dialect {dialect}: {e}")
+
+    try:
+        yield
+    finally:
+        if reset is not None:
+            try:
+                reset()
+            except Exception as e:
+                logger.warning(f"Failed to reset statement timeout for dialect {dialect}: {e}")
+
+
+@asynccontextmanager
+async def async_statement_timeout(conn: AsyncConnection, seconds: Optional[float]):
+    """
+    statement_timeout 的异步版本, 在 AsyncConnection 底层的同步连接上设置与恢复超时
+    aiosqlite: 到期时在事件循环中调用 sqlite3.Connection.interrupt() 中断正在执行的语句(interrupt 可跨线程调用)
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+
+    cm = statement_timeout(conn.sync_connection, seconds)
+    await conn.run_sync(lambda _: cm.__enter__())
+    timer = None
+    if conn.dialect.name == "sqlite":
+        raw_conn = await conn.get_raw_connection()
+        # aiosqlite 的驱动连接包装了 sqlite3.Connection
+        sqlite_conn = getattr(raw_conn.driver_connection, "_conn", None)
+        if isinstance(sqlite_conn, sqlite3.Connection):
+            timer = asyncio.get_running_loop().call_later(seconds, sqlite_conn.interrupt)
+    try:
+        yield
+    finally:
+        if timer is not None:
+            timer.cancel()
+        await conn.run_sync(lambda _: cm.__exit__(None, None, None))
@@ -0,0 +1,249 @@
+import contextvars
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 设置该环境变量后, 启用本地 JSONL 文件导出器(每行一个 span)
+TRACE_FILE_ENV = "TEXT2SQL_TRACE_FILE"
+
+
+class Span:
+    """ 一次操作的耗时记录, 同一请求内的 span 共享 trace_id, 通过 parent_id 组成树 """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_time", "end_time",
+                 "_start_perf", "attributes", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self._start_perf = time.perf_counter()
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def record_error(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self, end_time: Optional[float] = None) -> None:
+        if self.end_time is not None:
+            return
+        self.end_time = end_time if end_time is not None else self.start_time + (time.perf_counter() - self._start_perf)
+        exporter = _exporter
+        if exporter is not None:
+            try:
+                exporter.export([self])
+            except Exception as e:
+                logger.warning(f"[Tracing] Failed to export span {self.name}: {e}")
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_time is None:
+            return None
+        return (self.end_time - self.start_time) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """ 不在任何 trace 内时返回的空 span, 调用方无需判断 """
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+    def record_error(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """ span 导出器接口, 在 span 结束时于结束它的线程中同步调用, 实现应尽量轻量 """
+
+    def export(self, spans: List[Span]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JsonlFileExporter(SpanExporter):
+    """ 将 span 以 JSON Lines 追加写入本地文件, 无需外部采集器 """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, spans: List[Span]) -> None:
+        lines = "".join(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n" for s in spans)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(lines)
+            self._file.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class InMemoryExporter(SpanExporter):
+    """ 保存在内存中, 用于调试与基准测试 """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            self.spans.extend(spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+_exporter: Optional[SpanExporter] = None
+_exporter_lock = threading.Lock()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("text2sql_current_span", default=None)
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    """替换全局导出器, 传入 None 关闭追踪; 旧导出器会被关闭"""
+    global _exporter
+    with _exporter_lock:
+        previous, _exporter = _exporter, exporter
+    if previous is not None and previous is not exporter:
+        previous.shutdown()
+
+
+def get_exporter() -> Optional[SpanExporter]:
+    return _exporter
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    active = _current_span.get()
+    return active.trace_id if active is not None else None
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    开始一条新的 trace(请求入口调用), 代码块内创建的 span 均为其子孙
+    已处于 trace 内时作为子 span 处理; 未配置导出器时不做任何记录
+    """
+    parent = _current_span.get()
+    if _exporter is None and parent is None:
+        yield NOOP_SPAN
+        return
+    trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+    with _activate(Span(name, trace_id, parent.span_id if parent else None, attributes)) as root:
+        yield root
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """在当前 trace 下创建子 span; 不在 trace 内时返回空 span"""
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    with _activate(Span(name, parent.trace_id, parent.span_id, attributes)) as child:
+        yield child
+
+
+@contextmanager
+def _activate(span_obj: Span) -> Iterator[Span]:
+    token = _current_span.set(span_obj)
+    try:
+        yield span_obj
+    except BaseException as e:
+        span_obj.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span_obj.end()
+
+
+def record_span(name: str, start_time: float, end_time: float, **attributes: Any) -> None:
+    """记录一个已结束的子 span(用于由事件回调得到起止时间的操作, 如嵌入请求)"""
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span(name, parent.trace_id, parent.span_id, attributes)
+    child.start_time = start_time
+    child.end(end_time)
+
+
+def llm_usage_attributes(response: Any) -> Dict[str, int]:
+    """从 llama_index 的 Completion/ChatResponse.raw 中提取 OpenAI 兼容接口返回的 token 用量"""
+    raw = getattr(response, "raw", None)
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if usage is None:
+        return {}
+    attributes = {}
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = usage.get(key) if isinstance(usage, dict) else getattr(usage, key, None)
+        if isinstance(value, int):
+            attributes[key] = value
+    return attributes
+
+
+def configure_from_env() -> None:
+    """根据环境变量启用 JSONL 文件导出器"""
+    path = os.environ.get(TRACE_FILE_ENV)
+    if path and _exporter is None:
+        try:
+            set_exporter(JsonlFileExporter(path))
+            logger.info(f"[Tracing] Exporting spans to {path}")
+        except OSError as e:
+            logger.warning(f"[Tracing] Failed to open trace file {path}: {e}")
+
+
+configure_from_env()
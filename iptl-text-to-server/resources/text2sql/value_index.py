@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import chromadb
+from sqlalchemy import MetaData, Table, select
+from sqlalchemy.types import Enum, String
+
+from .config import Text2SQLConfig
+from .db_manager import DatabaseManager
+from .statement_timeout import statement_timeout
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ValueMatch:
+    """ 与问题相似的列取值 """
+    table: str
+    column: str
+    value: str
+    score: float
+
+
+class ValueIndex:
+    """
+    列取值向量索引: 把指定列(或自动选出的低基数文本列)的不同取值嵌入到 {collection}_values 集合,
+    查询时按问题检索相似取值, 让 LLM 直接写出库中真实存在的字面量
+
+    - 取值通过流式 SELECT DISTINCT ... LIMIT 读取, 每列有基数上限与语句超时, 不会把整列读入内存
+    - 清单文件 {collection}_values.json 记录每列取值集合的摘要; 刷新时摘要未变的列不访问向量库,
+      变化的列只嵌入新增取值、删除已消失的取值
+    """
+
+    # 流式读取时每批取回的行数
+    FETCH_SIZE = 1000
+    # 单次写入向量库的条数, 低于 chroma 的批量上限
+    UPSERT_BATCH = 1000
+
+    def __init__(self, config: Text2SQLConfig, db_manager: DatabaseManager, embed_model):
+        self.config = config
+        self.db_manager = db_manager
+        self.embed_model = embed_model
+        client = chromadb.PersistentClient(path=config.chroma_db_path)
+        self._collection = client.get_or_create_collection(
+            f"{config.chroma_collection_name}_values",
+            metadata={"hnsw:space": "cosine"},
+        )
+        # 已索引取值的表; 检索到的表都不在其中时不请求问题向量
+        self._indexed_tables: Set[str] = self._tables_in(self._load_manifest())
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.config.chroma_db_path, f"{self.config.chroma_collection_name}_values.json")
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"[ValueIndex] Failed to load manifest {path}: {e}")
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, dict]):
+        path = self._manifest_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _tables_in(manifest: Dict[str, dict]) -> Set[str]:
+        return {entry["table"] for entry in manifest.values() if entry.get("count")}
+
+    @staticmethod
+    def _column_key(table: str, column: str) -> str:
+        return f"{table}.{column}"
+
+    @staticmethod
+    def _value_id(table: str, column: str, value: str) -> str:
+        return hashlib.md5(f"{table}\x00{column}\x00{value}".encode("utf-8")).hexdigest()
+
+    # ---------- 选列与读取取值 ----------
+
+    def target_columns(self) -> List[Tuple[str, str, bool]]:
+        """返回需要索引的 (表, 列, 是否自动选出); 显式配置的列优先"""
+        tables = set(self.db_manager.get_table_names())
+        targets: Dict[Tuple[str, str], bool] = {}
+        for table, columns in self.config.row_retrieval_columns.items():
+            if table not in tables:
+                continue
+            for column in columns:
+                targets[(table, column)] = False
+
+        if self.config.value_index_auto_columns:
+            for table, meta in self.db_manager.reflect_catalog(sorted(tables)).items():
+                pk = set(meta.primary_key)
+                fk = {c for fk in meta.foreign_keys for c in fk["constrained_columns"]}
+                for col in meta.columns:
+                    if col["name"] in pk or col["name"] in fk:
+                        continue
+                    if isinstance(col["type"], (String, Enum)):
+                        targets.setdefault((table, col["name"]), True)
+        return [(table, column, auto) for (table, column), auto in targets.items()]
+
+    def _table(self, table_name: str) -> Table:
+        table = self.db_manager.sql_database.metadata_obj.tables.get(table_name)
+        if table is None:
+            table = Table(table_name, MetaData(), autoload_with=self.db_manager.engine)
+        return table
+
+    def _stream_values(self, table_name: str, column_name: str, limit: int) -> Iterator[str]:
+        """流式读取列的不同取值(至多 limit 个, 不含 NULL/空串/超长文本)"""
+        column = self._table(table_name).c[column_name]
+        stmt = select(column).where(column.is_not(None)).distinct().limit(limit)
+        max_chars = self.config.value_index_max_value_chars
+        with self.db_manager.engine.connect() as conn:
+            with statement_timeout(conn, self.config.value_index_statement_timeout):
+                result = conn.execute(stmt, execution_options={"stream_results": True, "yield_per": self.FETCH_SIZE})
+                for partition in result.partitions():
+                    for (value,) in partition:
+                        text = str(value).strip()
+                        if text and len(text) <= max_chars:
+                            yield text
+
+    def _read_values(self, table: str, column: str, auto: bool) -> Optional[Tuple[List[str], bool]]:
+        """
+        返回 (取值列表, 是否截断); 自动选出的列超过基数上限时返回 None(不适合做取值匹配)
+        """
+        cap = self.config.value_index_auto_max_distinct if auto else self.config.value_index_max_distinct
+        values = list(dict.fromkeys(self._stream_values(table, column, cap + 1)))
+        if len(values) <= cap:
+            return values, False
+        if auto:
+            return None
+        return values[:cap], True
+
+    # ---------- 构建与增量刷新 ----------
+
+    def _existing_ids(self, table: str, column: str) -> List[str]:
+        return self._collection.get(where={"$and": [{"table": table}, {"column": column}]}, include=[])["ids"]
+
+    def _delete_ids(self, ids: Sequence[str]):
+        for i in range(0, len(ids), self.UPSERT_BATCH):
+            self._collection.delete(ids=list(ids[i:i + self.UPSERT_BATCH]))
+
+    def _add_values(self, table: str, column: str, values: List[Tuple[str, str]]):
+        for i in range(0, len(values), self.UPSERT_BATCH):
+            batch = values[i:i + self.UPSERT_BATCH]
+            embeddings = self.embed_model.get_text_embedding_batch([v for _, v in batch])
+            self._collection.upsert(
+                ids=[value_id for value_id, _ in batch],
+                embeddings=embeddings,
+                documents=[v for _, v in batch],
+                metadatas=[{"table": table, "column": column} for _ in batch],
+            )
+
+    def _sync_column(self, table: str, column: str, auto: bool, previous: Optional[dict]) -> Optional[dict]:
+        read = self._read_values(table, column, auto)
+        if read is None:
+            if previous:
+                self._delete_ids(self._existing_ids(table, column))
+            logger.info(f"[ValueIndex] Skipped {table}.{column}: more than "
+                        f"{self.config.value_index_auto_max_distinct} distinct values")
+            return None
+
+        values, truncated = read
+        ids = {self._value_id(table, column, v): v for v in values}
+        digest = hashlib.md5("\n".join(sorted(ids)).encode("utf-8")).hexdigest()
+        if previous and previous.get("digest") == digest:
+            return previous
+
+        existing = set(self._existing_ids(table, column))
+        stale = [i for i in existing if i not in ids]
+        fresh = [(i, v) for i, v in ids.items() if i not in existing]
+        self._delete_ids(stale)
+        self._add_values(table, column, fresh)
+        if truncated:
+            logger.warning(f"[ValueIndex] {table}.{column} has more than "
+                           f"{self.config.value_index_max_distinct} distinct values, index truncated")
+        logger.info(f"[ValueIndex] {table}.{column}: {len(fresh)} added, {len(stale)} removed")
+        return {"digest": digest, "count": len(ids), "truncated": truncated, "updated_at": time.time()}
+
+    def sync(self, only_missing: bool = False) -> Dict[str, int]:
+        """
+        同步取值索引: 删除不再需要索引的列, 重新读取其余各列并增量更新
+        only_missing=True 时只处理清单中没有的列(启动加载时使用, 避免每次启动都扫描取值)
+        返回 {"synced": 列数, "removed": 列数, "failed": 列数}
+        """
+        manifest = self._load_manifest()
+        targets = self.target_columns()
+        wanted = {self._column_key(t, c) for t, c, _ in targets}
+
+        removed = [key for key in manifest if key not in wanted]
+        for key in removed:
+            table, column = manifest[key]["table"], manifest[key]["column"]
+            self._delete_ids(self._existing_ids(table, column))
+            manifest.pop(key)
+
+        synced = failed = 0
+        for table, column, auto in targets:
+            key = self._column_key(table, column)
+            if only_missing and key in manifest:
+                continue
+            try:
+                entry = self._sync_column(table, column, auto, manifest.get(key))
+            except Exception as e:
+                failed += 1
+                logger.warning(f"[ValueIndex] Failed to index values of {key}: {e}")
+                continue
+            synced += 1
+            if entry is None:
+                manifest.pop(key, None)
+            else:
+                manifest[key] = {"table": table, "column": column, **entry}
+
+        self._save_manifest(manifest)
+        self._indexed_tables = self._tables_in(manifest)
+        return {"synced": synced, "removed": len(removed), "failed": failed}
+
+    # ---------- 检索 ----------
+
+    def _query(self, embedding: List[float], tables: List[str]) -> List[ValueMatch]:
+        if not tables or self._collection.count() == 0:
+            return []
+        where: Dict[str, Any] = {"table": tables[0]} if len(tables) == 1 else {"table": {"$in": tables}}
+        result = self._collection.query(
+            query_embeddings=[embedding],
+            n_results=self.config.top_k_values,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        matches = []
+        for value, meta, distance in zip(result["documents"][0], result["metadatas"][0], result["distances"][0]):
+            score = 1.0 - distance
+            if score >= self.config.value_match_min_score:
+                matches.append(ValueMatch(meta["table"], meta["column"], value, score))
+        return matches
+
+    def _searchable(self, tables: List[str]) -> List[str]:
+        indexed = self._indexed_tables
+        return [t for t in tables if t in indexed]
+
+    def retrieve(self, query_str: str, tables: List[str]) -> List[ValueMatch]:
+        """
+        在给定表范围内检索与问题相似的取值; 问题向量与表检索共用嵌入缓存, 通常不产生额外请求
+        给定表中没有已索引的取值时(如未配置取值列)直接返回, 不请求问题向量
+        """
+        tables = self._searchable(tables)
+        if not tables:
+            return []
+        return self._query(self.embed_model.get_query_embedding(query_str), tables)
+
+    async def aretrieve(self, query_str: str, tables: List[str]) -> List[ValueMatch]:
+        tables = self._searchable(tables)
+        if not tables:
+            return []
+        embedding = await self.embed_model.aget_query_embedding(query_str)
+        return await asyncio.to_thread(self._query, embedding, tables)
+
+
+def format_value_hints(matches: List[ValueMatch]) -> Dict[str, str]:
+    """按表汇总匹配到的取值, 返回 {表名: 提示文本}"""
+    by_table: Dict[str, Dict[str, List[str]]] = {}
+    for m in matches:
+        by_table.setdefault(m.table, {}).setdefault(m.column, []).append(m.value)
+    hints = {}
+    for table, columns in by_table.items():
+        parts = []
+        for column, values in columns.items():
+            literals = ", ".join("'" + v.replace("'", "''") + "'" for v in values)
+            parts.append(f"{column} in ({literals})")
+        hints[table] = "; ".join(parts)
+    return hints
@@ -1,10 +1,12 @@
 from fastapi import HTTPException, BackgroundTasks
 
 from mcp_server.mcp_server import build_mcp_server_app
-from resources.config.config import DatabaseConfig, ModelConfig, PromptsConfig
+from resources.config.config import DatabaseConfig, ModelConfig, PromptsConfig, CacheInvalidation
 from resources.config.config_save import update_global_db_config, get_global_db_config, update_global_model_config, \
     get_global_model_config, update_global_prompts_config, get_global_prompts_config, validate_model, validate_db_connection
-from resources.text2sql.factory import warm_up_engine_task
+from resources.text2sql.factory import warm_up_engine_task, refresh_schema_task
+from resources.text2sql.metrics import CONTENT_TYPE_LATEST, render_latest
+from resources.text2sql.service import ToolContainer
 import click
 import uvicorn
 from fastapi import FastAPI
@@ -13,7 +15,7 @@ from fastapi.openapi.docs import (
     get_swagger_ui_html
 )
 from fastapi.staticfiles import StaticFiles
-from starlette.responses import RedirectResponse
+from starlette.responses import RedirectResponse, Response
 from pathlib import Path
 
 # 初始化FastAPI应用
@@ -188,6 +190,51 @@ async def get_prompts_config():
         "data": data
     }
 
+@app.post("/api/text2/schema/refresh", summary="增量刷新表结构索引")
+async def refresh_schema(background_tasks: BackgroundTasks):
+    """
+    后台比对表结构指纹，仅重新生成新增/变化表的描述与向量，并删除已不存在的表
+    """
+    background_tasks.add_task(refresh_schema_task)
+    return {"code": 200, "message": "已开始在后台刷新表结构索引"}
+
+@app.post("/api/text2/cache/result/invalidate", summary="按表名失效查询结果缓存")
+async def invalidate_result_cache(body: CacheInvalidation):
+    """
+    源表数据变更后调用，移除引用了这些表的缓存结果
+    请求示例：
+    POST http://localhost:8000/api/text2/cache/result/invalidate
+    Body (JSON):
+    {
+        "tables": ["orders", "users"]
+    }
+    """
+    removed = ToolContainer.invalidate_cached_results(body.tables)
+    return {"code": 200, "message": "结果缓存已失效", "data": {"removed": removed}}
+
+@app.get("/api/text2/cache/description/stats", summary="获取 LLM 表描述缓存命中统计")
+async def get_description_cache_stats():
+    """
+    返回本进程内 LLM 表描述缓存的命中/未命中次数，按缓存目录分组
+    """
+    return {"code": 200, "message": "获取缓存统计成功", "data": ToolContainer.description_cache_stats()}
+
+@app.get("/api/text2/pool/stats", summary="获取源数据库连接池状态")
+async def get_pool_stats():
+    """
+    返回各源数据库引擎连接池的实时状态：常驻连接数、已借出/空闲连接数、溢出连接数，
+    以及获取连接的等待时间累积直方图(秒)与超时次数，用于按 pgbouncer 限额调整连接池大小
+    """
+    return {"code": 200, "message": "获取连接池状态成功", "data": ToolContainer.pool_stats()}
+
+@app.get("/metrics", summary="Prometheus 指标", include_in_schema=False)
+async def metrics():
+    """
+    以 Prometheus 文本格式输出各阶段耗时直方图(语义缓存、表检索、嵌入、LLM、校验、执行、总耗时)、
+    查询结果计数、缓存命中、索引构建/刷新耗时、引擎池事件与源数据库连接池占用
+    """
+    return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @click.command(help="启动服务")
 @click.option(
     "-h",
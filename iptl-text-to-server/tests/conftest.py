@@ -0,0 +1,44 @@
+import hashlib
+from typing import List
+
+import pytest
+from llama_index.core.embeddings import MockEmbedding
+
+from resources.text2sql.config import Text2SQLConfig
+
+
+class HashEmbedding(MockEmbedding):
+    """
+    确定性的假嵌入模型, 并统计请求次数
+    向量只取决于词的集合: 词序不同的问题向量相同(可模糊命中), 其余问题向量近似正交
+    """
+
+    calls: int = 0
+
+    def _vector(self, text: str) -> List[float]:
+        self.calls += 1
+        words = " ".join(sorted(set(text.lower().split())))
+        digest = hashlib.md5(words.encode("utf-8")).digest()
+        return [b / 255 for b in digest[:self.embed_dim]]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._vector(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._vector(query)
+
+
+@pytest.fixture
+def embed_model():
+    return HashEmbedding(embed_dim=8)
+
+
+@pytest.fixture
+def config(tmp_path):
+    return Text2SQLConfig(db_uri="sqlite:///test.db", base_chroma_path=str(tmp_path))
@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import text
+
+from resources.config import config_save
+from resources.config.config import DatabaseType
+from resources.text2sql import db_pool
+
+DB_CONFIG = {
+    "host": "localhost",
+    "port": 5432,
+    "username": "u",
+    "password": "p",
+    "database_name": "db",
+    "database_type": DatabaseType.PostgreSQL,
+}
+
+
+@pytest.fixture
+def sqlite_engine(monkeypatch, tmp_path):
+    """以 sqlite 库代替目标数据库, 仍注册到共享引擎注册表"""
+    uri = f"sqlite:///{tmp_path / 'validate.db'}"
+
+    def get_engine(db_uri, settings=None, connect_args=None):
+        return db_pool.get_engine(uri, settings)
+
+    monkeypatch.setattr(config_save, "get_engine", get_engine)
+    return lambda: db_pool.get_engine(uri, db_pool.PoolSettings.from_config(DB_CONFIG))
+
+
+def registered(engine):
+    return engine in db_pool._ENGINES.values()
+
+
+def test_valid_connection_keeps_engine(sqlite_engine):
+    assert config_save.validate_db_connection(DB_CONFIG) == (True, "数据库连接验证成功")
+    assert registered(sqlite_engine())
+
+
+def test_unexpected_result_disposes_engine(sqlite_engine, monkeypatch):
+    engine = sqlite_engine()
+    monkeypatch.setattr(config_save, "text", lambda sql: text("SELECT 2"))
+    ok, message = config_save.validate_db_connection(DB_CONFIG)
+    assert not ok and "预期结果" in message
+    assert not registered(engine)
+
+
+def test_failed_query_disposes_engine(sqlite_engine, monkeypatch):
+    engine = sqlite_engine()
+    monkeypatch.setattr(config_save, "text", lambda sql: text("SELECT * FROM missing"))
+    ok, message = config_save.validate_db_connection(DB_CONFIG)
+    assert not ok and message.startswith("数据库连接失败")
+    assert not registered(engine)
@@ -0,0 +1,219 @@
+import pytest
+from llama_index.core import SQLDatabase
+from llama_index.core.objects import SQLTableSchema
+from sqlalchemy import create_engine, inspect
+
+from resources.text2sql import context_assembler
+from resources.text2sql.context_assembler import (
+    LEVEL_FULL,
+    LEVEL_NO_COMMENTS,
+    LEVEL_NO_SAMPLES,
+    LEVEL_TRIM_COLUMNS,
+    ContextAssembler,
+    full_context_tokens,
+    key_columns,
+    render_description,
+    render_table_info,
+)
+from resources.text2sql.db_manager import TableMetadata
+
+
+def column(name, type_="INTEGER", comment=None):
+    return {"name": name, "type": type_, "comment": comment}
+
+
+ORDERS = TableMetadata(
+    name="orders",
+    columns=[
+        column("id"),
+        column("user_id"),
+        column("amount", "REAL", comment="order total"),
+        column("status", "TEXT"),
+        column("note", "TEXT"),
+    ],
+    primary_key=["id"],
+    foreign_keys=[{"constrained_columns": ["user_id"], "referred_table": "users", "referred_columns": ["id"]}],
+    comment="customer orders",
+)
+USERS = TableMetadata(
+    name="users",
+    columns=[column("id")] + [column(name, "TEXT") for name in ("name", "city", "email", "phone", "address", "zip")],
+    primary_key=["id"],
+)
+
+ORDERS_DESCRIPTION = """Table: orders
+Primary Key: id
+Foreign Keys:
+  - user_id -> users.id
+Columns:
+  - id (INTEGER), samples: ['1', '2']
+  - user_id (INTEGER), samples: ['7']
+  - amount (REAL), samples: ['9.5', '12.0']: order total
+  - status (TEXT), samples: ['paid', 'it''s; [x]']
+  - note (TEXT)"""
+
+
+class FakeDatabaseManager:
+    def __init__(self, *tables: TableMetadata):
+        self.catalog = {t.name: t for t in tables}
+
+    def reflect_catalog(self, table_names):
+        return {t: self.catalog[t] for t in table_names if t in self.catalog}
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    """按空白分词计数, 使预算相关的断言不依赖具体的 tokenizer"""
+    monkeypatch.setattr(context_assembler, "_count_tokens", lambda text: len(text.split()))
+
+
+def test_render_table_info_matches_sql_database():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.exec_driver_sql("CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id))")
+    inspector = inspect(engine)
+    sql_database = SQLDatabase(engine)
+    for name in ("users", "orders"):
+        meta = TableMetadata(
+            name=name, columns=inspector.get_columns(name), foreign_keys=inspector.get_foreign_keys(name)
+        )
+        assert render_table_info(meta) == sql_database.get_single_table_info(name)
+
+
+def test_render_table_info_with_comments():
+    assert render_table_info(ORDERS) == (
+        "Table 'orders' has columns: id (INTEGER), user_id (INTEGER), amount (REAL): 'order total', "
+        "status (TEXT), note (TEXT), with comment: (customer orders)  and foreign keys: ['user_id'] -> users.['id']."
+    )
+
+
+def test_render_table_info_subset():
+    info = render_table_info(ORDERS, columns=["id", "amount"], comments=False)
+    assert info == (
+        "Table 'orders' has columns: id (INTEGER), amount (REAL),  and foreign keys: "
+        "['user_id'] -> users.['id']. (3 columns unrelated to the question are omitted)"
+    )
+
+
+def test_key_columns():
+    assert key_columns(ORDERS) == ["id", "user_id"]
+    assert key_columns(USERS) == ["id"]
+
+
+def test_render_description_unchanged_by_default():
+    assert render_description(ORDERS_DESCRIPTION) == ORDERS_DESCRIPTION
+
+
+def test_render_description_degrades():
+    assert render_description(ORDERS_DESCRIPTION, columns=["id", "amount"], samples=False) == """Table: orders
+Primary Key: id
+Foreign Keys:
+  - user_id -> users.id
+Columns:
+  - id (INTEGER)
+  - amount (REAL): order total"""
+    assert "order total" not in render_description(ORDERS_DESCRIPTION, comments=False)
+    # 带引号与方括号的取样值整体移除
+    assert "it''s" not in render_description(ORDERS_DESCRIPTION, samples=False)
+
+
+def test_render_description_free_text():
+    text = "Orders placed by users, one row per order."
+    assert render_description(text, columns=["id"]) == text
+    assert render_description(text, comments=False) == ""
+
+
+def test_full_context_tokens():
+    expected = len(render_table_info(ORDERS).split()) + len(f"The table description is: {ORDERS_DESCRIPTION}".split())
+    assert full_context_tokens(ORDERS, ORDERS_DESCRIPTION) == expected
+
+
+def schemas():
+    return [
+        SQLTableSchema(table_name="orders", context_str=ORDERS_DESCRIPTION),
+        SQLTableSchema(
+            table_name="users",
+            context_str="Table: users\nColumns:\n  - id (INTEGER)\n  - name (TEXT), samples: ['bob', 'amy']\n"
+                        + "\n".join(f"  - {name} (TEXT)" for name in ("city", "email", "phone", "address", "zip")),
+        ),
+    ]
+
+
+def test_assemble_without_budget():
+    assembler = ContextAssembler(FakeDatabaseManager(ORDERS, USERS))
+    context = assembler.assemble("q", schemas(), value_hints={"users": "name = 'bob'"})
+    orders, users = context.split("\n\n")
+    assert orders == render_table_info(ORDERS) + " The table description is: " + ORDERS_DESCRIPTION
+    assert users.endswith("\nValues matching the question (use these exact literals): name = 'bob'")
+
+
+def test_column_selection_keeps_keys():
+    assembler = ContextAssembler(FakeDatabaseManager(ORDERS, USERS))
+    (ctx,) = assembler.build("q", schemas()[:1], column_selection={"orders": ["amount", "missing"]})
+    assert ctx.keys == ["id", "user_id"]
+    assert ctx.ranked_columns[0] == "amount"
+    assert ctx.column_limit == 1
+    rendered = assembler.render(ctx)
+    assert "status" not in rendered and "amount (REAL)" in rendered and "user_id" in rendered
+
+
+def test_columns_mentioned_in_question_rank_first():
+    assembler = ContextAssembler(FakeDatabaseManager(ORDERS))
+    (ctx,) = assembler.build("orders by status", schemas()[:1])
+    assert ctx.ranked_columns == ["status", "amount", "note"]
+
+
+def test_precomputed_tokens_skip_fitting():
+    assembler = ContextAssembler(FakeDatabaseManager(ORDERS, USERS), budget=1000, token_lookup=lambda t: 10)
+    contexts = assembler.build("q", schemas())
+    assert assembler.fit(contexts) == contexts
+    assert all(ctx.level == LEVEL_FULL for ctx in contexts)
+
+
+def budget_for(assembler, contexts):
+    return sum(context_assembler.count_tokens(assembler.render(ctx)) for ctx in contexts)
+
+
+def test_lowest_ranked_table_degrades_first():
+    assembler = ContextAssembler(FakeDatabaseManager(ORDERS, USERS))
+    contexts = assembler.build("q", schemas())
+    assembler.budget = budget_for(assembler, contexts) - 1
+    kept = assembler.fit(contexts)
+    assert [ctx.level for ctx in kept] == [LEVEL_FULL, LEVEL_NO_SAMPLES]
+
+
+def test_columns_are_trimmed_before_tables_are_dropped():
+    assembler = ContextAssembler(FakeDatabaseManager(ORDERS, USERS))
+    contexts = assembler.build("q", schemas())
+    for ctx in contexts:
+        ctx.level = LEVEL_NO_COMMENTS
+    # 去掉取样值与注释后仍超出预算 1 个 token
+    assembler.budget = budget_for(assembler, contexts) - 1
+    for ctx in contexts:
+        ctx.level = LEVEL_FULL
+    kept = assembler.fit(contexts)
+    assert [ctx.level for ctx in kept] == [LEVEL_NO_COMMENTS, LEVEL_TRIM_COLUMNS]
+    assert kept[1].column_limit == 3
+    assert "phone" not in assembler.render(kept[1]) and "email" in assembler.render(kept[1])
+
+
+def test_top_table_is_always_kept():
+    assembler = ContextAssembler(FakeDatabaseManager(ORDERS, USERS), budget=1)
+    kept = assembler.fit(assembler.build("q", schemas()))
+    assert [ctx.table_name for ctx in kept] == ["orders"]
+    assert kept[0].level == LEVEL_TRIM_COLUMNS
+    # 键列始终保留
+    assert "id (INTEGER), user_id (INTEGER)" in assembler.render(kept[0])
+
+
+def test_table_without_metadata_uses_sql_database():
+    class WithSQLDatabase(FakeDatabaseManager):
+        class sql_database:
+            @staticmethod
+            def get_single_table_info(table_name):
+                return f"Table '{table_name}' has columns: x (INTEGER), ."
+
+    assembler = ContextAssembler(WithSQLDatabase())
+    context = assembler.assemble("q", [SQLTableSchema(table_name="view_x")])
+    assert context == "Table 'view_x' has columns: x (INTEGER), ."
@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import create_engine, event
+
+from resources.text2sql.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db_uri(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'catalog.db'}"
+    engine = create_engine(uri)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        conn.exec_driver_sql(
+            "CREATE TABLE orders (id INTEGER, k INTEGER, user_id INTEGER REFERENCES users(id), "
+            "parent_id INTEGER REFERENCES orders(id), PRIMARY KEY (k, id))"
+        )
+        conn.exec_driver_sql("CREATE VIEW user_names AS SELECT name FROM users")
+    engine.dispose()
+    return uri
+
+
+def structure(meta):
+    return (
+        [(c["name"], str(c["type"]), c["nullable"], c.get("comment")) for c in meta.columns],
+        meta.primary_key,
+        sorted((fk["constrained_columns"], fk["referred_table"], fk["referred_columns"]) for fk in meta.foreign_keys),
+        meta.comment,
+    )
+
+
+def test_catalog_is_built_from_sql_database_metadata(db_uri):
+    manager = DatabaseManager(db_uri, include_tables=["users", "orders", "user_names"])
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(manager.engine, "before_cursor_execute", record)
+    try:
+        catalog = manager.reflect_catalog()
+    finally:
+        event.remove(manager.engine, "before_cursor_execute", record)
+    # SQLDatabase 已反射的 MetaData 直接构建快照, 不再查询目录
+    assert statements == []
+
+    reflected = manager._reflect_tables(["users", "orders", "user_names"])
+    assert {t: structure(m) for t, m in catalog.items()} == {t: structure(m) for t, m in reflected.items()}
+    # 外键按约束列在表中的位置排序
+    assert [fk["constrained_columns"] for fk in catalog["orders"].foreign_keys] == [["user_id"], ["parent_id"]]
+
+
+def test_tables_missing_from_metadata_are_reflected(db_uri):
+    manager = DatabaseManager(db_uri, include_tables=["users"])
+    assert manager.get_table_metadata("orders").primary_key == ["k", "id"]
+    assert manager.get_table_metadata("missing") is None
@@ -0,0 +1,81 @@
+import asyncio
+from typing import List
+
+import numpy as np
+import pytest
+
+from resources.text2sql.embeddings import CachedEmbedding, EmbeddingStore, get_embedding_store
+from tests.conftest import HashEmbedding
+
+
+class BatchCountingEmbedding(HashEmbedding):
+    """记录每次批量请求的文本数"""
+
+    batches: List[int] = []
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.batches = self.batches + [len(texts)]
+        return [self._vector(t) for t in texts]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._get_text_embeddings(texts)
+
+
+@pytest.fixture
+def inner():
+    return BatchCountingEmbedding(embed_dim=8)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_batch_is_deduplicated_and_split(inner):
+    embedding = CachedEmbedding(inner, batch_size=2)
+    vectors = embedding.get_text_embedding_batch(["a", "b", "a", "c", "b"])
+    assert inner.batches == [2, 1]
+    assert vectors[0] == vectors[2] and vectors[1] == vectors[4]
+    assert embedding.stats()["misses"] == 3
+
+
+def test_text_embeddings_are_read_from_store(inner, store):
+    first = CachedEmbedding(inner, store=store).get_text_embedding_batch(["a", "b"])
+    assert store.count() == 2
+
+    # 新实例(如重建索引)命中磁盘缓存, 只请求新增文本
+    embedding = CachedEmbedding(inner, store=store)
+    vectors = asyncio.run(embedding.aget_text_embedding_batch(["a", "b", "c"]))
+    assert inner.batches == [2, 1]
+    assert np.allclose(vectors[:2], first)
+    assert embedding.stats()["disk_hits"] == 2
+
+
+def test_store_key_includes_model_name(inner, store):
+    CachedEmbedding(inner, store=store).get_text_embedding("a")
+    other = BatchCountingEmbedding(embed_dim=8, model_name="other")
+    CachedEmbedding(other, store=store).get_text_embedding("a")
+    assert other.batches == [1]
+
+
+def test_query_embedding_is_remembered(inner):
+    embedding = CachedEmbedding(inner, memory_size=1)
+    vector = embedding.get_query_embedding("how many orders")
+    assert np.allclose(asyncio.run(embedding.aget_query_embedding("how many orders")), vector)
+    assert inner.calls == 1
+    assert embedding.stats()["memory_hits"] == 1
+
+    # 内存缓存按 LRU 淘汰
+    embedding.get_query_embedding("how many users")
+    embedding.get_query_embedding("how many orders")
+    assert inner.calls == 3
+    # 问题与同名文本分别缓存
+    embedding.get_text_embedding("how many orders")
+    assert inner.calls == 4
+
+
+def test_stores_are_shared_per_path(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    assert get_embedding_store(path) is get_embedding_store(str(tmp_path / "." / "shared.sqlite3"))
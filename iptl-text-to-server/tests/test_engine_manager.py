@@ -0,0 +1,77 @@
+import pytest
+
+from resources.text2sql import engine_manager
+from resources.text2sql.config import Text2SQLConfig
+from resources.text2sql.engine_manager import EngineCache, EnginePool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeEngine:
+    def __init__(self, config):
+        self.config = config
+        self.closed = False
+        self.db_manager = None
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def pool(monkeypatch, clock):
+    monkeypatch.setattr(engine_manager, "Text2SQLEngine", FakeEngine)
+    pool = object.__new__(EnginePool)
+    pool._initialize()
+    pool.cache = EngineCache(maxsize=2, ttl=10, on_removed=pool._on_removed, timer=clock)
+    return pool
+
+
+def config(name):
+    return Text2SQLConfig(db_uri=f"sqlite:///{name}.db")
+
+
+def test_expired_engine_is_closed(pool, clock):
+    first = pool.get_engine(config("a"))
+    clock.now += 11
+    second = pool.get_engine(config("a"))
+    assert second is not first
+    assert first.closed and not second.closed
+
+
+def test_held_engine_is_reused_after_expiry(pool, clock):
+    held = pool.acquire(config("a"))
+    clock.now += 11
+    assert pool.get_engine(config("a")) is held
+    assert not held.closed
+    pool.release(config("a").config_id)
+    assert not held.closed  # 仍在缓存中, 过期后才回收
+    clock.now += 11
+    pool.get_engine(config("b"))
+    assert held.closed
+
+
+def test_held_engine_survives_eviction_until_released(pool):
+    held = pool.acquire(config("a"))
+    pool.get_engine(config("b"))
+    pool.get_engine(config("c"))  # 超出 maxsize, 淘汰 a
+    assert config("a").config_id not in pool.cache and not held.closed
+    pool.release(config("a").config_id)
+    assert held.closed
+
+
+def test_unheld_engine_is_closed_on_eviction(pool):
+    first = pool.get_engine(config("a"))
+    pool.get_engine(config("b"))
+    pool.get_engine(config("c"))
+    assert first.closed
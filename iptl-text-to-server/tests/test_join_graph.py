@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from llama_index.core.objects import SQLTableSchema
+
+from resources.text2sql.db_manager import TableMetadata
+from resources.text2sql.join_graph import JoinEdge, JoinGraph, JoinPathExpander
+
+
+def fk(columns, referred_table, referred_columns):
+    return {"constrained_columns": columns, "referred_table": referred_table, "referred_columns": referred_columns}
+
+
+def make_catalog():
+    """
+    users <- orders -> products -> suppliers -> regions
+    order_items -> orders, order_items -> products; audit 与其他表无关联; orders 有指向自身与目录外表的外键
+    """
+    foreign_keys = {
+        "users": [],
+        "orders": [
+            fk(["user_id"], "users", ["id"]),
+            fk(["product_id"], "products", ["id"]),
+            fk(["parent_id"], "orders", ["id"]),
+            fk(["ext_id"], "external", ["id"]),
+        ],
+        "order_items": [fk(["order_id"], "orders", ["id"]), fk(["product_id"], "products", ["id"])],
+        "products": [fk(["supplier_id"], "suppliers", ["id"])],
+        "suppliers": [fk(["region_id"], "regions", ["id"])],
+        "regions": [],
+        "audit": [],
+    }
+    return {name: TableMetadata(name=name, foreign_keys=fks) for name, fks in foreign_keys.items()}
+
+
+@pytest.fixture
+def graph():
+    graph = JoinGraph()
+    graph.rebuild(make_catalog())
+    return graph
+
+
+def test_edges_are_undirected(graph):
+    edge = JoinEdge("orders", ("user_id",), "users", ("id",))
+    assert graph.edges("orders", "users") == [edge]
+    assert graph.edges("users", "orders") == [edge]
+    assert graph.neighbors("orders") == ["order_items", "products", "users"]
+
+
+def test_self_and_unknown_references_are_skipped(graph):
+    assert "orders" not in graph.neighbors("orders")
+    assert "external" not in graph.neighbors("orders")
+    assert graph.neighbors("audit") == []
+
+
+@pytest.mark.parametrize(
+    "tables, max_hops, budget, expected",
+    [
+        # 直接相连或只有一张表时不需要中间表
+        (["users", "orders"], 3, 3, []),
+        (["users"], 3, 3, []),
+        (["users", "products"], 3, 3, ["orders"]),
+        (["users", "suppliers"], 3, 3, ["orders", "products"]),
+        # 超出跳数上限
+        (["users", "regions"], 3, 3, []),
+        (["users", "regions"], 4, 3, ["orders", "products", "suppliers"]),
+        # 超出预算的路径整条放弃
+        (["users", "suppliers"], 3, 1, []),
+        (["users", "suppliers", "audit"], 3, 3, ["orders", "products"]),
+        # 路径不穿过检索到的表
+        (["users", "orders", "suppliers"], 3, 3, ["products"]),
+        (["users", "products", "missing"], 3, 3, ["orders"]),
+    ],
+)
+def test_bridge_tables(graph, tables, max_hops, budget, expected):
+    assert graph.bridge_tables(tables, max_hops, budget) == expected
+
+
+def test_paths_are_ranked_within_budget(graph):
+    # regions-products 与 users-products 各需 1 张中间表, regions-users 需 3 张
+    # 预算 1 时先补充较短路径中排名靠前的表(regions)
+    assert graph.bridge_tables(["regions", "users", "products"], 4, 1) == ["suppliers"]
+    assert graph.bridge_tables(["regions", "users", "products"], 4, 2) == ["suppliers", "orders"]
+
+
+def test_rebuild_replaces_graph(graph):
+    graph.rebuild({"users": TableMetadata(name="users")})
+    assert graph.neighbors("orders") == []
+    assert graph.bridge_tables(["users", "products"], 3, 3) == []
+
+
+class FakeRetriever:
+    def __init__(self, tables):
+        self.schemas = [SQLTableSchema(table_name=t) for t in tables]
+
+    def retrieve(self, query):
+        return list(self.schemas)
+
+    async def aretrieve(self, query):
+        return list(self.schemas)
+
+
+def lookup(table_name):
+    return None if table_name == "products" else SQLTableSchema(table_name=table_name, context_str=table_name)
+
+
+def test_expander_appends_bridge_tables(graph):
+    expander = JoinPathExpander(FakeRetriever(["users", "suppliers"]), graph, lookup)
+    assert [s.table_name for s in expander.retrieve("q")] == ["users", "suppliers", "orders"]
+    assert [s.table_name for s in asyncio.run(expander.aretrieve("q"))] == ["users", "suppliers", "orders"]
+
+
+def test_expander_keeps_connected_results(graph):
+    expander = JoinPathExpander(FakeRetriever(["orders", "users"]), graph, lookup)
+    assert [s.table_name for s in expander.retrieve("q")] == ["orders", "users"]
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from llama_index.core.objects import SQLTableSchema
+
+from resources.text2sql.lexical_index import HybridTableRetriever, LexicalDocument, LexicalIndex, tokenize
+
+
+def doc(name, columns, text=""):
+    return LexicalDocument(table_name=name, context_str=f"Table: {name}", columns=columns, text=text)
+
+
+@pytest.fixture
+def index():
+    index = LexicalIndex()
+    index.rebuild([
+        doc("orders", ["id", "user_id", "order_status", "amount"], text="customer purchases"),
+        doc("users", ["id", "email", "signup_date"]),
+        doc("order_items", ["id", "order_id", "sku", "quantity"]),
+        doc("products", ["id", "sku", "price"]),
+        doc("audit_log", ["id", "status"]),
+        doc("jobs", ["id", "status"]),
+        doc("tasks", ["id", "status"]),
+        doc("events", ["id", "status"]),
+    ])
+    return index
+
+
+def test_tokenize():
+    assert tokenize("order_items userId") == ["order_items", "order", "items", "userid", "user", "id"]
+    assert tokenize("订单金额") == ["订单", "单金", "金额"]
+    assert tokenize("表") == ["表"]
+
+
+def test_search_ranks_by_bm25(index):
+    ranked = [name for name, _ in index.search("customer purchases", 3)]
+    assert ranked[0] == "orders"
+    assert index.search("nothing matches", 3) == []
+    assert LexicalIndex().search("orders", 3) == []
+
+
+def test_mentioned_tables_scoring(index):
+    # 完整表名计 2 分
+    assert index.mentioned_tables("how many users signed up", 2) == ["users"]
+    # 只属于少数表的特征列名各计 1 分, 单个列名不足 2 分
+    assert index.mentioned_tables("total by order_status", 2) == []
+    assert index.mentioned_tables("total amount by order_status", 2) == ["orders"]
+    assert index.mentioned_tables("sku", 1) == ["order_items", "products"]
+    # 出现在太多表中的列名不作为依据
+    assert index.mentioned_tables("status", 1) == []
+
+
+class FakeVectorRetriever:
+    def __init__(self, tables):
+        self.tables = tables
+        self.calls = 0
+
+    def retrieve(self, query):
+        self.calls += 1
+        return [SQLTableSchema(table_name=t, context_str=f"Table: {t}") for t in self.tables]
+
+    async def aretrieve(self, query):
+        return self.retrieve(query)
+
+
+def names(schemas):
+    return [s.table_name for s in schemas]
+
+
+def test_fast_path_skips_vector_retrieval(index):
+    vector = FakeVectorRetriever(["products"])
+    retriever = HybridTableRetriever(vector, index, top_k=2)
+    assert retriever.takes_fast_path("list users by email")
+    assert names(retriever.retrieve("list users by email"))[0] == "users"
+    assert names(asyncio.run(retriever.aretrieve("list users by email")))[0] == "users"
+    assert vector.calls == 0
+
+
+def test_uncertain_question_is_fused_with_vectors(index):
+    vector = FakeVectorRetriever(["products", "orders"])
+    retriever = HybridTableRetriever(vector, index, top_k=2)
+    assert not retriever.takes_fast_path("customer purchases")
+    # orders 在两路结果中都出现, 融合后排名第一
+    assert names(retriever.retrieve("customer purchases")) == ["orders", "products"]
+    assert vector.calls == 1
+
+
+def test_fast_path_can_be_disabled(index):
+    vector = FakeVectorRetriever(["users"])
+    retriever = HybridTableRetriever(vector, index, top_k=2, fast_path=False)
+    assert not retriever.takes_fast_path("list users by email")
+    retriever.retrieve("list users by email")
+    assert vector.calls == 1
@@ -0,0 +1,104 @@
+import pytest
+
+from resources.text2sql import result_cache
+from resources.text2sql.result_cache import QueryResultCache, extract_tables
+
+ROWS = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache.time, "monotonic", clock)
+    return clock
+
+
+@pytest.mark.parametrize(
+    "sql, tables",
+    [
+        ("SELECT * FROM Users", {"users"}),
+        ("SELECT * FROM public.orders AS o JOIN users AS u ON o.user_id = u.id", {"orders", "users"}),
+        ("WITH recent AS (SELECT * FROM orders) SELECT * FROM recent", {"orders"}),
+        ("SELECT * FROM users WHERE id IN (SELECT user_id FROM orders)", {"users", "orders"}),
+    ],
+)
+def test_extract_tables(sql, tables):
+    assert extract_tables(sql, "postgres") == tables
+
+
+def test_get_after_put(clock):
+    cache = QueryResultCache()
+    assert cache.get("c1", "postgres", "SELECT * FROM users") is None
+    cache.put("c1", "postgres", "SELECT * FROM users", ROWS)
+    assert cache.get("c1", "postgres", "SELECT * FROM users") == ROWS
+    # 键包含 config_id 与方言
+    assert cache.get("c2", "postgres", "SELECT * FROM users") is None
+    assert cache.get("c1", "mysql", "SELECT * FROM users") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 3
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryResultCache(default_ttl=60)
+    cache.put("c1", "postgres", "SELECT * FROM users", ROWS)
+    cache.put("c1", "postgres", "SELECT * FROM orders", ROWS, ttl=600)
+    clock.now += 61
+    assert cache.get("c1", "postgres", "SELECT * FROM users") is None
+    assert cache.get("c1", "postgres", "SELECT * FROM orders") == ROWS
+
+
+def test_non_positive_ttl_is_not_cached(clock):
+    cache = QueryResultCache()
+    cache.put("c1", "postgres", "SELECT * FROM users", ROWS, ttl=0)
+    assert cache.stats()["entries"] == 0
+
+
+def test_unparsable_sql_is_not_cached(clock):
+    cache = QueryResultCache()
+    cache.put("c1", "postgres", "SELECT FROM WHERE (", ROWS)
+    assert cache.stats()["entries"] == 0
+
+
+def test_byte_budget_evicts_least_recently_used(clock):
+    size = QueryResultCache._estimate_size(ROWS)
+    cache = QueryResultCache(max_bytes=size * 2)
+    cache.put("c1", "postgres", "SELECT * FROM a", ROWS)
+    cache.put("c1", "postgres", "SELECT * FROM b", ROWS)
+    cache.get("c1", "postgres", "SELECT * FROM a")
+    cache.put("c1", "postgres", "SELECT * FROM c", ROWS)
+    assert cache.get("c1", "postgres", "SELECT * FROM a") == ROWS
+    assert cache.get("c1", "postgres", "SELECT * FROM b") is None
+    assert cache.stats()["bytes"] <= size * 2
+
+
+def test_oversized_result_is_not_cached(clock):
+    cache = QueryResultCache(max_bytes=10)
+    cache.put("c1", "postgres", "SELECT * FROM users", ROWS)
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_tables(clock):
+    cache = QueryResultCache()
+    cache.put("c1", "postgres", "SELECT * FROM users", ROWS)
+    cache.put("c1", "postgres", "SELECT * FROM orders JOIN users ON orders.user_id = users.id", ROWS)
+    cache.put("c1", "postgres", "SELECT * FROM items", ROWS)
+    # 表名按不区分大小写、去掉 schema 与引号后匹配
+    assert cache.invalidate_tables(['public."Users"']) == 2
+    assert cache.get("c1", "postgres", "SELECT * FROM items") == ROWS
+    assert cache.invalidate_tables(["users"]) == 0
+
+
+def test_clear(clock):
+    cache = QueryResultCache()
+    cache.put("c1", "postgres", "SELECT * FROM users", ROWS)
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+    assert cache.invalidate_tables(["users"]) == 0
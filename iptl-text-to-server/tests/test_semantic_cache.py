@@ -0,0 +1,170 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from resources.text2sql import semantic_cache
+from resources.text2sql.semantic_cache import SemanticSQLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(semantic_cache.time, "time", clock)
+    return clock
+
+
+def make_cache(config, embed_model, version="v1"):
+    cache = SemanticSQLCache(config, embed_model)
+    cache.bind(version)
+    return cache
+
+
+def test_exact_hit_does_not_embed(config, embed_model):
+    cache = make_cache(config, embed_model)
+    cache.put("How many  Orders?", "SELECT COUNT(*) FROM orders")
+    calls = embed_model.calls
+    # 归一化大小写与空白后精确命中, 不请求问题向量
+    assert cache.lookup("how many orders?") == "SELECT COUNT(*) FROM orders"
+    assert embed_model.calls == calls
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 0}
+
+
+def test_fuzzy_hit_and_miss(config, embed_model):
+    cache = make_cache(config, embed_model)
+    cache.put("list all customers", "SELECT * FROM customers")
+    assert cache.lookup("customers list all") == "SELECT * FROM customers"
+    assert asyncio.run(cache.alookup("all list customers")) == "SELECT * FROM customers"
+    assert cache.lookup("list all orders") is None
+    # fuzzy=False 时不做向量匹配
+    assert cache.lookup("customers list all", fuzzy=False) is None
+
+
+def test_exact_only_entries_are_skipped_by_fuzzy_lookup(config, embed_model):
+    cache = make_cache(config, embed_model)
+    cache.put("show orders", "SELECT 1", fuzzy=False)
+    assert cache.lookup("list all customers") is None
+
+    # 之后写入的带向量条目仍可模糊命中, 只做精确匹配的条目仍可精确命中
+    cache.put("list all customers", "SELECT 2")
+    assert cache.lookup("all customers list") == "SELECT 2"
+    assert cache.lookup("show orders", fuzzy=False) == "SELECT 1"
+    assert cache.lookup("something else") is None
+
+
+def test_empty_sql_is_not_cached(config, embed_model):
+    cache = make_cache(config, embed_model)
+    cache.put("show orders", "  ")
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_after_ttl(config, embed_model, clock):
+    config.semantic_cache_ttl = 60
+    cache = make_cache(config, embed_model)
+    cache.put("show orders", "SELECT 1")
+    clock.now += 61
+    assert cache.lookup("show orders") is None
+    assert cache.stats()["entries"] == 0
+    assert make_cache(config, embed_model).stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(config, embed_model, clock):
+    config.semantic_cache_max_entries = 2
+    cache = make_cache(config, embed_model)
+    cache.put("q1", "SELECT 1")
+    clock.now += 1
+    cache.put("q2", "SELECT 2")
+    clock.now += 1
+    assert cache.lookup("q1") == "SELECT 1"
+    cache.put("q3", "SELECT 3")
+    assert cache.lookup("q2", fuzzy=False) is None
+    assert cache.lookup("q1") == "SELECT 1"
+    # 淘汰同样写入 sqlite
+    reloaded = make_cache(config, embed_model)
+    assert reloaded.lookup("q2", fuzzy=False) is None
+    assert reloaded.stats()["entries"] == 2
+
+
+def test_entries_survive_restart(config, embed_model):
+    cache = make_cache(config, embed_model)
+    cache.put("list all customers", "SELECT * FROM customers")
+    cache.put("show orders", "SELECT * FROM orders", fuzzy=False)
+
+    reloaded = make_cache(config, embed_model)
+    assert reloaded.stats()["entries"] == 2
+    assert reloaded.lookup("customers all list") == "SELECT * FROM customers"
+    assert reloaded.lookup("show orders") == "SELECT * FROM orders"
+
+
+def test_version_change_drops_entries(config, embed_model):
+    cache = make_cache(config, embed_model)
+    cache.put("show orders", "SELECT 1")
+    cache.bind("v2")
+    assert cache.stats()["entries"] == 0
+    cache.put("show users", "SELECT 2")
+
+    assert make_cache(config, embed_model, "v2").lookup("show users") == "SELECT 2"
+    assert make_cache(config, embed_model, "v1").stats()["entries"] == 0
+
+
+def test_discard_and_clear(config, embed_model):
+    cache = make_cache(config, embed_model)
+    cache.put("show orders", "SELECT 1")
+    cache.put("orders please", "SELECT 1")
+    cache.put("show users", "SELECT 2")
+    cache.discard("SELECT 1")
+    assert cache.stats()["entries"] == 1
+    assert make_cache(config, embed_model).stats()["entries"] == 1
+
+    cache.clear()
+    assert cache.lookup("show users") is None
+    assert make_cache(config, embed_model).stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("persist", ["flush", "put", "batch"])
+def test_last_access_is_persisted(config, embed_model, clock, monkeypatch, persist):
+    cache = make_cache(config, embed_model)
+    cache.put("q1", "SELECT 1")
+    clock.now += 1
+    cache.put("q2", "SELECT 2")
+    clock.now += 1
+    if persist == "batch":
+        monkeypatch.setattr(SemanticSQLCache, "TOUCH_FLUSH_SIZE", 1)
+    assert cache.lookup("q1") == "SELECT 1"
+    if persist == "flush":
+        cache.flush()
+    elif persist == "put":
+        clock.now += 1
+        cache.put("q3", "SELECT 3")
+
+    # 重启后按持久化的最近访问时间恢复 LRU 顺序: q1 比 q2 更近被访问
+    reloaded = make_cache(config, embed_model)
+    assert list(reloaded._entries)[:2] == ["q2", "q1"]
+
+
+def test_legacy_file_is_removed_after_store_opens(config, embed_model, monkeypatch):
+    legacy = Path(config.chroma_db_path) / SemanticSQLCache.LEGACY_FILE_NAME
+    legacy.parent.mkdir(parents=True, exist_ok=True)
+    legacy.write_text("{}")
+
+    def broken_store(path):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(semantic_cache, "SemanticCacheStore", broken_store)
+        cache = make_cache(config, embed_model)
+    # 打开失败时保留旧文件, 缓存仍可在内存中使用
+    assert legacy.exists()
+    cache.put("show orders", "SELECT 1")
+    assert cache.lookup("show orders") == "SELECT 1"
+
+    make_cache(config, embed_model)
+    assert not legacy.exists()
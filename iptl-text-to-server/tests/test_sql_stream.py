@@ -0,0 +1,83 @@
+import pytest
+from llama_index.core.indices.struct_store.sql_retriever import DefaultSQLParser
+from llama_index.core.schema import QueryBundle
+
+from resources.text2sql.sql_stream import SQLStreamExtractor
+
+PARSER = DefaultSQLParser()
+
+
+def feed_all(output: str, chunk_size: int, backslash_escapes: bool = False):
+    """按固定长度分片喂给提取器, 返回第一次给出的完整语句文本(未给出时为 None)"""
+    extractor = SQLStreamExtractor(backslash_escapes=backslash_escapes)
+    for i in range(0, len(output), chunk_size):
+        extracted = extractor.feed(output[i:i + chunk_size])
+        if extracted is not None:
+            return extracted
+    return None
+
+
+def parse(text: str) -> str:
+    return PARSER.parse_response_to_sql(text, QueryBundle(""))
+
+
+CHUNK_SIZES = [1, 2, 3, 7, 10000]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize(
+    "output, expected",
+    [
+        ('SQLQuery: SELECT "name" FROM "users" LIMIT 5;\nExplanation: blah; more', 'SELECT "name" FROM "users" LIMIT 5;'),
+        # SQLQuery: 后紧跟代码块
+        ("SQLQuery:\n```sql\nSELECT a FROM t;\n```\nThis query ...;", "SELECT a FROM t;"),
+        ("SQLQuery: ```sql\nSELECT a\nFROM t\n```\nExplanation;", "SELECT a\nFROM t"),
+        # 只有代码块, 没有 SQLQuery: 标记
+        ("Sure!\n```sql\nSELECT 1 -- c;omment\nFROM t /* ; */\n```\nThis query ...;", "SELECT 1 -- c;omment\nFROM t /* ; */"),
+        # 没有任何标记, 输出直接以 SELECT 开头
+        ("SELECT x FROM y;\nThis returns x; done", "SELECT x FROM y;"),
+        ("SQLQuery: SELECT 'it''s;' AS x FROM \"a;b\" SQLResult: foo;", "SELECT 'it''s;' AS x FROM \"a;b\""),
+        ("With the schema, we can; SQLQuery: SELECT 1;", "SELECT 1;"),
+    ],
+)
+def test_extracts_first_complete_statement(output, expected, chunk_size):
+    extracted = feed_all(output, chunk_size)
+    assert extracted is not None
+    assert parse(extracted) == expected
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize(
+    "output",
+    [
+        'SQLQuery: SELECT "name" FROM "users" LIMIT 5;',
+        "SQLQuery:\n```sql\nSELECT a FROM t;\n```",
+        "SQLQuery: SELECT a FROM t SQLResult:",
+        "```sql\nSELECT a FROM t\n```",
+    ],
+)
+def test_matches_non_streaming_parser(output, chunk_size):
+    """输出中没有解释文字时, 流式提取与非流式解析的结果一致"""
+    assert parse(feed_all(output, chunk_size)) == parse(output)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_no_marker_never_stops_early(chunk_size):
+    assert feed_all("select name from users limit 5", chunk_size) is None
+    assert feed_all("I cannot answer this question; the schema has no such table.", chunk_size) is None
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_backslash_escapes(chunk_size):
+    output = "SQLQuery: SELECT 'a\\';b' FROM t; x"
+    assert parse(feed_all(output, chunk_size, backslash_escapes=True)) == "SELECT 'a\\';b' FROM t;"
+    # 非 MySQL 方言中反斜杠按字面处理, 字符串在第二个引号处结束
+    assert parse(feed_all(output, chunk_size)) == "SELECT 'a\\';"
+
+
+def test_waits_for_fence_line_after_marker():
+    extractor = SQLStreamExtractor()
+    assert extractor.feed("SQLQuery:\n`") is None
+    assert extractor.feed("``sq") is None
+    assert extractor.feed("l\nSELECT 1") is None
+    assert parse(extractor.feed(";\n```")) == "SELECT 1;"
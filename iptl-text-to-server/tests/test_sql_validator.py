@@ -0,0 +1,105 @@
+import pytest
+
+from resources.text2sql.sql_validator import SQLSecurityChecker
+
+DIALECT = "postgres"
+
+
+@pytest.fixture
+def checker():
+    return SQLSecurityChecker(blocked_tables={"Secrets"}, max_limit=50)
+
+
+@pytest.mark.parametrize(
+    "sql, reason",
+    [
+        ("DELETE FROM users", "仅允许 SELECT"),
+        ("UPDATE users SET name = 'x'", "仅允许 SELECT"),
+        ("DROP TABLE users", "仅允许 SELECT"),
+        ("SELECT 1; SELECT 2", "多个 SQL 语句"),
+        ("SELECT * FROM secrets", "secrets"),
+        ('SELECT * FROM "SECRETS"', "secrets"),
+        ("SELECT * FROM (SELECT * FROM secrets) AS s", "secrets"),
+        ("SELECT pg_sleep(10)", "pg_sleep"),
+        ("SELECT current_user", "current_user"),
+        ("SELECT * FROM a JOIN b", "JOIN"),
+        ("SELECT * FROM a JOIN b ON 1 = 1", "恒等式"),
+        # 逗号分隔的多表在 sqlglot 中是缺少条件的 JOIN
+        ("SELECT * FROM a, b", "安全拦截"),
+        ("WITH x AS (SELECT * FROM secrets) SELECT * FROM x", "secrets"),
+    ],
+)
+def test_rejects_unsafe_sql(checker, sql, reason):
+    with pytest.raises(ValueError, match=reason):
+        checker.validata(sql, dialect=DIALECT)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT name FROM users",
+        "SELECT u.name FROM users AS u JOIN orders AS o ON u.id = o.user_id",
+        "SELECT * FROM a CROSS JOIN b",
+        "WITH x AS (SELECT id FROM users) SELECT id FROM x",
+        "SELECT id FROM a UNION SELECT id FROM b",
+    ],
+)
+def test_accepts_read_only_queries(checker, sql):
+    assert checker.validata(sql, dialect=DIALECT)
+
+
+def test_syntax_error_is_reported(checker):
+    with pytest.raises(ValueError, match="语法错误"):
+        checker.validata("SELECT FROM WHERE (", dialect=DIALECT)
+
+
+@pytest.mark.parametrize(
+    "sql, limit, expected",
+    [
+        ("SELECT id FROM users", 20, "LIMIT 20"),
+        ("SELECT id FROM users LIMIT 5", 20, "LIMIT 5"),
+        ("SELECT id FROM users LIMIT 500", 20, "LIMIT 20"),
+    ],
+)
+def test_limit_is_pushed_down(checker, sql, limit, expected):
+    assert checker.validata(sql, dialect=DIALECT, optimize=False, limit=limit).endswith(expected)
+
+
+def test_fetch_first_is_bounded(checker):
+    validated = checker.validata(
+        "SELECT id FROM users FETCH FIRST 5 ROWS ONLY", dialect=DIALECT, optimize=False, limit=20
+    )
+    assert "5" in validated and "20" not in validated
+
+
+def test_no_limit_without_limit_argument(checker):
+    assert "LIMIT" not in checker.validata("SELECT id FROM users", dialect=DIALECT, optimize=False)
+
+
+def test_verdicts_are_cached(checker, monkeypatch):
+    calls = []
+    validate = checker._validate
+
+    def counting(*args):
+        calls.append(args)
+        return validate(*args)
+
+    monkeypatch.setattr(checker, "_validate", counting)
+    assert checker.validata("SELECT 1", dialect=DIALECT) == checker.validata("SELECT 1", dialect=DIALECT)
+    for _ in range(2):
+        with pytest.raises(ValueError, match="secrets"):
+            checker.validata("SELECT * FROM secrets", dialect=DIALECT)
+    assert len(calls) == 2
+
+
+def test_cache_key_includes_blocked_tables(checker):
+    checker.validata("SELECT * FROM users", dialect=DIALECT)
+    checker.blocked_tables.add("users")
+    with pytest.raises(ValueError, match="users"):
+        checker.validata("SELECT * FROM users", dialect=DIALECT)
+
+
+def test_cache_can_be_disabled():
+    checker = SQLSecurityChecker(cache_size=0)
+    assert checker._verdict_cache is None
+    assert checker.validata("SELECT 1", dialect=DIALECT)
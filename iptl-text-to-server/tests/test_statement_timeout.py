@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from resources.text2sql.statement_timeout import async_statement_timeout, statement_timeout
+
+# 不设超时时需要运行很久的语句
+LONG_SQL = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 300000000) SELECT count(*) FROM c"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "timeout.db"
+
+
+def test_sqlite_statement_is_interrupted(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.connect() as conn:
+        start = time.monotonic()
+        with pytest.raises(OperationalError, match="interrupted"):
+            with statement_timeout(conn, 0.2):
+                conn.execute(text(LONG_SQL))
+        assert time.monotonic() - start < 5
+        # 退出后不再限制
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+    engine.dispose()
+
+
+def test_aiosqlite_statement_is_interrupted(db_path):
+    pytest.importorskip("aiosqlite")
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        try:
+            async with engine.connect() as conn:
+                start = time.monotonic()
+                with pytest.raises(OperationalError, match="interrupted"):
+                    async with async_statement_timeout(conn, 0.2):
+                        await conn.execute(text(LONG_SQL))
+                assert time.monotonic() - start < 5
+
+                async with async_statement_timeout(conn, 0.2):
+                    assert (await conn.execute(text("SELECT 1"))).scalar() == 1
+                # 未触发的定时器已取消, 不会中断之后的语句
+                await asyncio.sleep(0.3)
+                assert (await conn.execute(text("SELECT 2"))).scalar() == 2
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
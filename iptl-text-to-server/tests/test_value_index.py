@@ -0,0 +1,15 @@
+import asyncio
+
+from resources.text2sql.value_index import ValueIndex
+
+
+class FakeDatabaseManager:
+    def get_table_names(self):
+        return ["orders"]
+
+
+def test_retrieve_without_indexed_values_does_not_embed(config, embed_model):
+    index = ValueIndex(config, FakeDatabaseManager(), embed_model)
+    assert index.retrieve("orders from berlin", ["orders"]) == []
+    assert asyncio.run(index.aretrieve("orders from berlin", ["orders"])) == []
+    assert embed_model.calls == 0
@@ -3,6 +3,6 @@ from resources.text2sql.service import ToolContainer
 
 # 用户登录查询
 async def text2sql(query: str):
-    return ToolContainer.query_database(query)
+    return await ToolContainer.aquery_database(query)
 
 current_locals=locals()
\ No newline at end of file